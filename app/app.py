@@ -1,5 +1,9 @@
-from flask import Flask, render_template, request, jsonify
+import json
+from flask import Flask, Response, render_template, request, jsonify
 from simulation_manager import manager
+from binary_frame import CONTENT_TYPE as BINARY_CONTENT_TYPE
+
+KEEPALIVE_SECONDS = 1.0  # Idle push clients still get a status event this often
 
 app = Flask(__name__)
 
@@ -19,16 +23,74 @@ def stop():
 
 @app.route('/api/live_data')
 def live_data():
+    manager.stream.touch()  # Somebody is watching: keep the publisher running
+
+    # ?format=bin (or Accept: application/octet-stream) -> packed binary frame
+    # ?strings=<K> -> the client already knows the first K interned vehicle IDs
+    if request.args.get('format') == 'bin' or request.accept_mimetypes.best == BINARY_CONTENT_TYPE:
+        body = manager.encode_binary_frame(request.args.get('strings', 0, type=int))
+        return Response(body, mimetype=BINARY_CONTENT_TYPE, headers={'Cache-Control': 'no-cache'})
+
+    # ?since=<frame> -> only what changed since that frame (see FrameStream.delta)
+    since = request.args.get('since', type=int)
+    if since is not None:
+        payload = manager.stream.delta(since)
+        payload["status"] = manager.status
+        return jsonify(payload)
+
+    # No cursor: full snapshot (legacy format)
     return jsonify({
         "status": manager.status,
         "data": manager.current_data
     })
 
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: one delta frame per published simulation step.
+
+    A client that can't keep up is simply asked for the delta since its last
+    frame the next time it is ready, so frames coalesce instead of queueing up.
+    All clients only read the shared FrameStream; none of them touch TraCI.
+    """
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    cursor = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+
+    def events(cursor):
+        manager.stream.connect()
+        try:
+            while True:
+                if not manager.stream.wait_for_frame(cursor, timeout=KEEPALIVE_SECONDS):
+                    yield f"event: status\ndata: {json.dumps({'status': manager.status})}\n\n"
+                    continue
+                payload = manager.stream.delta(cursor)
+                payload["status"] = manager.status
+                cursor = payload["frame"]
+                yield f"id: {cursor}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            # Client went away (the server closes the generator)
+            manager.stream.disconnect()
+
+    return Response(events(cursor), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/publish_every', methods=['POST'])
+def set_publish_every():
+    data = request.json
+    manager.set_publish_every(data.get('steps', 1))
+    return jsonify({"status": "updated", "steps": manager.publish_every})
+
 @app.route('/api/speed', methods=['POST'])
 def set_speed():
     data = request.json
     manager.set_speed(data.get('delay', 0.05))
     return jsonify({"status": "updated"})
 
+@app.route('/api/collection_mode', methods=['POST'])
+def set_collection_mode():
+    data = request.json
+    if not manager.set_collection_mode(data.get('mode')):
+        return jsonify({"status": "error", "message": "mode must be 'polling' or 'subscription'"}), 400
+    return jsonify({"status": "updated", "mode": manager.collection_mode})
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=True, port=5000, threaded=True)  # one thread per push client
\ No newline at end of file
@@ -0,0 +1,119 @@
+import json
+import struct
+import threading
+
+import numpy as np
+
+# --- FORMAT ---
+# Little-endian, one full frame per message:
+#
+#   header   "HBF1", frame, n_vehicles, first_string, n_strings, meta_len, strings_len,
+#            origin_lat (f64), origin_lon (f64)
+#   meta     JSON (status, stats, palette on the first request)
+#   strings  new vehicle IDs, '\n'-separated, numbered from first_string
+#   padding  up to a multiple of 4
+#   ids      uint32[n]   index into the interned ID table
+#   lat      float32[n]  degrees, relative to origin_lat
+#   lon      float32[n]  degrees, relative to origin_lon
+#   types    uint8[n]    index into the palette
+#
+# IDs are interned across frames: a client that already knows the first K
+# strings passes K and only receives the ones added after that.
+MAGIC = b"HBF1"
+HEADER = struct.Struct("<4sIIIIIIdd")
+CONTENT_TYPE = "application/octet-stream"
+
+
+def _pad4(n):
+    return (4 - n % 4) % 4
+
+
+class FrameEncoder:
+    """Packs live frames into the binary format above."""
+
+    def __init__(self, palette, origin=(0.0, 0.0)):
+        self.palette = palette   # [[color, radius], ...] indexed by type code
+        self.origin = origin     # (lat, lon) subtracted before going to float32
+        self.lock = threading.Lock()
+        self.string_index = {}   # {vehicle_id: index}
+        self.strings = []
+        self._cache = (None, None, None)  # (frame, ids array, packed columns)
+
+    def _intern(self, ids):
+        index = self.string_index
+        out = np.empty(len(ids), dtype="<u4")
+        for i, vid in enumerate(ids):
+            idx = index.get(vid)
+            if idx is None:
+                idx = index[vid] = len(self.strings)
+                self.strings.append(vid)
+            out[i] = idx
+        return out
+
+    def encode(self, frame, ids, lats, lons, types, meta, known_strings=0):
+        """Returns the binary message for one frame.
+
+        ids/lats/lons/types: per-vehicle sequences of equal length
+        meta:                JSON-serializable dict (status, stats, ...)
+        known_strings:       how many interned IDs the client already has
+        """
+        with self.lock:
+            cached_frame, id_codes, columns = self._cache
+            if cached_frame != frame:
+                # Columns are the same for every client, pack them once per frame
+                id_codes = self._intern(ids)
+                lat = (np.asarray(lats, dtype=np.float64) - self.origin[0]).astype("<f4")
+                lon = (np.asarray(lons, dtype=np.float64) - self.origin[1]).astype("<f4")
+                codes = np.asarray(types, dtype=np.uint8)
+                columns = id_codes.tobytes() + lat.tobytes() + lon.tobytes() + codes.tobytes()
+                self._cache = (frame, id_codes, columns)
+
+            known_strings = min(max(0, known_strings), len(self.strings))
+            new_strings = self.strings[known_strings:]
+
+        if known_strings == 0:
+            meta = dict(meta, palette=self.palette)
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        string_bytes = "\n".join(new_strings).encode("utf-8")
+
+        header = HEADER.pack(MAGIC, frame, len(id_codes), known_strings, len(new_strings),
+                             len(meta_bytes), len(string_bytes), self.origin[0], self.origin[1])
+        body_len = HEADER.size + len(meta_bytes) + len(string_bytes)
+        return b"".join((header, meta_bytes, string_bytes, b"\0" * _pad4(body_len), columns))
+
+
+def decode_frame(data, strings=None):
+    """Python counterpart of the dashboard decoder (used for checks and benchmarks).
+
+    strings: list of interned IDs known so far; extended in place.
+    Returns (meta, ids, lat, lon, types) with NumPy arrays for the columns.
+    """
+    if strings is None:
+        strings = []
+    (magic, frame, n, first_string, n_strings, meta_len, strings_len,
+     origin_lat, origin_lon) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary live frame")
+
+    offset = HEADER.size
+    meta = json.loads(data[offset:offset + meta_len])
+    meta["frame"] = frame
+    offset += meta_len
+
+    if n_strings:
+        new = bytes(data[offset:offset + strings_len]).decode("utf-8").split("\n")
+        del strings[first_string:]
+        strings.extend(new)
+    offset += strings_len
+    offset += _pad4(offset)
+
+    id_codes = np.frombuffer(data, dtype="<u4", count=n, offset=offset)
+    offset += 4 * n
+    lat = np.frombuffer(data, dtype="<f4", count=n, offset=offset).astype(np.float64) + origin_lat
+    offset += 4 * n
+    lon = np.frombuffer(data, dtype="<f4", count=n, offset=offset).astype(np.float64) + origin_lon
+    offset += 4 * n
+    types = np.frombuffer(data, dtype=np.uint8, count=n, offset=offset)
+
+    ids = [strings[i] for i in id_codes.tolist()]
+    return meta, ids, lat, lon, types
@@ -0,0 +1,162 @@
+import math
+import time
+import threading
+from collections import deque
+
+# --- CONSTANTS ---
+MOVE_THRESHOLD_M = 0.5     # Vehicles that moved less than this are not re-sent
+HISTORY_FRAMES = 600       # How many frames of changes we keep for clients catching up
+COORD_DECIMALS = 6         # ~0.1 m, plenty for a map marker
+CLIENT_TIMEOUT = 2.0       # A poller counts as connected this long after its last request
+METERS_PER_DEG_LAT = 111320.0
+
+
+class FrameStream:
+    """Versioned live frames, served as deltas.
+
+    Every publish() bumps the frame number and records which vehicles were
+    added, moved by more than MOVE_THRESHOLD_M, or removed. A client that
+    last saw frame N asks for delta(N) and gets only what changed since then.
+    Static attributes (color, radius) are only sent when a vehicle is added.
+    Clients that are too far behind (or new) get a full snapshot.
+    """
+
+    def __init__(self, move_threshold_m=MOVE_THRESHOLD_M, history=HISTORY_FRAMES):
+        self.move_threshold_m = move_threshold_m
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)  # Wakes up push clients
+
+        self.frame = 0
+        self.reset_frame = 0  # cursors at or before this frame predate the last reset()
+        self.stats = {}
+        self.positions = {}   # {vehicle_id: (lat, lon)} as last published to clients
+        self.static = {}      # {vehicle_id: (color, radius)}
+        self.added_at = {}    # {vehicle_id: frame the vehicle (re)appeared}
+        self.changes = deque(maxlen=history)  # (frame, moved_ids, removed_ids)
+
+        self.viewers = 0          # open push connections
+        self.last_request = 0.0   # time.monotonic() of the last poll
+
+    def connect(self):
+        with self.lock:
+            self.viewers += 1
+
+    def disconnect(self):
+        with self.lock:
+            self.viewers -= 1
+
+    def touch(self):
+        """Called on every poll so the publisher knows somebody is watching."""
+        self.last_request = time.monotonic()
+
+    def has_clients(self):
+        return self.viewers > 0 or time.monotonic() - self.last_request < CLIENT_TIMEOUT
+
+    def publish(self, vehicles, stats):
+        """Records a new frame.
+
+        vehicles: iterable of (id, lat, lon, color, radius)
+        stats:    dict sent along with every frame
+        """
+        with self.lock:
+            self.frame += 1
+            frame = self.frame
+            positions = self.positions
+            moved = []
+            seen = set()
+
+            threshold_sq = None
+            for vid, lat, lon, color, radius in vehicles:
+                seen.add(vid)
+                lat = round(lat, COORD_DECIMALS)
+                lon = round(lon, COORD_DECIMALS)
+
+                old = positions.get(vid)
+                if old is None:
+                    positions[vid] = (lat, lon)
+                    self.static[vid] = (color, radius)
+                    self.added_at[vid] = frame
+                    moved.append(vid)
+                    continue
+
+                if threshold_sq is None:
+                    # Degrees -> meters, good enough at city scale
+                    m_per_deg_lon = METERS_PER_DEG_LAT * math.cos(math.radians(lat))
+                    threshold_sq = self.move_threshold_m ** 2
+                dy = (lat - old[0]) * METERS_PER_DEG_LAT
+                dx = (lon - old[1]) * m_per_deg_lon
+                if dx * dx + dy * dy > threshold_sq:
+                    positions[vid] = (lat, lon)
+                    moved.append(vid)
+
+            removed = [vid for vid in positions if vid not in seen]
+            for vid in removed:
+                del positions[vid]
+                del self.static[vid]
+                del self.added_at[vid]
+
+            self.changes.append((frame, moved, removed))
+            self.stats = stats
+            self.new_frame.notify_all()
+
+    def wait_for_frame(self, after, timeout=None):
+        """Blocks until a frame newer than `after` exists. Returns False on timeout."""
+        with self.lock:
+            return self.new_frame.wait_for(lambda: self.frame > after, timeout)
+
+    def reset(self):
+        """Forget everything (new simulation run). Clients will resync with a full frame."""
+        with self.lock:
+            self.positions.clear()
+            self.static.clear()
+            self.added_at.clear()
+            self.changes.clear()
+            self.stats = {}
+            # The frame counter keeps increasing so old client cursors are never reused;
+            # any cursor up to here gets a full frame, whatever was published since
+            self.reset_frame = self.frame
+
+    def _full(self):
+        added = [
+            [vid, lat, lon, self.static[vid][0], self.static[vid][1]]
+            for vid, (lat, lon) in self.positions.items()
+        ]
+        return {"frame": self.frame, "full": True, "stats": self.stats,
+                "added": added, "moved": [], "removed": []}
+
+    def delta(self, since=None):
+        """Returns what changed after frame `since` (a full frame if unknown/too old).
+
+        Payload: {"frame", "full", "stats",
+                  "added":   [[id, lat, lon, color, radius], ...],
+                  "moved":   [[id, lat, lon], ...],
+                  "removed": [id, ...]}
+        """
+        with self.lock:
+            oldest = self.changes[0][0] if self.changes else self.frame + 1
+            if (since is None or since <= self.reset_frame or since > self.frame
+                    or since < oldest - 1):
+                return self._full()
+
+            touched = set()
+            gone = set()
+            for frame, moved, removed in reversed(self.changes):
+                if frame <= since:
+                    break
+                touched.update(moved)
+                gone.update(removed)
+
+            added, moved = [], []
+            for vid in touched:
+                pos = self.positions.get(vid)
+                if pos is None:
+                    continue  # appeared and left again in between
+                if self.added_at[vid] > since:
+                    color, radius = self.static[vid]
+                    added.append([vid, pos[0], pos[1], color, radius])
+                else:
+                    moved.append([vid, pos[0], pos[1]])
+
+            removed = [vid for vid in gone if vid not in self.positions]
+            return {"frame": self.frame, "full": False, "stats": self.stats,
+                    "added": added, "moved": moved, "removed": removed}
@@ -1,38 +1,104 @@
 import os
 import sys
-import traci
-import sumolib
 import threading
 import time
 import datetime
 
+from sumo_backend import backend_constants, load_backend
+from frame_stream import FrameStream
+from binary_frame import FrameEncoder
+from snapshot_buffer import SnapshotBuffer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "common"))
+from net_cache import load_net
+
 # --- CONSTANTS ---
 WEIPERT_TLS_ID = "2900153591"    
 
+# Live data collection modes
+# "polling":      one getIDList + 4 getters per vehicle per step (original path)
+# "subscription": vehicles subscribe on departure, one getAllSubscriptionResults per step
+COLLECTION_MODES = ("polling", "subscription")
+DEFAULT_COLLECTION_MODE = os.environ.get("SIM_COLLECTION_MODE", "subscription")
+
+# Publish a frame to clients every N simulation steps
+DEFAULT_PUBLISH_EVERY = int(os.environ.get("SIM_PUBLISH_EVERY", "1"))
+
+# How often the publisher thread checks for a new step to turn into client frames
+DEFAULT_PUBLISH_HZ = float(os.environ.get("SIM_PUBLISH_HZ", "20"))
+
+# Variables each vehicle is subscribed to (order doesn't matter, results come back keyed);
+# names of the backend's constants, resolved once the backend is loaded
+VEHICLE_VARS = ("VAR_CO2EMISSION", "VAR_SPEED", "VAR_POSITION", "VAR_TYPE")
+
+# Marker styles: (substring of the type ID, color, radius). First match wins,
+# the index is the type code used by the binary frame format.
+VEHICLE_CLASSES = [
+    ("bus",     "#FF4B4B", 5),
+    ("student", "#00FF99", 2),
+    ("ped",     "#FFD166", 2),
+    ("",        "#4D7CFE", 2),  # Default Car
+]
+PALETTE = [[color, radius] for _, color, radius in VEHICLE_CLASSES]
+
+def vehicle_class(vtype):
+    """Returns the index into VEHICLE_CLASSES for a vehicle type ID."""
+    for code, (key, _, _) in enumerate(VEHICLE_CLASSES):
+        if key in vtype:
+            return code
+
+def vehicle_style(vtype):
+    """Returns (color, radius) of a vehicle marker based on its type ID."""
+    return tuple(PALETTE[vehicle_class(vtype)])
+
 class SimulationManager:
-    def __init__(self, base_path):
+    def __init__(self, base_path, backend=None):
         self.base_path = base_path
         self.config_file = os.path.join(base_path, "simulation.sumocfg")
         self.net_file = os.path.join(base_path, "network", "sumo", "heilbronn.net.xml")
         
-        # Load Network
+        # Load Network (memory-mapped cache, built on first use)
         print("Loading Network...")
-        self.net = sumolib.net.readNet(self.net_file)
+        self.net = load_net(self.net_file)
+        self.projection = self.net.projection
         
+        # SUMO backend (libsumo in-process, or traci over a socket)
+        # Chosen by the `backend` argument or the SUMO_BACKEND env var
+        self.backend_name, self.sumo = load_backend(backend)
+        self.tc = backend_constants(self.sumo)
+        self.vehicle_vars = tuple(getattr(self.tc, name) for name in VEHICLE_VARS)
+        print(f"Using SUMO backend: {self.backend_name}")
+
         self.status = "Idle"
         self.stop_event = threading.Event()
-        self.sim_delay = 0.05
+        self.sim_delay = 0.05  # 0 = max speed (no sleep between steps)
+        self.publish_every = max(1, DEFAULT_PUBLISH_EVERY)
+        self.publish_hz = max(1.0, DEFAULT_PUBLISH_HZ)
+        self.collection_mode = DEFAULT_COLLECTION_MODE
+        if self.collection_mode not in COLLECTION_MODES:
+            self.collection_mode = "subscription"
         
         # Data Containers
-        self.current_data = {
-            "vehicles": [], 
-            "stats": {
-                "count": 0, "speed": 0, 
-                "current_co2": 0, "total_co2": 0, 
-                "stopped": 0, "time": "00:00:00"
-            }
+        # Stepping thread -> snapshots (raw arrays) -> publisher thread -> client frames
+        self.snapshots = SnapshotBuffer()
+        self.latest_stats = {
+            "count": 0, "speed": 0, 
+            "current_co2": 0, "total_co2": 0, 
+            "stopped": 0, "time": "00:00:00",
+            "traci_calls": 0, "calls_saved": 0, "steps_per_sec": 0
         }
         self.accumulated_co2 = 0.0
+        self.type_codes = {}   # {vehicle type ID: index into VEHICLE_CLASSES}
+        self.steps_per_sec = 0.0
+        self.stream = FrameStream()  # Versioned deltas for /api/live_data?since=N
+        self.runner = None
+        self.publisher = None
+        # Binary frames (/api/live_data?format=bin); float32 offsets from the map center
+        center_lon, center_lat = self.projection.center_lonlat()
+        self.encoder = FrameEncoder(PALETTE, origin=(center_lat, center_lon))
+        self.latest_frame = (0, [], [], [], [])  # (frame, ids, lats, lons, type codes)
+        self.traci_calls = 0   # TraCI round-trips spent on the last step (simulationStep included)
+        self.calls_saved = 0   # vs. what the polling path would have needed
         
         # Simulation Start Time (Seconds from midnight)
         # Matching your sumocfg begin value (04:00 AM)
@@ -40,106 +106,237 @@ class SimulationManager:
 
     def start_simulation(self):
         if self.status == "Running": return
+        # The previous run's threads exit right after stop; wait for both before
+        # clearing the event, or a publisher still inside _publish would miss it
+        for thread in (self.runner, self.publisher):
+            if thread is not None:
+                thread.join()
         self.stop_event.clear()
         self.accumulated_co2 = 0.0 
-        thread = threading.Thread(target=self._run_loop)
-        thread.start()
+        self.steps_per_sec = 0.0
+        self.stream.reset()
+        self.status = "Running"
+        self.runner = threading.Thread(target=self._run_loop)
+        self.runner.start()
+        self.publisher = threading.Thread(target=self._publish_loop, daemon=True)
+        self.publisher.start()
 
     def stop_simulation(self):
         self.stop_event.set()
 
     def set_speed(self, delay_seconds):
         try:
-            self.sim_delay = max(0.001, float(delay_seconds)) # Allow faster speeds
-        except ValueError:
+            self.sim_delay = max(0.0, float(delay_seconds)) # 0 = max speed
+        except (TypeError, ValueError):
+            pass
+
+    def set_publish_every(self, steps):
+        try:
+            self.publish_every = max(1, int(steps))
+        except (TypeError, ValueError):
             pass
 
+    def set_collection_mode(self, mode):
+        """Select 'polling' or 'subscription'. Takes effect on the next start."""
+        if mode in COLLECTION_MODES:
+            self.collection_mode = mode
+            return True
+        return False
+
     def _run_loop(self):
+        """Stepping thread: advance SUMO and write raw arrays, nothing else."""
         self.status = "Running"
         
         try:
-            # Start TraCI (Headless)
+            # Start SUMO (Headless); libsumo ignores the binary name
             cmd = ["sumo", "-c", self.config_file, "--no-step-log", "true", "--step-length", "0.5"]
-            traci.start(cmd)
+            self.sumo.start(cmd)
+
+            # Fixed for the whole run so subscriptions stay consistent
+            mode = self.collection_mode
+            if mode == "subscription":
+                # The departed list comes back with the step reply, so this costs
+                # no extra round-trip per step. Arrivals aren't needed: SUMO drops
+                # their subscriptions and they vanish from the results by themselves
+                self.sumo.simulation.subscribe([self.tc.VAR_DEPARTED_VEHICLES_IDS])
 
             step = 0
+            window_start, window_steps = time.perf_counter(), 0
             while not self.stop_event.is_set():
-                traci.simulationStep()
+                self.sumo.simulationStep()
                 step += 1
                 
-                # Update Data for Frontend
                 # We calculate current time based on step + offset
                 current_sim_time = self.start_offset + (step * 0.5) # 0.5 is step-length
-                self._update_live_data(current_sim_time)
+                if mode == "subscription":
+                    vehicles = self._collect_subscribed()
+                else:
+                    vehicles = self._collect_polled()
+                self._record_step(step, current_sim_time, vehicles)
+
+                # Achieved steps/second, averaged over ~1s windows
+                window_steps += 1
+                elapsed = time.perf_counter() - window_start
+                if elapsed >= 1.0:
+                    self.steps_per_sec = window_steps / elapsed
+                    window_start, window_steps = time.perf_counter(), 0
                 
-                time.sleep(self.sim_delay) 
+                if self.sim_delay > 0:
+                    time.sleep(self.sim_delay) 
 
-            traci.close()
+            self.sumo.close()
             self.status = "Stopped"
 
         except Exception as e:
             self.status = f"Error: {str(e)}"
-            try: traci.close()
+            self.stop_event.set()
+            try: self.sumo.close()
             except: pass
 
-    def _update_live_data(self, sim_seconds):
-        veh_ids = traci.vehicle.getIDList()
-        total_veh = len(veh_ids)
+    def _publish_loop(self):
+        """Publisher thread: turn the newest snapshot into client frames, at its
+        own rate and only while somebody is watching."""
+        version = -1
+        last_step = None
+        while True:
+            stopping = self.stop_event.wait(1.0 / self.publish_hz)
+            if self.stream.has_clients():
+                snap = self.snapshots.read(version)
+                if snap is not None and (stopping or last_step is None
+                                         or snap.step - last_step >= self.publish_every):
+                    version, last_step = snap.version, snap.step
+                    self._publish(snap)
+            if stopping:
+                return
+
+    def _collect_polled(self):
+        """Original path: query every variable of every vehicle individually.
+
+        Returns a list of (id, co2, speed, (x, y), type) tuples.
+        """
+        sumo = self.sumo
+        veh_ids = sumo.vehicle.getIDList()
+        vehicles = [
+            (vid,
+             sumo.vehicle.getCO2Emission(vid),
+             sumo.vehicle.getSpeed(vid),
+             sumo.vehicle.getPosition(vid),
+             sumo.vehicle.getTypeID(vid))
+            for vid in veh_ids
+        ]
+        # simulationStep + getIDList + 4 getters per vehicle
+        self.traci_calls = 2 + 4 * len(veh_ids)
+        self.calls_saved = 0
+        return vehicles
+
+    def _collect_subscribed(self):
+        """Subscription path: subscribe newly departed vehicles, then read
+        everything back in one go. SUMO drops the subscription of arrived
+        vehicles by itself.
+
+        Returns the same tuples as _collect_polled.
+        """
+        sumo, tc = self.sumo, self.tc
+        sim_results = sumo.simulation.getSubscriptionResults()
+        departed = sim_results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        for vid in departed:
+            sumo.vehicle.subscribe(vid, self.vehicle_vars)
+
+        results = sumo.vehicle.getAllSubscriptionResults()
+        vehicles = [
+            (vid,
+             res[tc.VAR_CO2EMISSION],
+             res[tc.VAR_SPEED],
+             res[tc.VAR_POSITION],
+             res[tc.VAR_TYPE])
+            for vid, res in results.items()
+        ]
+
+        # Subscription results arrive with the simulationStep reply and are read
+        # locally; only the step itself and one subscribe per departure go over the socket
+        self.traci_calls = 1 + len(departed)
+        self.calls_saved = (2 + 4 * len(vehicles)) - self.traci_calls
+        return vehicles
+
+    def _record_step(self, step, sim_seconds, vehicles):
+        """Stepping-thread side: per-step metrics plus raw arrays for the publisher."""
+        total_veh = len(vehicles)
         
         # Format Time String (HH:MM:SS)
         # Using datetime for easy formatting
         time_str = (datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=sim_seconds)).strftime("%H:%M:%S")
 
-        # Defaults if empty
-        if total_veh == 0:
-            self.current_data['vehicles'] = []
-            self.current_data['stats'] = {
-                "count": 0, "speed": 0, 
-                "current_co2": 0, "total_co2": round(self.accumulated_co2, 2), 
-                "stopped": 0, "time": time_str
-            }
-            return
-
-        # 1. Metrics Calculation
-        step_co2_mg = sum([traci.vehicle.getCO2Emission(v) for v in veh_ids])
+        # 1. Metrics Calculation (every step, CO2 has to be accumulated even if nobody watches)
+        step_co2_mg = sum([v[1] for v in vehicles])
         step_co2_kg = step_co2_mg / 1000000.0
         self.accumulated_co2 += step_co2_kg
 
-        speeds = [traci.vehicle.getSpeed(v) for v in veh_ids]
-        avg_speed_ms = sum(speeds) / total_veh
-        avg_speed_kmh = avg_speed_ms * 3.6
+        speeds = [v[2] for v in vehicles]
+        avg_speed_kmh = (sum(speeds) / total_veh) * 3.6 if total_veh else 0
         stopped_count = len([s for s in speeds if s < 0.1])
 
-        # 2. Coordinate Mapping
-        live_vehicles = []
-        for vid in veh_ids:
-            x, y = traci.vehicle.getPosition(vid)
-            lon, lat = self.net.convertXY2LonLat(x, y)
-            vtype = traci.vehicle.getTypeID(vid)
-            
-            color = "#4D7CFE" # Default Car
-            radius = 2
-            if "bus" in vtype:
-                color = "#FF4B4B"
-                radius = 5
-            elif "student" in vtype: color = "#00FF99"
-            elif "ped" in vtype: color = "#FFD166"
-
-            live_vehicles.append({
-                "id": vid, "lat": lat, "lon": lon, "color": color, "radius": radius
-            })
-
-        self.current_data = {
-            "vehicles": live_vehicles,
-            "stats": {
-                "count": total_veh,
-                "speed": round(avg_speed_kmh, 1),
-                "current_co2": round(step_co2_kg, 4),
-                "total_co2": round(self.accumulated_co2, 2),
-                "stopped": stopped_count,
-                "time": time_str # <--- Sent to frontend
-            }
+        stats = {
+            "count": total_veh,
+            "speed": round(avg_speed_kmh, 1),
+            "current_co2": round(step_co2_kg, 4),
+            "total_co2": round(self.accumulated_co2, 2),
+            "stopped": stopped_count,
+            "time": time_str, # <--- Sent to frontend
+            "traci_calls": self.traci_calls,
+            "calls_saved": self.calls_saved,
+            "steps_per_sec": round(self.steps_per_sec, 1)
         }
 
+        # 2. Raw arrays (projection and styling happen in the publisher)
+        type_codes = self.type_codes
+        codes = []
+        for v in vehicles:
+            code = type_codes.get(v[4])
+            if code is None:
+                code = type_codes[v[4]] = vehicle_class(v[4])
+            codes.append(code)
+
+        self.snapshots.write(
+            step, sim_seconds,
+            [v[0] for v in vehicles],
+            [v[3][0] for v in vehicles],
+            [v[3][1] for v in vehicles],
+            codes, stats
+        )
+
+    def _publish(self, snap):
+        """Publisher-thread side: project one snapshot and hand it to the clients."""
+        # Coordinate Mapping (whole frame in one projection call)
+        lons, lats = self.projection.xy_to_lonlat(snap.x, snap.y)
+        lons, lats = lons.tolist(), lats.tolist()
+        codes = snap.codes.tolist()
+
+        frame_vehicles = [
+            (vid, lat, lon, PALETTE[code][0], PALETTE[code][1])
+            for vid, lat, lon, code in zip(snap.ids, lats, lons, codes)
+        ]
+
+        self.latest_stats = snap.stats
+        self.stream.publish(frame_vehicles, snap.stats)
+        self.latest_frame = (self.stream.frame, snap.ids, lats, lons, codes)
+
+    @property
+    def current_data(self):
+        """Latest frame in the original full-snapshot format (built on demand)."""
+        _, ids, lats, lons, codes = self.latest_frame
+        return {
+            "vehicles": [
+                {"id": vid, "lat": lat, "lon": lon, "color": PALETTE[code][0], "radius": PALETTE[code][1]}
+                for vid, lat, lon, code in zip(ids, lats, lons, codes)
+            ],
+            "stats": self.latest_stats
+        }
+
+    def encode_binary_frame(self, known_strings=0):
+        """Latest published frame in the binary format (see binary_frame.py)."""
+        frame, ids, lats, lons, codes = self.latest_frame
+        meta = {"status": self.status, "stats": self.latest_stats}
+        return self.encoder.encode(frame, ids, lats, lons, codes, meta, known_strings)
+
 # Global Manager
 manager = SimulationManager(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
\ No newline at end of file
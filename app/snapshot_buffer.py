@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+
+
+class Snapshot:
+    """Raw per-step vehicle arrays (SUMO x/y, not projected yet)."""
+
+    def __init__(self, capacity):
+        self.version = 0
+        self.step = 0
+        self.sim_time = 0.0
+        self.n = 0
+        self.ids = []
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.codes = np.zeros(capacity, dtype=np.uint8)
+        self.stats = {}
+
+    def fill(self, step, sim_time, ids, xs, ys, codes, stats):
+        n = len(ids)
+        if n > len(self.x):
+            capacity = max(n, 2 * len(self.x))
+            self.x = np.zeros(capacity)
+            self.y = np.zeros(capacity)
+            self.codes = np.zeros(capacity, dtype=np.uint8)
+        self.step = step
+        self.sim_time = sim_time
+        self.n = n
+        self.ids = ids
+        self.x[:n] = xs
+        self.y[:n] = ys
+        self.codes[:n] = codes
+        self.stats = stats
+
+    def copy(self):
+        """Trimmed copy that the reader can keep while the writer moves on."""
+        snap = Snapshot(0)
+        snap.version = self.version
+        snap.step = self.step
+        snap.sim_time = self.sim_time
+        snap.n = self.n
+        snap.ids = self.ids          # replaced (never mutated) by the writer
+        snap.x = self.x[:self.n].copy()
+        snap.y = self.y[:self.n].copy()
+        snap.codes = self.codes[:self.n].copy()
+        snap.stats = self.stats
+        return snap
+
+
+class SnapshotBuffer:
+    """Double buffer between the stepping thread (one writer) and the publisher.
+
+    The writer fills the back slot without any locking, then commit() swaps
+    it to the front. Readers only ever look at the front slot, under the lock,
+    so the stepping thread never waits for frame building.
+    """
+
+    def __init__(self, capacity=1024):
+        self.lock = threading.Lock()
+        self.slots = [Snapshot(capacity), Snapshot(capacity)]
+        self.front = 0
+        self.version = 0
+
+    def write(self, step, sim_time, ids, xs, ys, codes, stats):
+        back = self.slots[1 - self.front]
+        back.fill(step, sim_time, ids, xs, ys, codes, stats)
+        with self.lock:
+            self.version += 1
+            back.version = self.version
+            self.front = 1 - self.front
+
+    def read(self, since_version=-1):
+        """Copy of the newest snapshot, or None if nothing new since `since_version`."""
+        with self.lock:
+            if self.version == since_version:
+                return None
+            return self.slots[self.front].copy()
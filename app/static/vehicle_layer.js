@@ -0,0 +1,397 @@
+// Batched vehicle rendering for the live dashboard.
+//
+// VehicleStore keeps every vehicle in flat typed arrays (Web Mercator offsets
+// from an origin + a style index), with O(1) add/move/remove.
+// L.VehicleLayer draws the whole store in a single WebGL draw call: the map
+// transform and the per-type color/size are applied in the shaders, so panning
+// and zooming never touch the vehicle arrays. Falls back to Canvas 2D without WebGL.
+
+(function () {
+    const MAX_STYLES = 16;
+    const HIT_CELL_PX = 16;
+
+    function mercX(lon) { return (lon + 180) / 360; }
+    function mercY(lat) {
+        const s = Math.sin(lat * Math.PI / 180);
+        return 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+    }
+    function hexToRgb(hex) {
+        const v = parseInt(hex.slice(1), 16);
+        return [(v >> 16 & 255) / 255, (v >> 8 & 255) / 255, (v & 255) / 255];
+    }
+
+    class VehicleStore {
+        constructor(capacity) {
+            this.n = 0;
+            this.ids = [];
+            this.index = new Map();     // id -> slot
+            this.capacity = 0;
+            this._alloc(capacity || 1024);
+            this.originX = null;        // Mercator origin, keeps float32 offsets precise
+            this.originY = null;
+            this.styles = [];           // [[r, g, b], radius] by style index
+            this.styleKeys = new Map(); // "color|radius" -> style index
+            this.version = 0;
+        }
+
+        _alloc(capacity) {
+            const pos = new Float32Array(capacity * 2);
+            const types = new Uint8Array(capacity);
+            if (this.pos) {
+                pos.set(this.pos);
+                types.set(this.types);
+            }
+            this.pos = pos;
+            this.types = types;
+            this.capacity = capacity;
+        }
+
+        styleIndex(color, radius) {
+            const key = color + '|' + radius;
+            let idx = this.styleKeys.get(key);
+            if (idx === undefined) {
+                idx = Math.min(this.styles.length, MAX_STYLES - 1);
+                this.styles[idx] = [hexToRgb(color), radius];
+                this.styleKeys.set(key, idx);
+            }
+            return idx;
+        }
+
+        setPalette(palette) {
+            // Binary frames: type code == style index
+            this.styles = palette.map(([color, radius]) => [hexToRgb(color), radius]);
+            this.styleKeys = new Map(palette.map(([color, radius], i) => [color + '|' + radius, i]));
+        }
+
+        _set(i, lat, lon) {
+            if (this.originX === null) {
+                this.originX = mercX(lon);
+                this.originY = mercY(lat);
+            }
+            this.pos[2 * i] = mercX(lon) - this.originX;
+            this.pos[2 * i + 1] = mercY(lat) - this.originY;
+        }
+
+        upsert(id, lat, lon, style) {
+            let i = this.index.get(id);
+            if (i === undefined) {
+                if (this.n === this.capacity) this._alloc(this.capacity * 2);
+                i = this.n++;
+                this.index.set(id, i);
+                this.ids[i] = id;
+            }
+            this._set(i, lat, lon);
+            if (style !== undefined) this.types[i] = style;
+        }
+
+        remove(id) {
+            const i = this.index.get(id);
+            if (i === undefined) return;
+            const last = --this.n;
+            if (i !== last) {
+                // Swap the last vehicle into the hole
+                const moved = this.ids[last];
+                this.ids[i] = moved;
+                this.index.set(moved, i);
+                this.pos[2 * i] = this.pos[2 * last];
+                this.pos[2 * i + 1] = this.pos[2 * last + 1];
+                this.types[i] = this.types[last];
+            }
+            this.ids.length = last;
+            this.index.delete(id);
+        }
+
+        clear() {
+            this.n = 0;
+            this.ids = [];
+            this.index.clear();
+        }
+
+        applyDelta(frame) {
+            // JSON frames from /api/live_data?since=N and /api/stream
+            if (frame.full) this.clear();
+            for (const [id, lat, lon, color, radius] of frame.added) {
+                this.upsert(id, lat, lon, this.styleIndex(color, radius));
+            }
+            for (const [id, lat, lon] of frame.moved) {
+                if (this.index.has(id)) this.upsert(id, lat, lon);
+            }
+            for (const id of frame.removed) this.remove(id);
+            this.version++;
+        }
+
+        setBinary(f, idStrings) {
+            // Binary frames are full frames: rebuild all slots
+            this.clear();
+            if (f.n > this.capacity) this._alloc(Math.max(f.n, this.capacity * 2));
+            for (let i = 0; i < f.n; i++) {
+                const id = idStrings[f.ids[i]];
+                this.ids[i] = id;
+                this.index.set(id, i);
+                this._set(i, f.originLat + f.lat[i], f.originLon + f.lon[i]);
+            }
+            this.types.set(f.types);
+            this.n = f.n;
+            this.version++;
+        }
+    }
+
+    const VERTEX_SHADER = `
+        attribute vec2 a_pos;
+        attribute float a_type;
+        uniform vec2 u_offset;
+        uniform float u_scale;
+        uniform vec2 u_size;
+        uniform float u_dpr;
+        uniform vec3 u_colors[${MAX_STYLES}];
+        uniform float u_radius[${MAX_STYLES}];
+        varying vec3 v_color;
+        void main() {
+            vec2 px = (a_pos + u_offset) * u_scale;
+            vec2 clip = px / u_size * 2.0 - 1.0;
+            gl_Position = vec4(clip.x, -clip.y, 0.0, 1.0);
+            int t = int(a_type);
+            v_color = u_colors[t];
+            gl_PointSize = (u_radius[t] * 2.0 + 2.0) * u_dpr;
+        }`;
+
+    const FRAGMENT_SHADER = `
+        precision mediump float;
+        varying vec3 v_color;
+        void main() {
+            float d = length(gl_PointCoord - 0.5) * 2.0;
+            if (d > 1.0) discard;
+            vec3 rgb = d > 0.75 ? vec3(1.0) : v_color;   // white rim
+            gl_FragColor = vec4(rgb, 0.9);
+        }`;
+
+    function compile(gl, type, source) {
+        const shader = gl.createShader(type);
+        gl.shaderSource(shader, source);
+        gl.compileShader(shader);
+        if (!gl.getShaderParameter(shader, gl.COMPILE_STATUS)) throw new Error(gl.getShaderInfoLog(shader));
+        return shader;
+    }
+
+    L.VehicleLayer = L.Layer.extend({
+        initialize: function (store) {
+            this.store = store;
+            this.frames = 0;     // rendered frames, for the FPS readout
+            this._grid = null;
+        },
+
+        onAdd: function (map) {
+            // In the overlay pane like Leaflet's own renderers, so it moves with the map
+            const canvas = this._canvas = L.DomUtil.create('canvas', 'leaflet-vehicle-layer');
+            canvas.style.pointerEvents = 'none';
+            if (map._zoomAnimated) L.DomUtil.addClass(canvas, 'leaflet-zoom-animated');
+            map.getPane('overlayPane').appendChild(canvas);
+
+            const gl = canvas.getContext('webgl', {premultipliedAlpha: false});
+            if (gl) this._initGL(gl); else this._ctx = canvas.getContext('2d');
+
+            map.on('move zoom zoomend resize viewreset', this.redraw, this);
+            map.on('resize', this._resize, this);
+            map.on('click', this._onClick, this);
+            if (map._zoomAnimated) map.on('zoomanim', this._onAnimZoom, this);
+            this._resize();
+        },
+
+        onRemove: function (map) {
+            map.off('move zoom zoomend resize viewreset', this.redraw, this);
+            map.off('resize', this._resize, this);
+            map.off('click', this._onClick, this);
+            map.off('zoomanim', this._onAnimZoom, this);
+            if (this._pending) L.Util.cancelAnimFrame(this._pending);
+            this._pending = null;
+            this._canvas.remove();
+        },
+
+        _onAnimZoom: function (e) {
+            // Scale the last drawn frame along with the tiles, as L.Renderer does;
+            // the next render after zoomend redraws it at the new zoom
+            if (!this._center) return;
+            const map = this._map;
+            const scale = map.getZoomScale(e.zoom, this._zoom);
+            const topLeft = map.getSize().multiplyBy(-0.5 * scale)
+                .add(map.project(this._center, e.zoom))
+                .subtract(map._getNewPixelOrigin(e.center, e.zoom));
+            L.DomUtil.setTransform(this._canvas, topLeft, scale);
+        },
+
+        _initGL: function (gl) {
+            const program = gl.createProgram();
+            gl.attachShader(program, compile(gl, gl.VERTEX_SHADER, VERTEX_SHADER));
+            gl.attachShader(program, compile(gl, gl.FRAGMENT_SHADER, FRAGMENT_SHADER));
+            gl.linkProgram(program);
+            gl.useProgram(program);
+
+            this._gl = gl;
+            this._attr = {pos: gl.getAttribLocation(program, 'a_pos'), type: gl.getAttribLocation(program, 'a_type')};
+            this._uni = {};
+            for (const name of ['u_offset', 'u_scale', 'u_size', 'u_dpr', 'u_colors', 'u_radius']) {
+                this._uni[name] = gl.getUniformLocation(program, name);
+            }
+            this._posBuffer = gl.createBuffer();
+            this._typeBuffer = gl.createBuffer();
+            gl.enable(gl.BLEND);
+            gl.blendFunc(gl.SRC_ALPHA, gl.ONE_MINUS_SRC_ALPHA);
+        },
+
+        _resize: function () {
+            const size = this._map.getSize();
+            const dpr = window.devicePixelRatio || 1;
+            this._canvas.width = size.x * dpr;
+            this._canvas.height = size.y * dpr;
+            this._canvas.style.width = size.x + 'px';
+            this._canvas.style.height = size.y + 'px';
+            this.redraw();
+        },
+
+        redraw: function () {
+            if (!this._pending && this._map) {
+                this._pending = L.Util.requestAnimFrame(this._render, this);
+            }
+        },
+
+        _view: function () {
+            // Mercator units -> container pixels: px = (pos + offset) * scale
+            const map = this._map;
+            const scale = 256 * Math.pow(2, map.getZoom());
+            const topLeft = map.getPixelBounds().min;
+            return {
+                scale: scale,
+                offX: this.store.originX - topLeft.x / scale,
+                offY: this.store.originY - topLeft.y / scale,
+            };
+        },
+
+        _render: function () {
+            this._pending = null;
+            const map = this._map;
+            // Mid zoom animation the canvas is CSS-scaled; zoomend redraws it
+            if (!map || map._animatingZoom) return;
+            this.frames++;
+            // Pin the canvas to the container's top-left corner in layer coordinates
+            L.DomUtil.setPosition(this._canvas, map.containerPointToLayerPoint([0, 0]));
+            this._center = map.getCenter();
+            this._zoom = map.getZoom();
+            const store = this.store;
+            if (store.originX === null) return;
+            const view = this._view();
+            if (this._gl) this._renderGL(view); else this._render2D(view);
+        },
+
+        _renderGL: function (view) {
+            const gl = this._gl, store = this.store, n = store.n;
+            const size = this._map.getSize();
+            const dpr = window.devicePixelRatio || 1;
+
+            gl.viewport(0, 0, this._canvas.width, this._canvas.height);
+            gl.clearColor(0, 0, 0, 0);
+            gl.clear(gl.COLOR_BUFFER_BIT);
+            if (!n) return;
+
+            const colors = new Float32Array(MAX_STYLES * 3);
+            const radius = new Float32Array(MAX_STYLES);
+            store.styles.forEach(([rgb, r], i) => { colors.set(rgb, 3 * i); radius[i] = r; });
+            gl.uniform3fv(this._uni.u_colors, colors);
+            gl.uniform1fv(this._uni.u_radius, radius);
+            gl.uniform2f(this._uni.u_offset, view.offX, view.offY);
+            gl.uniform1f(this._uni.u_scale, view.scale);
+            gl.uniform2f(this._uni.u_size, size.x, size.y);
+            gl.uniform1f(this._uni.u_dpr, dpr);
+
+            // Only re-upload vehicle arrays when the data changed, not on pan/zoom
+            if (this._uploaded !== store.version) {
+                gl.bindBuffer(gl.ARRAY_BUFFER, this._posBuffer);
+                gl.bufferData(gl.ARRAY_BUFFER, store.pos.subarray(0, 2 * n), gl.DYNAMIC_DRAW);
+                gl.bindBuffer(gl.ARRAY_BUFFER, this._typeBuffer);
+                gl.bufferData(gl.ARRAY_BUFFER, store.types.subarray(0, n), gl.DYNAMIC_DRAW);
+                this._uploaded = store.version;
+            }
+            gl.bindBuffer(gl.ARRAY_BUFFER, this._posBuffer);
+            gl.enableVertexAttribArray(this._attr.pos);
+            gl.vertexAttribPointer(this._attr.pos, 2, gl.FLOAT, false, 0, 0);
+            gl.bindBuffer(gl.ARRAY_BUFFER, this._typeBuffer);
+            gl.enableVertexAttribArray(this._attr.type);
+            gl.vertexAttribPointer(this._attr.type, 1, gl.UNSIGNED_BYTE, false, 0, 0);
+
+            gl.drawArrays(gl.POINTS, 0, n);
+        },
+
+        _render2D: function (view) {
+            const ctx = this._ctx, store = this.store;
+            const dpr = window.devicePixelRatio || 1;
+            ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+            ctx.clearRect(0, 0, this._canvas.width, this._canvas.height);
+
+            // One path per style keeps fill state changes to a minimum
+            store.styles.forEach(([rgb, r], style) => {
+                ctx.beginPath();
+                for (let i = 0; i < store.n; i++) {
+                    if (store.types[i] !== style) continue;
+                    const x = (store.pos[2 * i] + view.offX) * view.scale;
+                    const y = (store.pos[2 * i + 1] + view.offY) * view.scale;
+                    ctx.moveTo(x + r, y);
+                    ctx.arc(x, y, r, 0, 2 * Math.PI);
+                }
+                ctx.fillStyle = `rgb(${rgb.map(c => Math.round(c * 255)).join(',')})`;
+                ctx.fill();
+            });
+        },
+
+        _buildGrid: function (view) {
+            // Screen-space hash grid, rebuilt only when data or zoom changed
+            const store = this.store, cells = new Map();
+            for (let i = 0; i < store.n; i++) {
+                const cx = Math.floor((store.pos[2 * i] + store.originX) * view.scale / HIT_CELL_PX);
+                const cy = Math.floor((store.pos[2 * i + 1] + store.originY) * view.scale / HIT_CELL_PX);
+                const key = cx + ',' + cy;
+                const cell = cells.get(key);
+                if (cell) cell.push(i); else cells.set(key, [i]);
+            }
+            return {version: store.version, scale: view.scale, cells: cells};
+        },
+
+        hitTest: function (containerPoint) {
+            // Nearest vehicle under a container point, or null
+            const store = this.store;
+            if (!store.n) return null;
+            const view = this._view();
+            if (!this._grid || this._grid.version !== store.version || this._grid.scale !== view.scale) {
+                this._grid = this._buildGrid(view);
+            }
+            // World pixel of the click (grid is in world pixels so panning doesn't invalidate it)
+            const wx = containerPoint.x + (store.originX - view.offX) * view.scale;
+            const wy = containerPoint.y + (store.originY - view.offY) * view.scale;
+            const cx = Math.floor(wx / HIT_CELL_PX), cy = Math.floor(wy / HIT_CELL_PX);
+
+            let best = null, bestDist = Infinity;
+            for (let dx = -1; dx <= 1; dx++) {
+                for (let dy = -1; dy <= 1; dy++) {
+                    const cell = this._grid.cells.get((cx + dx) + ',' + (cy + dy));
+                    if (!cell) continue;
+                    for (const i of cell) {
+                        const px = (store.pos[2 * i] + store.originX) * view.scale - wx;
+                        const py = (store.pos[2 * i + 1] + store.originY) * view.scale - wy;
+                        const d = px * px + py * py;
+                        const r = (store.styles[store.types[i]] || [null, 2])[1] + 3;
+                        if (d < r * r && d < bestDist) { best = i; bestDist = d; }
+                    }
+                }
+            }
+            return best === null ? null : store.ids[best];
+        },
+
+        _onClick: function (e) {
+            const id = this.hitTest(e.containerPoint);
+            if (id !== null) {
+                L.popup().setLatLng(e.latlng).setContent(`<b>ID:</b> ${id}`).openOn(this._map);
+            }
+        },
+    });
+
+    L.vehicleLayer = function (store) { return new L.VehicleLayer(store); };
+    window.VehicleStore = VehicleStore;
+})();
@@ -0,0 +1,56 @@
+import os
+import importlib
+
+# --- BACKENDS ---
+# Both modules expose the same API (start, close, simulationStep, vehicle.*, ...)
+# "libsumo": SUMO runs inside this process, no socket serialization
+# "traci":   SUMO runs as a separate process, queries go over a socket
+BACKENDS = ("libsumo", "traci")
+
+# "auto" picks libsumo when it is installed and falls back to traci
+DEFAULT_BACKEND = os.environ.get("SUMO_BACKEND", "auto")
+
+
+def available_backends():
+    """Returns the backend names that can be imported here, in preference order."""
+    found = []
+    for name in BACKENDS:
+        try:
+            importlib.import_module(name)
+            found.append(name)
+        except ImportError:
+            pass
+    return found
+
+
+def load_backend(name=None):
+    """Returns (name, module) for the requested backend.
+
+    name: "libsumo", "traci" or "auto" (default: SUMO_BACKEND env var, then "auto").
+    Raises ImportError if an explicitly requested backend is not installed.
+    """
+    name = (name or DEFAULT_BACKEND).lower()
+
+    if name == "auto":
+        for candidate in BACKENDS:
+            try:
+                return candidate, importlib.import_module(candidate)
+            except ImportError:
+                continue
+        raise ImportError("Neither libsumo nor traci is installed.")
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SUMO backend '{name}'. Use one of {BACKENDS} or 'auto'.")
+    return name, importlib.import_module(name)
+
+
+def backend_constants(module):
+    """The TraCI constants (VAR_SPEED, ...) of a loaded backend module.
+
+    traci ships them as traci.constants, libsumo as libsumo.constants, so
+    a libsumo-only install doesn't need traci importable.
+    """
+    constants = getattr(module, "constants", None)
+    if constants is None:
+        constants = importlib.import_module(module.__name__ + ".constants")
+    return constants
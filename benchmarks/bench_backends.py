@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "app"))
+
+from sumo_backend import BACKENDS, available_backends, backend_constants, load_backend
+
+CONFIG_FILE = os.path.join(PROJECT_ROOT, "simulation.sumocfg")
+
+
+def run_backend(name, steps):
+    """Steps simulation.sumocfg with one backend, collecting the same vehicle
+    variables as the dashboard (subscription mode). Returns steps per second."""
+    _, sumo = load_backend(name)
+    tc = backend_constants(sumo)
+
+    sumo.start(["sumo", "-c", CONFIG_FILE, "--no-step-log", "true", "--step-length", "0.5"])
+    sumo.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS])
+    wanted = (tc.VAR_CO2EMISSION, tc.VAR_SPEED, tc.VAR_POSITION, tc.VAR_TYPE)
+
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        sumo.simulationStep()
+        for vid in sumo.simulation.getSubscriptionResults().get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
+            sumo.vehicle.subscribe(vid, wanted)
+        sumo.vehicle.getAllSubscriptionResults()
+    elapsed = time.perf_counter() - t0
+
+    sumo.close()
+    return steps / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steps/second per SUMO backend on simulation.sumocfg")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--backend", choices=BACKENDS, help="(internal) run a single backend")
+    args = parser.parse_args()
+
+    if args.backend:
+        print(f"{run_backend(args.backend, args.steps):.1f}")
+        return
+
+    print(f"--- SUMO backend benchmark ({args.steps} steps) ---")
+    for name in available_backends():
+        # One child process per backend so libsumo and traci never share state
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--backend", name, "--steps", str(args.steps)],
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"  {name:8s}: failed\n{result.stderr}")
+            continue
+        print(f"  {name:8s}: {float(result.stdout.strip().splitlines()[-1]):8.1f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
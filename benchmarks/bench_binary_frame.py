@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import time
+import random
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "app"))
+
+from binary_frame import FrameEncoder, decode_frame
+
+SIZES = [1000, 5000, 20000]
+REPEATS = 20
+CENTER = (49.142, 9.218)
+PALETTE = [["#FF4B4B", 5], ["#00FF99", 2], ["#FFD166", 2], ["#4D7CFE", 2]]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        result = fn()
+    return result, (time.perf_counter() - t0) / REPEATS * 1000
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'vehicles':>9} | {'json KiB':>9} {'ser ms':>7} {'parse ms':>8} | "
+          f"{'bin KiB':>8} {'ser ms':>7} {'parse ms':>8} | {'size':>6}")
+
+    for n in SIZES:
+        ids = [f"evening_{i}" for i in range(n)]
+        lats = [CENTER[0] + rng.uniform(-0.02, 0.02) for _ in range(n)]
+        lons = [CENTER[1] + rng.uniform(-0.03, 0.03) for _ in range(n)]
+        types = [rng.randrange(len(PALETTE)) for _ in range(n)]
+        stats = {"count": n}
+
+        # Current JSON: full vehicle dicts
+        vehicles = [{"id": i, "lat": la, "lon": lo, "color": PALETTE[t][0], "radius": PALETTE[t][1]}
+                    for i, la, lo, t in zip(ids, lats, lons, types)]
+        body, json_ser = timed(lambda: json.dumps({"status": "Running",
+                                                   "data": {"vehicles": vehicles, "stats": stats}}))
+        _, json_parse = timed(lambda: json.loads(body))
+
+        # Binary: steady state, client already knows every ID (new encoder per run -> no frame cache)
+        warm = FrameEncoder(PALETTE, origin=CENTER)
+        warm.encode(0, ids, lats, lons, types, {"stats": stats})
+        frames = iter(range(1, REPEATS + 1))
+        blob, bin_ser = timed(lambda: warm.encode(next(frames), ids, lats, lons, types,
+                                                  {"status": "Running", "stats": stats}, n))
+        known = list(ids)
+        (_, dec_ids, dec_lat, dec_lon, _), bin_parse = timed(lambda: decode_frame(blob, known))
+
+        assert dec_ids == ids
+        assert max(abs(a - b) for a, b in zip(dec_lat.tolist(), lats)) < 1e-6
+
+        print(f"{n:>9} | {len(body) / 1024:>9.1f} {json_ser:>7.2f} {json_parse:>8.2f} | "
+              f"{len(blob) / 1024:>8.1f} {bin_ser:>7.2f} {bin_parse:>8.2f} | {len(body) / len(blob):>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
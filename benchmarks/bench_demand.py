@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import sumolib
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+
+from net_cache import load_net
+from demand import MIN_DISTANCE, TripGenerator, window_seed
+from xml_writer import iter_children
+
+NET_FILE = os.path.join(PROJECT_ROOT, "network", "sumo", "heilbronn.net.xml")
+WINDOWS = [   # the car/pedestrian generators' day
+    (0, 21600, 5.0), (21600, 32400, 0.7), (32400, 57600, 1.5),
+    (57600, 68400, 0.7), (68400, 79200, 2.0), (79200, 86400, 4.0),
+]
+SWEEP = [0.7, 1.5, 5.0]   # period sensitivity: the whole day at one period
+
+
+class Reference:
+    """Candidate edges and endpoint coordinates the way randomTrips picks them, from sumolib's net model.
+
+    Built independently of TripGenerator, so a wrong permission or fringe
+    rule there shows up as trips outside these sets.
+    """
+
+    def __init__(self, sumo_net, vclass, persons=False, allow_fringe=False):
+        self.persons = persons
+        self.sources, self.sinks = set(), set()
+        self.origin, self.dest = {}, {}
+        for edge in sumo_net.getEdges(withInternal=False):
+            if not edge.allows(vclass):
+                continue
+            eid = edge.getID()
+            if allow_fringe or persons or edge.getOutgoing():
+                self.sources.add(eid)
+            if allow_fringe or persons or edge.getIncoming():
+                self.sinks.add(eid)
+            self.origin[eid] = edge.getFromNode().getCoord()
+            # persons: to the destination's from-node, as randomTrips does with --persontrips
+            self.dest[eid] = (edge.getFromNode() if persons else edge.getToNode()).getCoord()
+
+
+def check(reference, path, begin, end, period):
+    """Departures sorted and inside the window, pairs far enough apart, count close to (end - begin) / period."""
+    departs, origins, destinations = [], [], []
+    for elem in iter_children(path)[1]:
+        if elem.tag == "vType":
+            continue
+        trip = elem.find("personTrip") if reference.persons else elem
+        departs.append(float(elem.get("depart")))
+        origins.append(trip.get("from"))
+        destinations.append(trip.get("to"))
+    departs = np.array(departs)
+    expected = (end - begin) / period
+    problems = []
+    if np.any(np.diff(departs) < 0) or np.any(departs < begin) or np.any(departs >= end):
+        problems.append("departures not sorted inside the window")
+    if not (reference.sources.issuperset(origins) and reference.sinks.issuperset(destinations)):
+        problems.append("origin/destination outside the candidate edges")
+    elif any(np.hypot(*np.subtract(reference.dest[to], reference.origin[frm])) < MIN_DISTANCE
+             for frm, to in zip(origins, destinations)):
+        problems.append("trip shorter than the minimum distance")
+    if abs(len(departs) - expected) > 5 * np.sqrt(expected):
+        problems.append(f"{len(departs)} trips, expected about {expected:.0f}")
+    return len(departs), problems
+
+
+def main():
+    net_file = sys.argv[1] if len(sys.argv) > 1 else NET_FILE
+    t0 = time.perf_counter()
+    net = load_net(net_file)
+    generators = {"car": TripGenerator(net, "passenger", allow_fringe=True),
+                  "pedestrian": TripGenerator(net, persons=True)}
+    print(f"Setup:          {time.perf_counter() - t0:.3f}s")
+    sumo_net = sumolib.net.readNet(net_file)
+    references = {"car": Reference(sumo_net, "passenger", allow_fringe=True),
+                  "pedestrian": Reference(sumo_net, "pedestrian", persons=True)}
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, generator in generators.items():
+            t0 = time.perf_counter()
+            files = []
+            for k, (begin, end, period) in enumerate(WINDOWS):
+                path = os.path.join(tmp_dir, f"{name}.{k}.xml")
+                generator.write(path, begin, end, period, f"{name}{k}_", window_seed(42, f"{name}{k}"))
+                files.append((path, begin, end, period))
+            elapsed = time.perf_counter() - t0
+            total = 0
+            for path, begin, end, period in files:
+                count, problems = check(references[name], path, begin, end, period)
+                total += count
+                for problem in problems:
+                    print(f"❌ {name} {begin}-{end}: {problem}")
+                    failed = True
+            print(f"{name + ' day:':<16}{total} trips in {elapsed:.3f}s")
+
+        generator = generators["car"]
+        for period in SWEEP:
+            path = os.path.join(tmp_dir, f"sweep.{period}.xml")
+            t0 = time.perf_counter()
+            count = generator.write(path, 0, 86400, period, "s_", window_seed(42, f"sweep{period}"))
+            print(f"period {period:<8} {count} trips in {time.perf_counter() - t0:.3f}s")
+
+        # The scripts allow fringe edges for cars; check the fringe rule itself on one window
+        path = os.path.join(tmp_dir, "no_fringe.xml")
+        TripGenerator(net, "passenger").write(path, 32400, 57600, 1.5, "nf_", window_seed(42, "no_fringe"))
+        for problem in check(Reference(sumo_net, "passenger"), path, 32400, 57600, 1.5)[1]:
+            print(f"❌ car without fringe edges: {problem}")
+            failed = True
+
+    if failed:
+        sys.exit("❌ Generated demand breaks the randomTrips semantics")
+    print("✅ Sorted departures, minimum distance, candidate edges and rates as expected")
+
+
+if __name__ == "__main__":
+    main()
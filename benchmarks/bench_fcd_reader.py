@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+
+from fcd_reader import iter_timesteps
+
+TRACE_FILE = sys.argv[1] if len(sys.argv) > 1 else os.path.join(PROJECT_ROOT, "results", "trace.xml")
+SKIP_FRACTION = 0.9   # skip-ahead test starts 90% of the way into the trace
+
+
+def iterparse_loop(path):
+    """The loop the visualizers used: Element tree per timestep, findall + float()."""
+    steps = rows = 0
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == "timestep":
+            float(elem.attrib["time"])
+            for veh in elem.findall("vehicle") + elem.findall("person"):
+                veh.attrib["id"], veh.attrib.get("type")
+                float(veh.attrib["x"]), float(veh.attrib["y"]), float(veh.attrib.get("speed", 0))
+                rows += 1
+            steps += 1
+            root.clear()
+    return steps, rows
+
+
+def reader_loop(path, begin=None):
+    steps = rows = 0
+    last = None
+    for t, frame in iter_timesteps(path, begin):
+        steps += 1
+        rows += len(frame["id"])
+        last = t
+    return steps, rows, last
+
+
+def main():
+    size_mb = os.path.getsize(TRACE_FILE) / 1e6
+    print(f"Trace: {TRACE_FILE} ({size_mb:.1f} MB)")
+
+    t0 = time.perf_counter()
+    ref_steps, ref_rows = iterparse_loop(TRACE_FILE)
+    t_iterparse = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    steps, rows, last = reader_loop(TRACE_FILE)
+    t_reader = time.perf_counter() - t0
+
+    print(f"iterparse:   {t_iterparse:.2f}s  {size_mb / t_iterparse:6.1f} MB/s")
+    print(f"fcd_reader:  {t_reader:.2f}s  {size_mb / t_reader:6.1f} MB/s ({t_iterparse / t_reader:.1f}x)")
+    if (steps, rows) != (ref_steps, ref_rows):
+        sys.exit(f"❌ Row counts differ: {steps}/{rows} vs {ref_steps}/{ref_rows}")
+    print(f"✅ Same {steps} timesteps / {rows} rows")
+
+    if last is not None:
+        begin = last * SKIP_FRACTION
+        t0 = time.perf_counter()
+        skip_steps, _, _ = reader_loop(TRACE_FILE, begin)
+        t_skip = time.perf_counter() - t0
+        print(f"skip to t={begin:.0f}s: {t_skip:.2f}s for the last {skip_steps} timesteps")
+
+
+if __name__ == "__main__":
+    main()
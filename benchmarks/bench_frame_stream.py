@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import random
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "app"))
+
+from frame_stream import FrameStream
+
+N_VEHICLES = 5000
+N_FRAMES = 200
+MOVING_SHARE = 0.05       # share of vehicles that move more than the threshold per step
+CHURN_PER_FRAME = 5       # vehicles that leave / enter per step
+CENTER = (49.142, 9.218)
+
+
+def make_vehicles(n, rng):
+    return {
+        f"veh_{i}": [CENTER[0] + rng.uniform(-0.02, 0.02), CENTER[1] + rng.uniform(-0.03, 0.03),
+                     "#4D7CFE", 2]
+        for i in range(n)
+    }
+
+
+def step(vehicles, rng, next_id):
+    for v in vehicles.values():
+        if rng.random() < MOVING_SHARE:
+            v[0] += rng.uniform(-5e-5, 5e-5)   # a few meters
+            v[1] += rng.uniform(-5e-5, 5e-5)
+        else:
+            v[0] += rng.uniform(-1e-7, 1e-7)   # centimeter jitter
+    for vid in rng.sample(list(vehicles), CHURN_PER_FRAME):
+        del vehicles[vid]
+    for _ in range(CHURN_PER_FRAME):
+        vehicles[f"veh_{next_id}"] = [CENTER[0], CENTER[1], "#FF4B4B", 5]
+        next_id += 1
+    return next_id
+
+
+def main():
+    rng = random.Random(0)
+    vehicles = make_vehicles(N_VEHICLES, rng)
+    stream = FrameStream()
+    next_id = N_VEHICLES
+
+    full_bytes = full_time = 0.0
+    delta_bytes = delta_time = 0.0
+    cursor = 0
+
+    for _ in range(N_FRAMES):
+        next_id = step(vehicles, rng, next_id)
+        stats = {"count": len(vehicles)}
+        stream.publish(((vid, v[0], v[1], v[2], v[3]) for vid, v in vehicles.items()), stats)
+
+        # Legacy: whole current_data per poll
+        t0 = time.perf_counter()
+        legacy = json.dumps({"status": "Running", "data": {
+            "vehicles": [{"id": vid, "lat": v[0], "lon": v[1], "color": v[2], "radius": v[3]}
+                         for vid, v in vehicles.items()],
+            "stats": stats}})
+        full_time += time.perf_counter() - t0
+        full_bytes += len(legacy)
+
+        # Delta: since the previous poll
+        t0 = time.perf_counter()
+        payload = stream.delta(cursor)
+        payload["status"] = "Running"
+        body = json.dumps(payload)
+        delta_time += time.perf_counter() - t0
+        delta_bytes += len(body)
+        cursor = payload["frame"]
+
+    print(f"--- {N_VEHICLES} vehicles, {N_FRAMES} polls ---")
+    print(f"full snapshot: {full_bytes / N_FRAMES / 1024:8.1f} KiB/poll  {full_time / N_FRAMES * 1000:7.2f} ms/poll")
+    print(f"delta frame:   {delta_bytes / N_FRAMES / 1024:8.1f} KiB/poll  {delta_time / N_FRAMES * 1000:7.2f} ms/poll")
+    print(f"reduction:     {full_bytes / delta_bytes:8.1f}x bytes      {full_time / delta_time:7.1f}x cpu")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "bus", "process_gtfs"))
+
+import import_gtfs_data_buses as gtfs_import
+
+N_TRIPS = 3000
+N_STOPS = 800
+BLOCK_SIZE = 4   # trips per block, on average
+
+
+def synthetic_feed(rng):
+    """trips / stop_times DataFrames shaped like the real feed (str columns)."""
+    trip_ids = np.array([f"trip-{i}" for i in range(N_TRIPS)], dtype=object)
+    blocks = np.array([f"block-{i}" for i in rng.integers(0, N_TRIPS // BLOCK_SIZE, N_TRIPS)], dtype=object)
+    blocks[rng.random(N_TRIPS) < 0.2] = np.nan   # falls back to the trip id
+    trips = pd.DataFrame({"route_id": [f"route-{i % 50}" for i in range(N_TRIPS)], "service_id": "weekday",
+                          "trip_id": trip_ids, "block_id": blocks}, dtype=str)
+
+    counts = rng.integers(5, 30, N_TRIPS)
+    seq = np.concatenate([rng.permutation(n) + 1 for n in counts])
+    # timetables are in whole minutes
+    arrival = np.repeat(rng.integers(4 * 60, 26 * 60, N_TRIPS) * 60, counts) + seq * 120
+    departure = arrival + rng.integers(0, 2, len(seq)) * 60
+    fmt = lambda secs: [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in secs.tolist()]
+    stop_times = pd.DataFrame({"trip_id": np.repeat(trip_ids, counts), "arrival_time": fmt(arrival),
+                               "departure_time": fmt(departure),
+                               "stop_id": [f"stop-{i}" for i in rng.integers(0, N_STOPS, len(seq))],
+                               "stop_sequence": seq})
+    return trips, stop_times
+
+
+def seconds_from_midnight(time_str):
+    try:
+        if pd.isna(time_str): return 0
+        parts = list(map(int, time_str.split(':')))
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    except:
+        return 0
+
+
+def reference_blocks(trips_df, stop_times_df, active_services):
+    """The previous per-block iterrows() implementation, for comparison."""
+    root = ET.Element("routes")
+    vtype = ET.SubElement(root, "vType")
+    for key, value in (("id", "bus_standard"), ("vClass", "ignoring"), ("accel", "2.0"), ("decel", "4.0"),
+                       ("length", "12")):
+        vtype.set(key, value)
+    trips_df = trips_df[trips_df['service_id'].isin(active_services)].copy()
+    stop_times_df = stop_times_df[stop_times_df['trip_id'].isin(set(trips_df['trip_id']))]
+    stop_times_grouped = stop_times_df.groupby('trip_id')
+    trips_df['block_id'] = trips_df['block_id'].fillna(trips_df['trip_id'])
+
+    for block_id, block_trips in trips_df.groupby('block_id'):
+        trip_sequence = []
+        for _, trip in block_trips.iterrows():
+            t_id = trip['trip_id']
+            if t_id in stop_times_grouped.groups:
+                first_stop = stop_times_grouped.get_group(t_id).sort_values('stop_sequence').iloc[0]
+                trip_sequence.append({'start_time': seconds_from_midnight(first_stop['arrival_time']),
+                                      'trip_id': t_id})
+        trip_sequence.sort(key=lambda x: x['start_time'])
+        if not trip_sequence:
+            continue
+        vehicle = ET.SubElement(root, "vehicle")
+        vehicle.set("id", str(block_id))
+        vehicle.set("type", "bus_standard")
+        vehicle.set("depart", str(trip_sequence[0]['start_time']))
+        vehicle.set("color", "1,0,0")
+        for trip_data in trip_sequence:
+            stops = stop_times_grouped.get_group(trip_data['trip_id']).sort_values('stop_sequence')
+            for _, stop_row in stops.iterrows():
+                arrival = seconds_from_midnight(stop_row['arrival_time'])
+                departure = seconds_from_midnight(stop_row['departure_time'])
+                stop_elem = ET.SubElement(vehicle, "stop")
+                stop_elem.set("busStop", str(stop_row['stop_id']))
+                stop_elem.set("duration", str(max(0, departure - arrival)))
+    return root
+
+
+def main():
+    rng = np.random.default_rng(0)
+    trips, stop_times = synthetic_feed(rng)
+    active = {"weekday"}
+
+    out_dir = tempfile.mkdtemp()
+    try:
+        expected_path = os.path.join(out_dir, "expected.rou.xml")
+        result_path = os.path.join(out_dir, "result.rou.xml")
+        t0 = time.perf_counter()
+        ET.ElementTree(reference_blocks(trips, stop_times, active)).write(expected_path, encoding="utf-8")
+        t_loop = time.perf_counter() - t0
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            gtfs_import.create_routes_xml_blocks(trips.copy(), stop_times, active, "benchmark", result_path)
+            t_vec = time.perf_counter() - t0
+        # same elements and attributes, whatever the indentation
+        expected = ET.canonicalize(from_file=expected_path, strip_text=True)
+        result = ET.canonicalize(from_file=result_path, strip_text=True)
+    finally:
+        shutil.rmtree(out_dir)
+
+    print(f"Trips:        {N_TRIPS} ({len(stop_times)} stop times)")
+    print(f"iterrows:     {t_loop:.3f}s")
+    print(f"vectorized:   {t_vec:.3f}s ({t_loop / t_vec:.0f}x)")
+    if result != expected:
+        sys.exit("❌ Routes differ from the iterrows() implementation")
+    print("✅ Identical routes")
+
+
+if __name__ == "__main__":
+    main()
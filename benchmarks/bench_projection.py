@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+import numpy as np
+import sumolib
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+
+from projection import get_projection
+
+NET_FILE = os.path.join(PROJECT_ROOT, "network", "sumo", "heilbronn.net.xml")
+N_POINTS = 100000
+TOLERANCE_DEG = 1e-7
+
+
+def main():
+    net = sumolib.net.readNet(NET_FILE)
+    projection = get_projection(NET_FILE)
+
+    x0, y0, x1, y1 = net.getBoundary()
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(x0, x1, N_POINTS)
+    ys = rng.uniform(y0, y1, N_POINTS)
+
+    t0 = time.perf_counter()
+    expected = np.array([net.convertXY2LonLat(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    lons, lats = projection.xy_to_lonlat(xs, ys)
+    t_vec = time.perf_counter() - t0
+
+    err = max(np.abs(lons - expected[:, 0]).max(), np.abs(lats - expected[:, 1]).max())
+    print(f"Points:       {N_POINTS}")
+    print(f"sumolib loop: {t_loop:.3f}s")
+    print(f"vectorized:   {t_vec:.3f}s ({t_loop / t_vec:.0f}x)")
+    print(f"max error:    {err:.2e} deg")
+    if err > TOLERANCE_DEG:
+        sys.exit(f"❌ Projection differs from sumolib by more than {TOLERANCE_DEG} deg")
+    print("✅ Matches sumolib")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+
+import numpy as np
+import sumolib
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "bus", "process_gtfs"))
+
+from net_cache import load_net
+from xml_writer import iter_children
+import filter_stops
+
+NET_FILE = os.path.join(PROJECT_ROOT, "network", "sumo", "heilbronn.net.xml")
+STOPS_FILE = os.path.join(PROJECT_ROOT, "intermediate", "bus", "sumo_stops.add.xml")
+TOLERANCE_M = 1e-6   # float noise between sumolib's geometry and the lane index
+
+
+def reference_match(sumo_net, lane_index, lons, lats):
+    """The replaced matching: sumolib's readNet model, getNeighboringLanes() + polygonOffsetAndDistanceToPoint().
+
+    Lanes are returned as indices into the cached net's lane_ids, along with
+    each stop's distance to its lane (for telling ties apart).
+    """
+    lanes, positions, dists = [], [], []
+    for lon, lat in zip(lons.tolist(), lats.tolist()):
+        x, y = sumo_net.convertLonLat2XY(lon, lat)
+        best_lane, best_dist = None, float("inf")
+        for lane, dist in sumo_net.getNeighboringLanes(x, y, filter_stops.LANE_SEARCH_RADIUS, includeJunctions=False):
+            if lane.allows("bus") and dist < best_dist:
+                best_lane, best_dist = lane, dist
+        if best_lane:
+            lanes.append(lane_index[best_lane.getID()])
+            positions.append(sumolib.geomhelper.polygonOffsetAndDistanceToPoint((x, y), best_lane.getShape())[0])
+            dists.append(best_dist)
+        else:
+            lanes.append(-1)
+            positions.append(np.nan)
+            dists.append(np.nan)
+    return np.array(lanes), np.array(positions), np.array(dists)
+
+
+def main():
+    net = load_net(NET_FILE)
+    _, stops = iter_children(STOPS_FILE)
+    coords = np.array([(float(s.get("lon")), float(s.get("lat"))) for s in stops if s.tag == "busStop"])
+    # every stop, not just the ones in the bounding box
+    lons, lats = coords[:, 0], coords[:, 1]
+
+    t0 = time.perf_counter()
+    sumo_net = sumolib.net.readNet(NET_FILE)
+    lane_index = {lane_id: i for i, lane_id in enumerate(net.lane_ids)}
+    expected_lanes, expected_pos, expected_dist = reference_match(sumo_net, lane_index, lons, lats)
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    lanes, positions = filter_stops.match_stops(net, lons, lats)
+    t_vec = time.perf_counter() - t0
+
+    print(f"Stops:        {len(coords)} ({(lanes >= 0).sum()} matched)")
+    print(f"readNet + per stop: {t_loop:.3f}s")
+    print(f"lane index:         {t_vec:.3f}s ({t_loop / t_vec:.0f}x)")
+
+    # A different lane is only acceptable on an exact tie (both lanes equally close)
+    problems = 0
+    for i in np.flatnonzero(lanes != expected_lanes):
+        if lanes[i] < 0 or expected_lanes[i] < 0:
+            problems += 1
+            continue
+        x, y = sumo_net.convertLonLat2XY(lons[i], lats[i])
+        shape = sumo_net.getLane(net.lane_ids[lanes[i]]).getShape()
+        dist = sumolib.geomhelper.polygonOffsetAndDistanceToPoint((x, y), shape)[1]
+        if abs(dist - expected_dist[i]) > TOLERANCE_M:
+            problems += 1
+    same = lanes == expected_lanes
+    if not np.allclose(positions[same], expected_pos[same], atol=TOLERANCE_M, equal_nan=True):
+        problems += int((~np.isclose(positions[same], expected_pos[same], atol=TOLERANCE_M, equal_nan=True)).sum())
+    if problems:
+        sys.exit(f"❌ {problems} stop(s) matched differently from sumolib's readNet")
+    print(f"✅ Same lanes and positions as sumolib's readNet (within {TOLERANCE_M} m)")
+
+
+if __name__ == "__main__":
+    main()
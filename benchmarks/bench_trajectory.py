@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+
+from trajectory import TOLERANCE_M, TrajectorySimplifier, interpolate
+from tile_writer import TileWriter
+
+N_VEHICLES = 300
+DURATION = 1800          # s, sampled every second
+CENTER = (49.1427, 9.2109)   # Heilbronn (lat, lon)
+
+
+def synthetic_tracks(rng):
+    """Per-vehicle (t, x, y) in meters: drive along random polylines, stop now and then."""
+    tracks = []
+    for _ in range(N_VEHICLES):
+        start = int(rng.integers(0, DURATION // 2))
+        length = int(rng.integers(60, DURATION - start))
+        heading = rng.uniform(0, 2 * np.pi)
+        pos = rng.uniform(-3000, 3000, 2)
+        speed, stop_left = rng.uniform(5, 14), 0
+        rows = []
+        for t in range(start, start + length):
+            rows.append((t, pos[0], pos[1]))
+            if stop_left:
+                stop_left -= 1
+                continue
+            if rng.random() < 0.01:
+                stop_left = int(rng.integers(10, 120))   # bus stop / traffic light
+            if rng.random() < 0.03:
+                heading += rng.normal(0, 0.8)            # turn at an intersection
+            speed = float(np.clip(speed + rng.normal(0, 0.5), 2, 16))
+            pos = pos + speed * np.array([np.cos(heading), np.sin(heading)])
+        tracks.append(np.array(rows))
+    return tracks
+
+
+def frames(tracks):
+    """Per-second frames (t, ids, xs, ys) in time order."""
+    for t in range(DURATION):
+        ids, xs, ys = [], [], []
+        for i, track in enumerate(tracks):
+            k = t - int(track[0, 0])
+            if 0 <= k < len(track):
+                ids.append(f"veh{i}")
+                xs.append(track[k, 1])
+                ys.append(track[k, 2])
+        yield float(t), ids, np.array(xs), np.array(ys)
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    tracks = synthetic_tracks(rng)
+    all_frames = list(frames(tracks))
+    n_points = sum(len(ids) for _, ids, _, _ in all_frames)
+
+    # --- error bound, in meters ---
+    simplifier = TrajectorySimplifier(TOLERANCE_M)
+    parts = []
+    t0 = time.perf_counter()
+    for t, ids, xs, ys in all_frames:
+        parts.append(simplifier.add(t, ids, xs, ys, np.zeros(len(ids))))
+    parts.append(simplifier.finish())
+    t_simplify = time.perf_counter() - t0
+    parts = [p for p in parts if p is not None]
+    segments = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+    n_segments = len(segments["t0"])
+
+    by_id = {}
+    for i, obj_id in enumerate(segments["id"].tolist()):
+        by_id.setdefault(obj_id, []).append(i)
+    worst = 0.0
+    for i, track in enumerate(tracks):
+        rows = np.array(by_id[f"veh{i}"])
+        own = {name: arr[rows] for name, arr in segments.items()}
+        for t, x, y in track.tolist():
+            mask, ix, iy = interpolate(own, t)
+            if not mask.any():
+                sys.exit(f"❌ veh{i} has no segment at t={t}")
+            worst = max(worst, float(np.hypot(ix[mask] - x, iy[mask] - y).max()))
+
+    # --- output size of the tiled map ---
+    sizes = {}
+    out_root = tempfile.mkdtemp()
+    try:
+        for name, tolerance in (("points", None), ("tracks", TOLERANCE_M)):
+            out_dir = os.path.join(out_root, name)
+            writer = TileWriter(out_dir, [["#3498db", 2, 0.8]], CENTER, tolerance=tolerance)
+            k = np.radians(1.0) * 6371008.8
+            for t, ids, xs, ys in all_frames:
+                lons = CENTER[1] + xs / (k * np.cos(np.radians(CENTER[0])))
+                lats = CENTER[0] + ys / k
+                writer.add(t, ids, lons, lats, np.zeros(len(ids)), np.zeros(len(ids)))
+            writer.close()
+            sizes[name] = dir_size(os.path.join(out_dir, "data"))
+    finally:
+        shutil.rmtree(out_root)
+
+    print(f"Positions:    {n_points}")
+    print(f"Segments:     {n_segments} ({n_points / n_segments:.1f}x fewer)")
+    print(f"Simplify:     {t_simplify:.3f}s")
+    print(f"Tile data:    {sizes['points'] / 1e6:.1f} MB -> {sizes['tracks'] / 1e6:.1f} MB "
+          f"({sizes['points'] / sizes['tracks']:.1f}x smaller)")
+    print(f"max error:    {worst:.3f} m (tolerance {TOLERANCE_M} m)")
+    if worst > TOLERANCE_M + 1e-6:
+        sys.exit(f"❌ Simplified tracks deviate by more than {TOLERANCE_M} m")
+    print("✅ Within tolerance")
+
+
+if __name__ == "__main__":
+    main()
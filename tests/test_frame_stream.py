@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+from frame_stream import FrameStream
+
+CENTER = (49.142, 9.218)
+
+
+def vehicle(vid, lat=CENTER[0], lon=CENTER[1]):
+    return (vid, lat, lon, "#4D7CFE", 2)
+
+
+def test_delta_sends_only_changes():
+    stream = FrameStream()
+    stream.publish([vehicle("a"), vehicle("b")], {})
+    cursor = stream.delta()["frame"]
+    # a moves ~11 m, b jitters below the threshold, c appears
+    stream.publish([vehicle("a", CENTER[0] + 1e-4), vehicle("b", CENTER[0] + 1e-7), vehicle("c")], {})
+    payload = stream.delta(cursor)
+    assert not payload["full"]
+    assert [v[0] for v in payload["moved"]] == ["a"]
+    assert [v[0] for v in payload["added"]] == ["c"]
+    assert payload["removed"] == []
+
+    stream.publish([vehicle("a", CENTER[0] + 1e-4)], {})
+    payload = stream.delta(payload["frame"])
+    assert sorted(payload["removed"]) == ["b", "c"]
+
+
+def test_reset_resyncs_old_cursor():
+    stream = FrameStream()
+    stream.publish([vehicle("a"), vehicle("b")], {})
+    cursor = stream.delta()["frame"]
+    stream.reset()
+    stream.publish([vehicle("c")], {})
+
+    payload = stream.delta(cursor)
+    assert payload["full"]
+    assert [v[0] for v in payload["added"]] == ["c"]
+    # a cursor right at the reset point predates it too
+    assert stream.delta(stream.reset_frame)["full"]
+    # after the resync, deltas resume
+    assert not stream.delta(payload["frame"])["full"]
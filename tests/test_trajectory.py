@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "common"))
+from trajectory import TrajectorySimplifier, interpolate
+
+TOLERANCE = 2.0
+
+
+def track():
+    """One vehicle, 1 Hz: drive, stop 200 s (longer than a window), turn, drive; GPS-like noise."""
+    rng = np.random.default_rng(1)
+    rows, pos, t = [], np.zeros(2), 0.0
+    for heading, speed, seconds in ((0.0, 10.0, 120), (0.0, 0.0, 200), (np.pi / 2, 8.0, 150)):
+        for _ in range(seconds):
+            x, y = pos + rng.normal(0, 0.1, 2)
+            rows.append((t, x, y))
+            pos = pos + speed * np.array([np.cos(heading), np.sin(heading)]) + rng.normal(0, 0.3, 2) * (speed > 0)
+            t += 1.0
+    return np.array(rows)
+
+
+def simplify(rows):
+    simplifier = TrajectorySimplifier(TOLERANCE)
+    parts = [simplifier.add(t, ["veh"], [x], [y], [0]) for t, x, y in rows.tolist()]
+    parts.append(simplifier.finish())
+    parts = [p for p in parts if p is not None]
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def test_synchronized_error_within_tolerance():
+    rows = track()
+    segments = simplify(rows)
+    assert len(segments["t0"]) < len(rows) / 5
+    for t, x, y in rows.tolist():
+        mask, xs, ys = interpolate(segments, t)
+        assert mask.any(), f"no segment at t={t}"
+        assert np.hypot(xs[mask] - x, ys[mask] - y).max() <= TOLERANCE + 1e-9
+
+
+def test_stop_merged_into_one_dwell():
+    segments = simplify(track())
+    # The stop spans t=120..319 and is longer than the sample window, so it
+    # is closed several times; the pieces must come out as one record
+    dwell = (segments["x0"] == segments["x1"]) & (segments["y0"] == segments["y1"]) & (segments["t1"] > segments["t0"])
+    assert dwell.sum() == 1
+    i = np.flatnonzero(dwell)[0]
+    assert segments["t0"][i] <= 121 and segments["t1"][i] >= 318
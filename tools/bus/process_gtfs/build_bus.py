@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
+COMMON_DIR = os.path.join(PROJECT_ROOT, "tools", "common")
+sys.path.append(COMMON_DIR)
+from net_cache import cached_file_hash
+
+import import_gtfs_data_buses as gtfs_import
+import filter_stops
+import connect_stops
+
+# --- CONFIGURATION ---
+BUILD_DIR = "intermediate/bus/.build"   # cached stage outputs, one directory per stage and key
+KEEP_BUILDS = 3                         # cached results kept per stage (least recently used are removed)
+
+
+# --- FORMAT ---
+# <BUILD_DIR>/<stage>.<key[:16]>/
+#   manifest.json     {stage, key, outputs: {path: sha1}}
+#   <output basename> copy of every output file
+# key = sha1 of the stage's script and helper modules, input files and
+# parameters. Inputs are hashed by content, so a stage whose upstream re-ran
+# but produced the same files is still skipped.
+
+
+def project_path(path):
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+def content_hash(path):
+    """SHA-1 of a file; only re-read when its size or mtime changed."""
+    return cached_file_hash(project_path(path), project_path(os.path.join(BUILD_DIR, "stamps")))
+
+
+def duarouter_version():
+    """First line of `duarouter --version`, or None if it isn't installed."""
+    try:
+        result = subprocess.run(["duarouter", "--version"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip().split("\n")[0]
+
+
+class Stage:
+    """One step of the pipeline: a script run with fixed inputs, parameters and outputs.
+
+    All paths are relative to the project root, like in the scripts themselves.
+    """
+
+    def __init__(self, name, script, inputs, outputs, params, code=(), args=(), stale=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params
+        self.code = [script] + list(code)
+        self.args = list(args)
+        self.stale = list(stale)   # extra files removed before a run, e.g. the script's own stamp
+
+    def key(self):
+        missing = [path for path in self.inputs if not os.path.exists(project_path(path))]
+        if missing:
+            sys.exit(f"Error: stage {self.name} is missing input(s): {', '.join(missing)}")
+        sha = hashlib.sha1()
+        sha.update(json.dumps({
+            "stage": self.name,
+            "code": {os.path.relpath(path, PROJECT_ROOT): content_hash(path) for path in self.code},
+            "inputs": {path: content_hash(path) for path in self.inputs},
+            "params": self.params,
+        }, sort_keys=True).encode())
+        return sha.hexdigest()
+
+    def run(self):
+        # Stale outputs must not survive a failed run
+        for path in self.outputs + self.stale:
+            if os.path.exists(project_path(path)):
+                os.remove(project_path(path))
+        result = subprocess.run([sys.executable, self.script] + self.args, cwd=PROJECT_ROOT)
+        missing = [path for path in self.outputs if not os.path.exists(project_path(path))]
+        if result.returncode or missing:
+            sys.exit(f"Error: stage {self.name} failed" + (f" (no {', '.join(missing)})" if missing else ""))
+
+
+def stages(target_date):
+    common = lambda *names: [os.path.join(COMMON_DIR, name) for name in names]
+    routes_dir = gtfs_import.OUTPUT_DIR
+    return [
+        Stage("import", os.path.join(SCRIPT_DIR, "import_gtfs_data_buses.py"),
+              inputs=[path for path in gtfs_import.FILES.values() if os.path.exists(project_path(path))],
+              outputs=[os.path.join(routes_dir, "sumo_stops.add.xml"), os.path.join(routes_dir, "sumo_routes.rou.xml")],
+              params={"date": target_date, "xml_indent": gtfs_import.XML_INDENT},
+              code=[os.path.join(SCRIPT_DIR, "gtfs_cache.py"), os.path.join(SCRIPT_DIR, "service_calendar.py")]
+              + common("net_cache.py", "xml_writer.py"),
+              args=[target_date], stale=[os.path.join(routes_dir, gtfs_import.STAMP_FILE)]),
+        Stage("filter", os.path.join(SCRIPT_DIR, "filter_stops.py"),
+              inputs=[filter_stops.NET_FILE, filter_stops.INPUT_STOPS, filter_stops.INPUT_ROUTES],
+              outputs=[filter_stops.OUTPUT_STOPS, filter_stops.OUTPUT_ROUTES],
+              params={"bbox": [filter_stops.MIN_LAT, filter_stops.MIN_LON, filter_stops.MAX_LAT, filter_stops.MAX_LON],
+                      "lane_search_radius": filter_stops.LANE_SEARCH_RADIUS,
+                      "bus_stop_length": filter_stops.BUS_STOP_LENGTH},
+              code=common("net_cache.py", "projection.py", "lane_index.py", "xml_writer.py")),
+        Stage("connect", os.path.join(SCRIPT_DIR, "connect_stops.py"),
+              inputs=[connect_stops.NET_FILE, connect_stops.INPUT_STOPS, connect_stops.INPUT_ROUTES],
+              outputs=[connect_stops.OUTPUT_TRIPS, connect_stops.FINAL_ROUTES, connect_stops.REPORT_FILE],
+              params={"duarouter": connect_stops.DUAROUTER_OPTIONS, "duarouter_version": duarouter_version(),
+                      "route_legs": connect_stops.ROUTE_LEGS},
+              code=[os.path.join(SCRIPT_DIR, "leg_routes.py"), os.path.join(SCRIPT_DIR, "duarouter_pool.py")]
+              + common("net_cache.py", "xml_writer.py")),
+    ]
+
+
+def build(stage, force=False):
+    """Brings the stage's outputs up to date; returns what was done."""
+    key = stage.key()
+    cache_dir = project_path(os.path.join(BUILD_DIR, f"{stage.name}.{key[:16]}"))
+    manifest_file = os.path.join(cache_dir, "manifest.json")
+
+    if not force and os.path.exists(manifest_file):
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+        os.utime(cache_dir)
+        if all(os.path.exists(project_path(path)) and content_hash(path) == digest
+               for path, digest in manifest["outputs"].items()):
+            return "up to date"
+        for path in manifest["outputs"]:
+            shutil.copy2(os.path.join(cache_dir, os.path.basename(path)), project_path(path))
+        return "restored"
+
+    stage.run()
+
+    # Copy into a temp dir and rename, so a crashed build never looks valid
+    tmp_dir = cache_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    outputs = {}
+    for path in stage.outputs:
+        shutil.copy2(project_path(path), os.path.join(tmp_dir, os.path.basename(path)))
+        outputs[path] = content_hash(path)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"stage": stage.name, "key": key, "outputs": outputs}, f, indent=1)
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+    os.replace(tmp_dir, cache_dir)
+    prune(stage.name)
+    return "built"
+
+
+def prune(name):
+    build_dir = project_path(BUILD_DIR)
+    builds = [os.path.join(build_dir, d) for d in os.listdir(build_dir)
+              if d.startswith(name + ".") and not d.endswith(".tmp")]
+    builds.sort(key=os.path.getmtime, reverse=True)
+    for path in builds[KEEP_BUILDS:]:
+        shutil.rmtree(path)
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    force = "--force" in sys.argv[1:]
+    dates = gtfs_import.parse_dates(args)
+    if len(dates) != 1:
+        sys.exit("Usage: python build_bus.py YYYYMMDD [--force]")
+
+    report = []
+    for stage in stages(dates[0]):
+        print(f"=== {stage.name} ===")
+        t0 = time.perf_counter()
+        result = build(stage, force)
+        report.append((stage.name, result, time.perf_counter() - t0))
+        print(f"{stage.name}: {result}")
+
+    print("\nStage      Result       Time")
+    for name, result, seconds in report:
+        print(f"{name:<10} {result:<12} {seconds:7.2f}s")
+    print(f"{'total':<10} {'':<12} {sum(r[2] for r in report):7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
 import os
 import sys
-import subprocess
-import xml.etree.ElementTree as ET
+import json
+import time
+import shutil
+import tempfile
+
+# Streaming XML reader/writer (tools/common/xml_writer.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from xml_writer import XmlWriter, iter_children
+from leg_routes import LegCache, stitch, vehicle_legs
+from duarouter_pool import WORKERS, route_partitioned
 
 # --- FILES ---
 NET_FILE = "network/sumo/heilbronn.net.xml"
@@ -9,6 +17,24 @@ INPUT_STOPS = "intermediate/bus/sumo_stops_filtered.add.xml"
 INPUT_ROUTES = "intermediate/bus/sumo_routes_filtered.rou.xml" 
 OUTPUT_TRIPS = "intermediate/bus/trips_connected.rou.xml"         
 FINAL_ROUTES = "intermediate/bus/sumo_routes_connected.rou.xml"    
+REPORT_FILE = "intermediate/bus/routing_report.json"   # per-trip result: routed / repaired / dropped, and why
+
+# --- DUAROUTER (Robust Mode) ---
+DUAROUTER_OPTIONS = [
+    "--ignore-errors",     # Drop vehicles with no path (don't crash)
+    "--repair",            # Attempt to fix connectivity gaps
+    "--remove-loops",      # Remove weird looping behavior
+    # "--ignore-vclasses",   # CRITICAL: Allow buses to drive on car-only roads (idk lets see)
+    "--no-step-log"
+]
+# Route each unique stop-to-stop leg once (cached across runs) and stitch the
+# vehicle routes together, instead of routing every trip in full
+ROUTE_LEGS = True
+# Legs must run exactly between the stop edges: --remove-loops also cuts a
+# turnaround at either end (stop on A, next stop on -A) and --repair may
+# move the endpoints, so neither is used for legs
+LEG_OPTIONS = [opt for opt in DUAROUTER_OPTIONS if opt not in ("--repair", "--remove-loops")]
+ROUTING_WORKERS = WORKERS   # parallel duarouter processes, each routing a balanced share of the trips
 
 def get_edge_from_lane(lane_id):
     if not lane_id: return None
@@ -19,30 +45,35 @@ def main():
     if not os.path.exists(INPUT_STOPS):
         sys.exit(f"Error: {INPUT_STOPS} not found.")
 
-    stops_tree = ET.parse(INPUT_STOPS)
+    _, stops = iter_children(INPUT_STOPS)
     stop_to_edge = {}
-    for stop in stops_tree.getroot().findall('busStop'):
+    stop_end = {}
+    for stop in stops:
+        if stop.tag != 'busStop':
+            continue
         s_id = stop.get('id')
         lane = stop.get('lane')
         edge = get_edge_from_lane(lane)
         if edge:
             stop_to_edge[s_id] = edge
+            stop_end[s_id] = float(stop.get('endPos', 0))
 
     print("--- 2. Building & SORTING Trips ---")
-    routes_tree = ET.parse(INPUT_ROUTES)
-    routes_root = routes_tree.getroot()
+    _, routes = iter_children(INPUT_ROUTES)
     
-    # Store tuples of (depart_time, element) so we can sort them
+    # Store tuples of (depart_time, trip attributes, stop attributes) so we can sort them
     trip_list = []
     vtypes = []
 
-    # Copy vTypes
-    for vtype in routes_root.findall('vType'):
-        vtypes.append(vtype)
-        
     skipped_count = 0
     
-    for vehicle in routes_root.findall('vehicle'):
+    for vehicle in routes:
+        # Copy vTypes
+        if vehicle.tag == 'vType':
+            vtypes.append(vehicle)
+            continue
+        if vehicle.tag != 'vehicle':
+            continue
         veh_id = vehicle.get('id')
         stops = vehicle.findall('stop')
         depart = float(vehicle.get('depart', 0)) # Get time as float
@@ -61,67 +92,145 @@ def main():
             skipped_count += 1
             continue
 
-        # Create Trip
-        trip = ET.Element("trip")
-        trip.set("id", veh_id)
-        trip.set("type", vehicle.get("type", "bus_standard"))
-        trip.set("depart", f"{depart:.2f}") # Ensure string format
-        trip.set("from", start_edge)
-        trip.set("to", end_edge)
-            
-        for s in stops:
-            trip.append(s)
+        # Create Trip (only its attributes are kept, the parsed vehicle is dropped)
+        trip = {"id": veh_id, "type": vehicle.get("type", "bus_standard"),
+                "depart": f"{depart:.2f}", # Ensure string format
+                "from": start_edge, "to": end_edge}
             
         # Add to list for sorting
-        trip_list.append((depart, trip))
+        trip_list.append((depart, trip, [dict(s.attrib) for s in stops]))
 
     # --- THE FIX: SORT BY TIME ---
     print(f"Sorting {len(trip_list)} trips by departure time...")
     trip_list.sort(key=lambda x: x[0]) # Sort by the first element (depart time)
 
     # Write sorted file
-    trips_root = ET.Element("routes")
-    for vt in vtypes:
-        trips_root.append(vt)
-    for _, trip_elem in trip_list:
-        trips_root.append(trip_elem)
+    with XmlWriter(OUTPUT_TRIPS, "routes") as xml:
+        for vt in vtypes:
+            xml.write(vt)
+        for _, trip, trip_stops in trip_list:
+            xml.start("trip", trip)
+            for stop in trip_stops:
+                xml.element("stop", stop)
+            xml.end("trip")
         
-    ET.ElementTree(trips_root).write(OUTPUT_TRIPS)
     print(f"Saved sorted trips to {OUTPUT_TRIPS}")
 
-    # --- 3. Run Duarouter (Robust Mode) ---
-    print("--- 3. Running Duarouter ---")
-    
-    cmd = [
-        "duarouter",
-        "--net-file", NET_FILE,
-        "--route-files", OUTPUT_TRIPS,
-        "--additional-files", INPUT_STOPS,
-        "--output-file", FINAL_ROUTES,
-        "--ignore-errors",     # Drop vehicles with no path (don't crash)
-        "--repair",            # Attempt to fix connectivity gaps
-        "--remove-loops",      # Remove weird looping behavior
-        # "--ignore-vclasses",   # CRITICAL: Allow buses to drive on car-only roads (idk lets see)
-        "--no-step-log"
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    
-    # Check output
-    warnings = [line for line in result.stderr.split('\n') if "Warning" in line]
-    errors = [line for line in result.stderr.split('\n') if "Error" in line]
-    successes = [line for line in result.stderr.split('\n') if "Success" in line]
-
-    print(f"\nStats from Duarouter:")
-    print(f"  - Warnings (usually disconnected stops): {len(warnings)}")
-    print(f"  - Dropped Vehicles (Impossible routes): {len(errors)}")
-    
-    if os.path.exists(FINAL_ROUTES):
-        print(f"\n✅ SUCCESS! Routes generated: {FINAL_ROUTES}")
-        print("Use this file in your simulation.")
-    else:
+    t0 = time.perf_counter()
+    try:
+        if ROUTE_LEGS:
+            report = route_by_legs(trip_list, vtypes, stop_to_edge, stop_end)
+        else:
+            report = run_duarouter(trip_list, vtypes)
+    except RuntimeError as e:
         print("\n❌ FAILED. No output file generated.")
-        print(result.stderr)
+        print(e)
+        sys.exit(1)
+    write_report(report, trip_list)
+    print(f"  - Routing time: {time.perf_counter() - t0:.2f}s with {ROUTING_WORKERS} worker(s)")
+    print(f"\n✅ SUCCESS! Routes generated: {FINAL_ROUTES}")
+    print("Use this file in your simulation.")
+
+def write_report(report, trip_list):
+    """Per-trip routing result as JSON, in departure order; prints the totals."""
+    entries = []
+    counts = {"routed": 0, "repaired": 0, "dropped": 0}
+    for _, trip, _ in trip_list:
+        entry = report[trip["id"]]
+        counts[entry["status"]] += 1
+        entries.append({"id": trip["id"], "depart": trip["depart"], **entry})
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"counts": counts, "trips": entries,
+                   "messages": report.get(None, {}).get("messages", [])}, f, indent=1)
+
+    print(f"\nRouting Report ({REPORT_FILE}):")
+    print(f"  - Routed: {counts['routed']}")
+    print(f"  - Repaired (routed with warnings): {counts['repaired']}")
+    print(f"  - Dropped Vehicles (Impossible routes): {counts['dropped']}")
+
+def route_by_legs(trip_list, vtypes, stop_to_edge, stop_end):
+    # --- 3. Route unique legs, stitch vehicle routes ---
+    print("--- 3. Routing Stop-to-Stop Legs ---")
+    cache = LegCache(NET_FILE, vtypes, LEG_OPTIONS)
+
+    vehicle_plans = []
+    all_legs = []
+    whole = []   # vehicles with a stop upstream on the same edge as the previous one
+    for _, trip, trip_stops in trip_list:
+        edges = [stop_to_edge.get(s.get("busStop")) for s in trip_stops]
+        legs = None
+        if None not in edges:
+            legs = vehicle_legs(trip["type"], edges, [stop_end[s.get("busStop")] for s in trip_stops])
+            if legs is None:
+                whole.append((trip, trip_stops))
+        vehicle_plans.append((trip, trip_stops, edges, legs))
+        all_legs.extend(legs or [])
+    unique = set(all_legs)
+    cache.route(unique, ROUTING_WORKERS)
+    cache.save()
+
+    report, routed_whole = route_whole(whole, vtypes) if whole else ({None: {"status": None, "messages": []}}, {})
+    report[None]["messages"].extend(cache.messages)
+    with XmlWriter(FINAL_ROUTES, "routes") as xml:
+        for vt in vtypes:
+            xml.write(vt)
+        for trip, trip_stops, edges, legs in vehicle_plans:
+            if None in edges:
+                missing = [s.get("busStop") for s, edge in zip(trip_stops, edges) if edge is None]
+                report[trip["id"]] = {"status": "dropped",
+                                      "messages": [f"stop '{stop}' is not on a mapped edge" for stop in missing]}
+                continue
+            if legs is None:
+                if trip["id"] in routed_whole:
+                    xml.write(routed_whole[trip["id"]])
+                continue
+            # The trip inherits the worst status and all messages of its legs
+            statuses, messages = set(), []
+            for leg in dict.fromkeys(legs):
+                status, leg_messages = cache.result(leg)
+                statuses.add(status)
+                messages.extend(leg_messages)
+            if "dropped" in statuses:
+                status = "dropped"
+            elif "repaired" in statuses:
+                status = "repaired"
+            else:
+                status = "routed"
+            report[trip["id"]] = {"status": status, "messages": messages}
+            if status == "dropped":
+                continue
+            xml.start("vehicle", {"id": trip["id"], "type": trip["type"], "depart": trip["depart"]})
+            xml.element("route", {"edges": " ".join(stitch(edges, [cache.get(leg) for leg in legs]))})
+            for stop in trip_stops:
+                xml.element("stop", stop)
+            xml.end("vehicle")
+
+    print(f"\nStats from Leg Routing:")
+    print(f"  - Legs: {len(all_legs)}, unique: {len(unique)} "
+          f"({len(all_legs) / max(len(unique), 1):.1f}x duplication)")
+    print(f"  - From cache: {cache.hits}, routed now: {cache.routed}")
+    print(f"  - Routed in full (stop upstream on the same edge): {len(whole)}")
+    return report
+
+def route_whole(trips, vtypes):
+    """Routes (trip, stops) pairs in full, like run_duarouter; returns (report, {id: vehicle element})."""
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(FINAL_ROUTES)))
+    try:
+        routed_file = os.path.join(tmp_dir, "whole.rou.xml")
+        report = route_partitioned(NET_FILE, vtypes, trips, routed_file, DUAROUTER_OPTIONS,
+                                   ROUTING_WORKERS, additional=INPUT_STOPS)
+        _, vehicles = iter_children(routed_file)
+        routed = {vehicle.get("id"): vehicle for vehicle in vehicles if vehicle.tag == "vehicle"}
+    finally:
+        shutil.rmtree(tmp_dir)
+    return report, routed
+
+def run_duarouter(trip_list, vtypes):
+    # --- 3. Run Duarouter (Robust Mode), one worker per chunk of trips ---
+    print("--- 3. Running Duarouter ---")
+    trips = [(trip, trip_stops) for _, trip, trip_stops in trip_list]
+    return route_partitioned(NET_FILE, vtypes, trips, FINAL_ROUTES, DUAROUTER_OPTIONS,
+                             ROUTING_WORKERS, additional=INPUT_STOPS)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
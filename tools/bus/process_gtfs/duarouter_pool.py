@@ -0,0 +1,115 @@
+import os
+import re
+import sys
+import heapq
+import shutil
+import tempfile
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+from xml_writer import XmlWriter, iter_children
+
+# --- CONFIGURATION ---
+WORKERS = os.cpu_count() or 1
+# duarouter names the trip a message is about as "vehicle 'id'" (or trip/person);
+# other quoted tokens are edges, lanes or stops and must not be taken for ids
+TRIP_REF_RE = re.compile(r"\b(?:vehicle|trip|person) '([^']*)'", re.IGNORECASE)
+
+
+def _merge(chunk_files, output_file, order, vtypes):
+    """Merges duarouter outputs (each in departure order) into one file in the input trip order."""
+    def vehicles(k, path):
+        _, children = iter_children(path)
+        for elem in children:
+            if elem.tag != "vType":
+                yield order.get(elem.get("id"), len(order)), k, elem
+
+    streams = [vehicles(k, path) for k, path in enumerate(chunk_files) if os.path.exists(path)]
+    with XmlWriter(output_file, "routes") as xml:
+        for vt in vtypes:
+            xml.write(vt)
+        for _, _, elem in heapq.merge(*streams, key=lambda item: item[:2]):
+            xml.write(elem)
+
+
+def route_partitioned(net_file, vtypes, trips, output_file, options, workers=WORKERS, additional=None):
+    """Routes trips with parallel duarouter processes and merges their outputs into output_file.
+
+    trips are (attrib, stops) pairs in departure order; they are dealt out
+    round-robin, so every chunk is still sorted and gets a similar share of
+    the day. Each worker loads the net once. The merged file lists vehicles
+    in the input order, like a single duarouter run over all trips would.
+
+    Returns {trip id: {"status": "routed" | "repaired" | "dropped", "messages": [...]}}
+    plus the key None for messages that name no trip. "repaired" means routed,
+    but duarouter warned about the trip (with --repair, that's a fixed route).
+    Raises RuntimeError if duarouter can't be started or a worker crashed
+    without writing any output.
+    """
+    workers = max(1, min(workers, len(trips)))
+    order = {attrib["id"]: i for i, (attrib, _) in enumerate(trips)}
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        procs = []
+        try:
+            for k in range(workers):
+                trips_file = os.path.join(tmp_dir, f"trips.{k}.rou.xml")
+                with XmlWriter(trips_file, "routes") as xml:
+                    for vt in vtypes:
+                        xml.write(vt)
+                    for attrib, stops in trips[k::workers]:
+                        xml.start("trip", attrib)
+                        for stop in stops:
+                            xml.element("stop", stop)
+                        xml.end("trip")
+                out_file = os.path.join(tmp_dir, f"routes.{k}.rou.xml")
+                cmd = ["duarouter", "--net-file", net_file, "--route-files", trips_file,
+                       "--output-file", out_file] + (["--additional-files", additional] if additional else []) + options
+                # The child keeps its own copy of the handle
+                with open(os.path.join(tmp_dir, f"log.{k}.txt"), "w", encoding="utf-8") as log:
+                    procs.append((subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=log, text=True), out_file))
+            for proc, _ in procs:
+                proc.wait()
+        except BaseException as e:
+            # Don't leave workers running when one can't start or we're interrupted
+            for proc, _ in procs:
+                proc.kill()
+                proc.wait()
+            if isinstance(e, OSError):
+                raise RuntimeError(f"could not start duarouter ({e}); is SUMO installed and on the PATH?") from e
+            raise
+        for k, (proc, out_file) in enumerate(procs):
+            if proc.returncode and not os.path.exists(out_file):
+                with open(os.path.join(tmp_dir, f"log.{k}.txt"), encoding="utf-8") as f:
+                    raise RuntimeError(f"duarouter worker {k} failed:\n{f.read()}")
+        out_files = [out_file for _, out_file in procs]
+        _merge(out_files, output_file, order, vtypes)
+        alt_files = [path[:-len(".xml")] + ".alt.xml" for path in out_files]
+        if any(os.path.exists(path) for path in alt_files):
+            _merge(alt_files, output_file[:-len(".xml")] + ".alt.xml", order, vtypes)
+
+        # Per-trip report from the routed ids and the messages naming each trip
+        report = {trip_id: {"status": "dropped", "messages": []} for trip_id in order}
+        report[None] = {"status": None, "messages": []}
+        for path in out_files:
+            if os.path.exists(path):
+                for elem in iter_children(path)[1]:
+                    if elem.get("id") in order:
+                        report[elem.get("id")]["status"] = "routed"
+        for k in range(workers):
+            with open(os.path.join(tmp_dir, f"log.{k}.txt"), encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line.startswith(("Warning", "Error")):
+                        continue
+                    named = [token for token in TRIP_REF_RE.findall(line) if token in order]
+                    for trip_id in named or [None]:
+                        report[trip_id]["messages"].append(line)
+        for trip_id, entry in report.items():
+            if entry["status"] == "routed" and entry["messages"]:
+                entry["status"] = "repaired"
+    finally:
+        shutil.rmtree(tmp_dir)
+    return report
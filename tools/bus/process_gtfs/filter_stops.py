@@ -1,6 +1,7 @@
 import os
 import sys
-import xml.etree.ElementTree as ET
+
+import numpy as np
 
 # --- Configuration ---
 NET_FILE = "network/sumo/heilbronn.net.xml"             # Your OSM Network file
@@ -8,7 +9,7 @@ INPUT_STOPS = "intermediate/bus/sumo_stops.add.xml"   # The raw stops from step
 INPUT_ROUTES = "intermediate/bus/sumo_routes.rou.xml" # The raw routes from step 1
 OUTPUT_STOPS = "intermediate/bus/sumo_stops_filtered.add.xml"
 OUTPUT_ROUTES = "intermediate/bus/sumo_routes_filtered.rou.xml"
-# OUTPUT_STOPS_DISCARDED = "intermediate/bus/sumo_stops_discarded.add.xml" # For debugging
+OUTPUT_STOPS_DISCARDED = None  # e.g. "intermediate/bus/sumo_stops_discarded.add.xml", for debugging
 
 # --- Bounding Box (Heilbronn Area) ---
 MIN_LAT = 49.1375900
@@ -21,17 +22,27 @@ LANE_SEARCH_RADIUS = 50.0  # meters to look for a suitable lane
 BUS_STOP_LENGTH = 12.0     # meters
 
 
-# --- Import Sumolib ---
-if 'SUMO_HOME' in os.environ:
-    sys.path.append(os.path.join(os.environ['SUMO_HOME'], 'tools'))
-else:
-    sys.exit("Error: Please set 'SUMO_HOME' environment variable or install sumolib")
-import sumolib
+# Cached, memory-mapped network model (tools/common/net_cache.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from net_cache import load_net
+from lane_index import LaneSegmentIndex
+from xml_writer import XmlWriter, iter_children
+
+def match_stops(net, lons, lats):
+    """Closest bus lane within LANE_SEARCH_RADIUS of every stop, for all stops at once.
+
+    Returns (lanes, positions): lane index into net.lane_ids (-1 if none) and
+    the offset of the matched point along that lane.
+    """
+    x, y = net.projection.lonlat_to_xy(lons, lats)
+    index = LaneSegmentIndex(net, np.flatnonzero(net.lane_bus))
+    lanes, _ = index.nearest(x, y, LANE_SEARCH_RADIUS)
+    return lanes, index.offsets(x, y, lanes)
 
 def main():
     print(f"Loading network: {NET_FILE}...")
     try:
-        net = sumolib.net.readNet(NET_FILE)
+        net = load_net(NET_FILE)
     except Exception as e:
         print(f"CRITICAL ERROR: Could not load map. {e}")
         return
@@ -40,107 +51,116 @@ def main():
     # PART 1: Process Stops (Filter by Area -> Map to Lane)
     # ---------------------------------------------------------
     print("Processing Bus Stops...")
-    stops_tree = ET.parse(INPUT_STOPS)
-    stops_root = stops_tree.getroot()
+    # Pass 1: coordinates only, so every stop is matched to a lane in one batch
+    _, stops_in = iter_children(INPUT_STOPS)
+    coords, readable = [], []
+    for stop in stops_in:
+        if stop.tag != 'busStop':
+            continue
+        try:
+            coords.append((float(stop.get('lat')), float(stop.get('lon'))))
+            readable.append(True)
+        except (ValueError, TypeError):
+            coords.append((np.nan, np.nan))  # unreadable, dropped below
+            readable.append(False)
+    coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    lats, lons = coords[:, 0], coords[:, 1]
+    readable = np.array(readable, dtype=bool)
+
+    # 1. BOUNDING BOX FILTER: stops outside the box are removed
+    in_box = readable & (MIN_LAT <= lats) & (lats <= MAX_LAT) & (MIN_LON <= lons) & (lons <= MAX_LON)
+
+    # 2. CONVERT & MAP TO LANE (a bus-friendly lane within LANE_SEARCH_RADIUS meters, the closest one)
+    lanes = np.full(len(coords), -1, dtype=np.int64)
+    positions = np.full(len(coords), np.nan)
+    if in_box.any():
+        lanes[in_box], positions[in_box] = match_stops(net, lons[in_box], lats[in_box])
+
+    # Pass 2: stream the stops again and write the matched ones
+    stops_root, stops_in = iter_children(INPUT_STOPS)
+    stops_out = XmlWriter(OUTPUT_STOPS, stops_root.tag, stops_root.attrib)
     
     valid_stop_ids = set()
-    stops_to_remove = []
     
     # For debugging: create a separate file for discarded stops
-    discarded_stops_root = ET.Element('additional')
+    discarded_out = XmlWriter(OUTPUT_STOPS_DISCARDED, 'additional') if OUTPUT_STOPS_DISCARDED else None
     
     # Counters for statistics
     count_total = 0
     count_outside_box = 0
     count_no_road = 0
 
-    for stop in stops_root.findall('busStop'):
+    for stop in stops_in:
+        if stop.tag != 'busStop':
+            stops_out.write(stop)
+            continue
+        i = count_total
         count_total += 1
-        try:
-            lat = float(stop.get('lat'))
-            lon = float(stop.get('lon'))
-            stop_id = stop.get('id')
-
-            # 1. BOUNDING BOX FILTER: If the stop is outside the box, mark for removal
-            if not (MIN_LAT <= lat <= MAX_LAT and MIN_LON <= lon <= MAX_LON):
-                stops_to_remove.append(stop)
-                count_outside_box += 1
-                stop.set('color', '1,0,0') # Red for out of bounds
-                stop.set('comment', 'Removed: Outside bounding box')
-                discarded_stops_root.append(stop)
-                continue
-
-            # 2. CONVERT & MAP TO LANE
-            x, y = net.convertLonLat2XY(lon, lat)
+        if not readable[i]:
+            continue
+
+        if not in_box[i]:
+            count_outside_box += 1
+            stop.set('color', '1,0,0') # Red for out of bounds
+            stop.set('comment', 'Removed: Outside bounding box')
+            if discarded_out:
+                discarded_out.write(stop)
+            continue
+
+        if lanes[i] >= 0:
+            lane = int(lanes[i])
+            pos_on_lane = float(positions[i])
+            lane_len = float(net.lane_length[lane])
+            half_stop_len = BUS_STOP_LENGTH / 2
             
-            # Look for a bus-friendly lane within 50 meters
-            lanes = net.getNeighboringLanes(x, y, LANE_SEARCH_RADIUS, includeJunctions=False)
-            best_lane = None
-            best_dist = float('inf')
-
-            for lane, dist in lanes:
-                # Must allow bus and be the closest one found
-                if lane.allows("bus") and dist < best_dist:
-                    best_lane = lane
-                    best_dist = dist
-
-            if best_lane:
-                # Calculate position on the lane
-                lane_shape = best_lane.getShape()
-                pos_on_lane, _ = sumolib.geomhelper.polygonOffsetAndDistanceToPoint((x,y), lane_shape)
-                
-                lane_len = best_lane.getLength()
-                half_stop_len = BUS_STOP_LENGTH / 2
-                
-                # Center the stop (12m long) around the matched point
-                start_pos = max(0, pos_on_lane - half_stop_len)
-                end_pos = min(lane_len, start_pos + BUS_STOP_LENGTH)
-                
-                if end_pos - start_pos < 10:
-                    start_pos = max(0, lane_len - 12)
-                    end_pos = lane_len
-
-                stop.set('lane', best_lane.getID())
-                stop.set('startPos', f"{start_pos:.2f}")
-                stop.set('endPos', f"{end_pos:.2f}")
-                
-                valid_stop_ids.add(stop_id)
-            else:
-                # Inside the box, but no road found (e.g., inside a building or private area)
-                stops_to_remove.append(stop)
-                count_no_road += 1
-                stop.set('color', '1,1,0') # Yellow for no road
-                stop.set('comment', 'Removed: No suitable road found nearby')
-                discarded_stops_root.append(stop)
-
-        except (ValueError, TypeError):
-            stops_to_remove.append(stop)
+            # Center the stop (12m long) around the matched point
+            start_pos = max(0, pos_on_lane - half_stop_len)
+            end_pos = min(lane_len, start_pos + BUS_STOP_LENGTH)
+            
+            if end_pos - start_pos < 10:
+                start_pos = max(0, lane_len - 12)
+                end_pos = lane_len
 
-    # Remove the invalid stops from the XML structure
+            stop.set('lane', net.lane_ids[lane])
+            stop.set('startPos', f"{start_pos:.2f}")
+            stop.set('endPos', f"{end_pos:.2f}")
+            
+            valid_stop_ids.add(stop.get('id'))
+            stops_out.write(stop)
+        else:
+            # Inside the box, but no road found (e.g., inside a building or private area)
+            count_no_road += 1
+            stop.set('color', '1,1,0') # Yellow for no road
+            stop.set('comment', 'Removed: No suitable road found nearby')
+            if discarded_out:
+                discarded_out.write(stop)
+
+    stops_out.close()
     print(f"  > Total stops processed: {count_total}")
-    for stop in stops_to_remove:
-        stops_root.remove(stop)
         
     # --- Print statistics ---
     print(f"  > Stops removed (outside bounding box): {count_outside_box}")
     print(f"  > Stops removed (no nearby road): {count_no_road}")
     print(f"  > Final valid stops in area: {len(valid_stop_ids)}")
 
-    # Write the debugging file for discarded stops
-    # ET.ElementTree(discarded_stops_root).write(OUTPUT_STOPS_DISCARDED, encoding="utf-8", xml_declaration=True)
-    # print(f"  > Discarded stops saved to {OUTPUT_STOPS_DISCARDED} for debugging.")
-    stops_tree.write(OUTPUT_STOPS, encoding="utf-8", xml_declaration=True)
+    # Close the debugging file for discarded stops
+    if discarded_out:
+        discarded_out.close()
+        print(f"  > Discarded stops saved to {OUTPUT_STOPS_DISCARDED} for debugging.")
 
     # ---------------------------------------------------------
     # PART 2: Clean Routes (Remove deleted stops)
     # ---------------------------------------------------------
     print("Cleaning Routes...")
-    routes_tree = ET.parse(INPUT_ROUTES)
-    routes_root = routes_tree.getroot()
+    routes_root, routes_in = iter_children(INPUT_ROUTES)
+    routes_out = XmlWriter(OUTPUT_ROUTES, routes_root.tag, routes_root.attrib)
     
-    vehicles_to_remove = []
+    vehicles_removed = 0
     
-    for vehicle in routes_root.findall('vehicle'):
+    for vehicle in routes_in:
+        if vehicle.tag != 'vehicle':
+            routes_out.write(vehicle)  # vTypes etc.
+            continue
         stops = vehicle.findall('stop')
         valid_stops_in_trip = 0
         
@@ -156,14 +176,13 @@ def main():
         # If the bus has fewer than 2 stops left, it can't really "drive" a route
         # (You can change this to '0' if you want buses that just appear and stand still)
         if valid_stops_in_trip < 2:
-            vehicles_to_remove.append(vehicle)
-
-    for veh in vehicles_to_remove:
-        routes_root.remove(veh)
+            vehicles_removed += 1
+        else:
+            routes_out.write(vehicle)
 
-    print(f"  > Removed {len(vehicles_to_remove)} trips/vehicles that had < 2 stops in the area.")
+    routes_out.close()
+    print(f"  > Removed {vehicles_removed} trips/vehicles that had < 2 stops in the area.")
     
-    routes_tree.write(OUTPUT_ROUTES, encoding="utf-8", xml_declaration=True)
     print("Done! Files saved.")
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+from net_cache import cached_file_hash
+
+# --- CONFIGURATION ---
+CACHE_VERSION = 1
+CACHE_DIR_NAME = ".gtfs_cache"   # created next to the feed files
+
+# Seconds-since-midnight columns derived once at build time: table -> {column: source time column}
+TIME_COLUMNS = {"stop_times": {"arrival_sec": "arrival_time", "departure_sec": "departure_time"}}
+TIME_RE = r"^\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*(?::.*)?$"
+
+
+# --- FORMAT ---
+# <feed dir>/.gtfs_cache/v<version>.<digest>/
+#   meta.json                     {version, digests, tables: {name: {rows, columns, derived, vocab}}}
+#   <table>/<column>.npy          int32 codes into vocab[column] (-1 = missing) for text columns,
+#                                 int32 seconds for the TIME_COLUMNS
+# Every text column is dictionary-encoded, so a table loads as exactly the
+# DataFrame pd.read_csv(dtype=str) would give, without re-parsing the CSV.
+
+
+def gtfs_seconds(values):
+    """Vectorized HH:MM:SS -> seconds since midnight (hours may exceed 23). Missing or malformed -> 0."""
+    # Timetables repeat the same few thousand times, so only parse each distinct one
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    parts = pd.Series(uniques, dtype=object).str.extract(TIME_RE).astype(float)
+    seconds = (parts[0] * 3600 + parts[1] * 60 + parts[2]).fillna(0).to_numpy()
+    # code -1 (missing) picks the trailing 0
+    return np.append(seconds, 0).astype(np.int32)[codes]
+
+
+def feed_digests(files):
+    """{table: sha1} for every feed file that exists."""
+    digests = {}
+    for name, path in files.items():
+        if os.path.exists(path):
+            digests[name] = cached_file_hash(path, os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                                CACHE_DIR_NAME))
+    return digests
+
+
+def build_cache(files, digests, cache_path):
+    """Parses every feed file once and writes the encoded tables to cache_path."""
+    tmp_path = cache_path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    tables = {}
+    for name in digests:
+        df = pd.read_csv(files[name], dtype=str)
+        table_dir = os.path.join(tmp_path, name)
+        os.makedirs(table_dir)
+        vocab = {}
+        for column in df.columns:
+            codes, uniques = pd.factorize(df[column])
+            np.save(os.path.join(table_dir, column + ".npy"), codes.astype(np.int32))
+            vocab[column] = uniques.tolist()
+        derived = {column: source for column, source in TIME_COLUMNS.get(name, {}).items() if source in df}
+        for column, source in derived.items():
+            np.save(os.path.join(table_dir, column + ".npy"), gtfs_seconds(df[source]))
+        tables[name] = {"rows": len(df), "columns": list(df.columns), "derived": list(derived), "vocab": vocab}
+
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "digests": digests, "tables": tables}, f)
+    # Rename last, so a crashed build never looks valid
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.replace(tmp_path, cache_path)
+
+
+class GtfsCache:
+    """Read side of the GTFS cache (see load_gtfs)."""
+
+    def __init__(self, cache_path, digests):
+        self.cache_path = cache_path
+        self.digests = digests
+        with open(os.path.join(cache_path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+    def __contains__(self, name):
+        return name in self.meta["tables"]
+
+    def table(self, name):
+        """The table as a DataFrame of str/NaN columns, like pd.read_csv(dtype=str).
+
+        stop_times additionally has int32 arrival_sec / departure_sec columns
+        (seconds since midnight, 0 where the time is missing or malformed).
+        """
+        if name not in self.meta["tables"]:
+            raise KeyError(f"GTFS table {name!r} is not in the feed")
+        info = self.meta["tables"][name]
+        table_dir = os.path.join(self.cache_path, name)
+        columns = {}
+        for column in info["columns"]:
+            codes = np.load(os.path.join(table_dir, column + ".npy"))
+            # code -1 picks the trailing NaN
+            values = np.array(info["vocab"][column] + [np.nan], dtype=object)
+            columns[column] = pd.Series(values[codes], dtype=str)
+        df = pd.DataFrame(columns, columns=info["columns"])
+        for column in info["derived"]:
+            df[column] = np.load(os.path.join(table_dir, column + ".npy"))
+        return df
+
+    def key(self, *names):
+        """Combined digest of some tables, to tell whether outputs built from them are current."""
+        sha = hashlib.sha1()
+        for name in names:
+            sha.update(f"{name}={self.digests.get(name)};".encode())
+        return sha.hexdigest()
+
+
+def load_gtfs(files):
+    """Opens the cache for the current feed files, building it first if needed.
+
+    files maps table names to CSV paths; missing files are left out.
+    """
+    digests = feed_digests(files)
+    if not digests:
+        raise FileNotFoundError("None of the GTFS feed files exist")
+    feed_dir = os.path.dirname(os.path.abspath(next(files[name] for name in digests)))
+    combined = hashlib.sha1(json.dumps(digests, sort_keys=True).encode()).hexdigest()
+    cache_path = os.path.join(feed_dir, CACHE_DIR_NAME, f"v{CACHE_VERSION}.{combined[:16]}")
+    if not os.path.exists(os.path.join(cache_path, "meta.json")):
+        print(f"Building GTFS cache for {feed_dir} (one-time)...")
+        build_cache(files, digests, cache_path)
+    return GtfsCache(cache_path, digests)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python gtfs_cache.py <gtfs dir>")
+    feed = {os.path.splitext(f)[0]: os.path.join(sys.argv[1], f)
+            for f in sorted(os.listdir(sys.argv[1])) if f.endswith(".txt")}
+    t0 = time.perf_counter()
+    gtfs = load_gtfs(feed)
+    for name in gtfs.meta["tables"]:
+        print(f"{name}: {len(gtfs.table(name))} rows")
+    print(f"Loaded in {time.perf_counter() - t0:.2f}s")
@@ -1,11 +1,23 @@
 import os
+import json
+import hashlib
+import numpy as np
 import pandas as pd
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 import datetime
 import sys
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+from gtfs_cache import gtfs_seconds, load_gtfs
+from service_calendar import ServiceCalendar
+from net_cache import file_hash
+from xml_writer import XmlWriter
+
 # --- CONFIGURATION ---
+OUTPUT_DIR = "intermediate/bus"   # one date; with several dates, one sub-directory per date
+STAMP_FILE = ".inputs.json"       # key of the inputs the outputs in a directory were built from
+XML_INDENT = "    "               # None writes compact single-line XML
 FILES = {
     'stops': 'network/bus/stops.txt',
     'routes': 'network/bus/routes.txt',
@@ -31,74 +43,45 @@ def get_user_date():
         else:
             print("Error: Use format YYYYMMDD.")
 
-def get_active_services(target_date_str):
-    """Returns a set of service_ids active on the target date."""
-    active_services = set()
-    try:
-        target_date = datetime.datetime.strptime(target_date_str, "%Y%m%d")
-        day_of_week = target_date.strftime("%A").lower()
-    except ValueError:
-        return set()
-
-    # 1. Calendar
-    try:
-        cal = pd.read_csv(FILES['calendar'], dtype=str)
-        for _, row in cal.iterrows():
-            start = datetime.datetime.strptime(row['start_date'], "%Y%m%d")
-            end = datetime.datetime.strptime(row['end_date'], "%Y%m%d")
-            if start <= target_date <= end:
-                if row.get(day_of_week) == '1':
-                    active_services.add(row['service_id'])
-    except: pass
-
-    # 2. Calendar Dates
-    try:
-        cal_dates = pd.read_csv(FILES['calendar_dates'], dtype=str)
-        relevant = cal_dates[cal_dates['date'] == target_date_str]
-        for _, row in relevant.iterrows():
-            if row['exception_type'] == '1': active_services.add(row['service_id'])
-            elif row['exception_type'] == '2': active_services.discard(row['service_id'])
-    except: pass
-
-    return active_services
-
-def seconds_from_midnight(time_str):
-    try:
-        if pd.isna(time_str): return 0
-        parts = list(map(int, time_str.split(':')))
-        # Handle cases like 25:00:00 (1 AM next day)
-        return parts[0] * 3600 + parts[1] * 60 + parts[2]
-    except:
-        return 0
-
-def prettify_xml(elem):
-    rough_string = ET.tostring(elem, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    return reparsed.toprettyxml(indent="    ")
-
-def create_stops_xml(stops_df):
-    root = ET.Element("additional")
+def parse_dates(args):
+    """Dates from the command line: YYYYMMDD or an inclusive range YYYYMMDD..YYYYMMDD, any number of each."""
+    dates = []
+    for arg in args:
+        first, _, last = arg.partition("..")
+        try:
+            start = datetime.datetime.strptime(first, "%Y%m%d")
+            end = datetime.datetime.strptime(last or first, "%Y%m%d")
+        except ValueError:
+            sys.exit(f"Error: invalid date {arg!r}. Use YYYYMMDD or YYYYMMDD..YYYYMMDD.")
+        if end < start:
+            sys.exit(f"Error: empty date range {arg!r}.")
+        for day in range((end - start).days + 1):
+            date = (start + datetime.timedelta(days=day)).strftime("%Y%m%d")
+            if date not in dates:
+                dates.append(date)
+    return dates
+
+def get_active_services(target_date_str, calendar):
+    """Returns a set of service_ids active on the target date (from the ServiceCalendar index)."""
+    return calendar.active_services(target_date_str)
+
+def create_stops_xml(stops_df, path):
     print(f"Processing {len(stops_df)} stops...")
-    for _, row in stops_df.iterrows():
-        stop = ET.SubElement(root, "busStop")
-        stop.set("id", str(row['stop_id']))
-        stop.set("name", str(row['stop_name']))
-        stop.set("lat", str(row['stop_lat']))
-        stop.set("lon", str(row['stop_lon']))
-    return prettify_xml(root)
+    with XmlWriter(path, "additional", indent=XML_INDENT) as xml:
+        for _, row in stops_df.iterrows():
+            xml.element("busStop", {"id": str(row['stop_id']), "name": str(row['stop_name']),
+                                    "lat": str(row['stop_lat']), "lon": str(row['stop_lon'])})
 
 # --- THE MAGIC FUNCTION ---
-def create_routes_xml_blocks(trips_df, stop_times_df, active_services, target_date):
-    root = ET.Element("routes")
-    
-    # 1. Define ONE bus type
-    vtype = ET.SubElement(root, "vType")
-    vtype.set("id", "bus_standard")
-    vtype.set("vClass", "ignoring") 
-    vtype.set("accel", "2.0")
-    vtype.set("decel", "4.0")
-    vtype.set("length", "12")
-    
+def create_routes_xml_blocks(trips_df, stop_times_df, active_services, target_date, path):
+    # Vehicles are streamed to path as they are built, the document is never held in memory
+    with XmlWriter(path, "routes", indent=XML_INDENT) as xml:
+        # 1. Define ONE bus type
+        xml.element("vType", {"id": "bus_standard", "vClass": "ignoring", "accel": "2.0", "decel": "4.0",
+                              "length": "12"})
+        write_vehicles(xml, trips_df, stop_times_df, active_services, target_date)
+
+def write_vehicles(xml, trips_df, stop_times_df, active_services, target_date):
     # 2. Filter Data
     print(f"Total trips available: {len(trips_df)}")
     trips_df = trips_df[trips_df['service_id'].isin(active_services)]
@@ -106,9 +89,6 @@ def create_routes_xml_blocks(trips_df, stop_times_df, active_services, target_da
 
     valid_trip_ids = set(trips_df['trip_id'])
     stop_times_df = stop_times_df[stop_times_df['trip_id'].isin(valid_trip_ids)]
-    
-    # Group stop times for fast access
-    stop_times_grouped = stop_times_df.groupby('trip_id')
 
     # 3. GROUP BY BLOCK_ID
     # This is what forces the "wait for arrival" logic.
@@ -120,99 +100,126 @@ def create_routes_xml_blocks(trips_df, stop_times_df, active_services, target_da
         # If specific rows have empty blocks, fill them
         trips_df['block_id'] = trips_df['block_id'].fillna(trips_df['trip_id'])
 
-    blocks_grouped = trips_df.groupby('block_id')
     print("-" * 30)
-    print(f"CONVERTING {len(trips_df)} TRIPS INTO {len(blocks_grouped)} PHYSICAL BUSES")
+    print(f"CONVERTING {len(trips_df)} TRIPS INTO {trips_df['block_id'].nunique()} PHYSICAL BUSES")
     print("-" * 30)
 
-    vehicle_count = 0
+    # A. Sort stop times ONCE by (trip, stop_sequence); each trip is then one contiguous slice
+    trip_codes, trip_ids = pd.factorize(stop_times_df['trip_id'])
+    seq = stop_times_df['stop_sequence'].to_numpy()
+    order = np.lexsort((seq, trip_codes))
+    order = order[trip_codes[order] >= 0]
+    sorted_codes = trip_codes[order]
+    slice_start = np.searchsorted(sorted_codes, np.arange(len(trip_ids)), side='left')
+    slice_stop = np.searchsorted(sorted_codes, np.arange(len(trip_ids)), side='right')
+
+    # Times parsed with one column operation (cached tables already carry them)
+    if 'arrival_sec' in stop_times_df:
+        arrival = stop_times_df['arrival_sec'].to_numpy()[order]
+        departure = stop_times_df['departure_sec'].to_numpy()[order]
+    else:
+        arrival = gtfs_seconds(stop_times_df['arrival_time'].to_numpy()[order])
+        departure = gtfs_seconds(stop_times_df['departure_time'].to_numpy()[order])
+    # Calculate duration (dwell time)
+    durations = np.maximum(0, departure - arrival).astype(str).tolist()
+    stop_ids = stop_times_df['stop_id'].astype(object).to_numpy()[order].astype(str).tolist()
+
+    # B. Trips with stop times, sorted by (block, start time of the VERY FIRST stop, trip order)
+    trip = trip_ids.get_indexer(trips_df['trip_id'])
+    block_codes, block_ids = pd.factorize(trips_df['block_id'], sort=True)
+    keep = (trip >= 0) & (block_codes >= 0)
+    trip, block_codes = trip[keep], block_codes[keep]
+    if not len(trip):
+        return
+    start = arrival[slice_start[trip]]
+    chain = np.lexsort((np.arange(len(trip)), start, block_codes))
+    trip, block_codes, start = trip[chain], block_codes[chain], start[chain]
 
-    for block_id, block_trips in blocks_grouped:
-        # A. Collect Start Times for all trips in this block
-        trip_sequence = []
-        
-        for _, trip in block_trips.iterrows():
-            t_id = trip['trip_id']
-            if t_id in stop_times_grouped.groups:
-                # Get the VERY FIRST stop of this trip
-                first_stop = stop_times_grouped.get_group(t_id).sort_values('stop_sequence').iloc[0]
-                start_sec = seconds_from_midnight(first_stop['arrival_time'])
-                trip_sequence.append({
-                    'start_time': start_sec,
-                    'trip_id': t_id,
-                    'route_id': trip['route_id']
-                })
-        
-        # B. Sort trips chronologically (Trip 1 -> Trip 2 -> Trip 3)
-        trip_sequence.sort(key=lambda x: x['start_time'])
-
-        if not trip_sequence:
-            continue
+    # Stop rows of every trip in chain order, as index ranges into the sorted stop times
+    lengths = slice_stop[trip] - slice_start[trip]
+    rows = np.repeat(slice_start[trip] - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+    row_bounds = np.r_[0, np.cumsum(lengths)]
+    block_first = np.flatnonzero(np.r_[True, block_codes[1:] != block_codes[:-1]])
+    block_end = np.r_[block_first[1:], len(trip)]
 
+    vehicle_count = 0
+    for first, end in zip(block_first.tolist(), block_end.tolist()):
         # C. Create ONE Vehicle Element
         # The vehicle spawns ONCE at the beginning of the first trip.
-        first_trip = trip_sequence[0]
-        
-        vehicle = ET.SubElement(root, "vehicle")
-        vehicle.set("id", str(block_id)) # ID is the Block (Physical Bus)
-        vehicle.set("type", "bus_standard")
-        vehicle.set("depart", str(first_trip['start_time']))
-        vehicle.set("color", "1,0,0") 
+        xml.start("vehicle", {"id": str(block_ids[block_codes[first]]),  # ID is the Block (Physical Bus)
+                              "type": "bus_standard", "depart": str(start[first]), "color": "1,0,0"})
 
         # D. Add stops for ALL trips in the chain
-        for trip_data in trip_sequence:
-            t_id = trip_data['trip_id']
-            route_name = trip_data['route_id']
-            
-            stops = stop_times_grouped.get_group(t_id).sort_values('stop_sequence')
-            
-            for _, stop_row in stops.iterrows():
-                arrival = seconds_from_midnight(stop_row['arrival_time'])
-                departure = seconds_from_midnight(stop_row['departure_time'])
-                
-                # Calculate duration (dwell time)
-                duration = max(0, departure - arrival)
-                
-                stop_elem = ET.SubElement(vehicle, "stop")
-                stop_elem.set("busStop", str(stop_row['stop_id']))
-                stop_elem.set("duration", str(duration))
-                
-                # OPTIONAL: "until"
-                # If you uncomment this, the bus will wait at the stop until the schedule says so.
-                # If you leave it commented, the bus leaves as soon as 'duration' is over.
-                # stop_elem.set("until", str(departure))
+        for r in rows[row_bounds[first]:row_bounds[end]].tolist():
+            # OPTIONAL: "until" (add "until": str(departure[r]))
+            # If you add it, the bus will wait at the stop until the schedule says so.
+            # If you leave it out, the bus leaves as soon as 'duration' is over.
+            xml.element("stop", {"busStop": stop_ids[r], "duration": durations[r]})
+        xml.end("vehicle")
 
         vehicle_count += 1
 
-    return prettify_xml(root)
+def inputs_key(gtfs, target_date, active_services):
+    """Everything the outputs for one date depend on: the feed tables, this script and the active services."""
+    sha = hashlib.sha1()
+    sha.update(gtfs.key('stops', 'trips', 'stop_times').encode())
+    sha.update(file_hash(os.path.abspath(__file__)).encode())
+    sha.update(target_date.encode())
+    sha.update("\n".join(sorted(active_services)).encode())
+    return sha.hexdigest()
+
+def is_current(output_dir, key):
+    try:
+        with open(os.path.join(output_dir, STAMP_FILE), encoding="utf-8") as f:
+            return json.load(f).get("key") == key
+    except (OSError, ValueError):
+        return False
 
 def main():
+    dates = parse_dates(sys.argv[1:]) if len(sys.argv) > 1 else [get_user_date()]
+
     print("Loading GTFS files...")
-    stops = pd.read_csv(FILES['stops'], dtype=str)
-    trips = pd.read_csv(FILES['trips'], dtype=str)
-    stop_times = pd.read_csv(FILES['stop_times'], dtype=str)
-    stop_times['stop_sequence'] = stop_times['stop_sequence'].astype(int)
-
-    target_date = get_user_date()
-    active_services = get_active_services(target_date)
-    
-    if not active_services:
-        print("CRITICAL: No active services. Check date.")
-        return
+    gtfs = load_gtfs(FILES)
+    calendar = ServiceCalendar.from_gtfs(gtfs)
+    tables = None  # only loaded if some date needs generating
+
+    for target_date in dates:
+        active_services = get_active_services(target_date, calendar)
+        if not active_services:
+            print(f"CRITICAL: No active services on {target_date}. Check date.")
+            continue
+
+        output_dir = OUTPUT_DIR if len(dates) == 1 else os.path.join(OUTPUT_DIR, target_date)
+        key = inputs_key(gtfs, target_date, active_services)
+        if is_current(output_dir, key):
+            print(f"{target_date}: inputs unchanged, keeping {output_dir}")
+            continue
+
+        if tables is None:
+            stops = gtfs.table('stops')
+            trips = gtfs.table('trips')
+            stop_times = gtfs.table('stop_times')
+            stop_times['stop_sequence'] = stop_times['stop_sequence'].astype(int)
+            tables = stops, trips, stop_times
+        stops, trips, stop_times = tables
+
+        # Generate
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = os.path.join(output_dir, STAMP_FILE)
+        if os.path.exists(stamp):
+            os.remove(stamp)
+
+        # 1. Stops
+        create_stops_xml(stops, os.path.join(output_dir, "sumo_stops.add.xml"))
+
+        # 2. Routes (The Block Version)
+        create_routes_xml_blocks(trips, stop_times, active_services, target_date,
+                                 os.path.join(output_dir, "sumo_routes.rou.xml"))
+
+        with open(stamp, "w", encoding="utf-8") as f:
+            json.dump({"date": target_date, "key": key}, f)
 
-    # Generate
-    OUTPUT_DIR = "intermediate/bus" 
-    os.makedirs(OUTPUT_DIR, exist_ok=True) 
-
-    # 1. Stops
-    with open(os.path.join(OUTPUT_DIR, "sumo_stops.add.xml"), "w", encoding="utf-8") as f:
-        f.write(create_stops_xml(stops))
-    
-    # 2. Routes (The Block Version)
-    with open(os.path.join(OUTPUT_DIR, "sumo_routes.rou.xml"), "w", encoding="utf-8") as f:
-        f.write(create_routes_xml_blocks(trips, stop_times, active_services, target_date))
-        
     print("\nSUCCESS. Please run the rest of your pipeline (Connect -> Run).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+from net_cache import cached_file_hash
+from xml_writer import iter_children
+from duarouter_pool import WORKERS, route_partitioned
+
+# --- CONFIGURATION ---
+CACHE_VERSION = 3
+CACHE_DIR = "intermediate/bus/.route_cache"
+
+
+# --- FORMAT ---
+# <CACHE_DIR>/legs.v<version>.<key[:16]>.json
+#   {"<vType>\t<from edge>\t<to edge>": {"edges": "edge edge ..." | null (no route),
+#                                          "status": "routed" | "repaired" | "dropped",
+#                                          "messages": [duarouter warnings/errors for the leg]}}
+# key = sha1 of the net file, the vType definitions and the duarouter
+# options, so a changed network starts a fresh cache.
+# Every stored path starts on the leg's from edge and ends on its to edge.
+
+
+def vehicle_legs(vtype, edges, end_positions):
+    """(vType, from, to) legs between consecutive stop edges.
+
+    A stop further down the same edge needs no leg. A stop upstream on the
+    same edge needs a loop, which a from/to leg can't express; then the
+    result is None and the vehicle has to be routed as a whole.
+    """
+    legs = []
+    for i in range(len(edges) - 1):
+        frm, to = edges[i], edges[i + 1]
+        if frm != to:
+            legs.append((vtype, frm, to))
+        elif end_positions[i + 1] < end_positions[i]:
+            return None
+    return legs
+
+
+def stitch(edges, paths):
+    """Full route from the leg paths: each leg starts on the edge the previous one ended on.
+
+    Only valid for paths from LegCache, which keeps a path only if it really
+    starts and ends on its leg's edges.
+    """
+    route = [edges[0]]
+    for path in paths:
+        route.extend(path[1:])
+    return route
+
+
+class LegCache:
+    """Shortest paths between stop edges, routed by duarouter once and kept across runs.
+
+    options must not shorten routes (--remove-loops drops turnarounds at
+    either end, --repair may change the endpoints); a path that doesn't
+    run from the leg's from edge to its to edge is stored as no route.
+    """
+
+    def __init__(self, net_file, vtypes, options, cache_dir=CACHE_DIR):
+        self.net_file = net_file
+        self.vtypes = vtypes
+        self.options = options
+        os.makedirs(cache_dir, exist_ok=True)
+        sha = hashlib.sha1()
+        sha.update(cached_file_hash(net_file, cache_dir).encode())
+        sha.update(json.dumps([dict(vt.attrib) for vt in vtypes], sort_keys=True).encode())
+        sha.update(json.dumps(options).encode())
+        self.path = os.path.join(cache_dir, f"legs.v{CACHE_VERSION}.{sha.hexdigest()[:16]}.json")
+        self.legs = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.legs = json.load(f)
+        self.hits = 0
+        self.routed = 0
+        self.messages = []   # duarouter messages naming no leg, from this run's routing
+
+    def get(self, leg):
+        """Edge list of a leg already routed, None if it has no route."""
+        path = self.legs["\t".join(leg)]["edges"]
+        return path.split() if path is not None else None
+
+    def result(self, leg):
+        """(status, messages) of a leg already routed, as in route_partitioned's report."""
+        entry = self.legs["\t".join(leg)]
+        return entry["status"], entry["messages"]
+
+    def route(self, legs, workers=WORKERS):
+        """Routes every leg not cached yet, with parallel duarouter workers."""
+        missing = sorted({leg for leg in legs if "\t".join(leg) not in self.legs})
+        self.hits += len(set(legs)) - len(missing)
+        if not missing:
+            return
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(self.path))
+        try:
+            routed_file = os.path.join(tmp_dir, "legs_routed.rou.xml")
+            # Ids that can't be mistaken for an edge or lane named by a number
+            trips = [({"id": f"leg#{i}", "type": vtype, "depart": "0.00", "from": frm, "to": to}, [])
+                     for i, (vtype, frm, to) in enumerate(missing)]
+            report = route_partitioned(self.net_file, self.vtypes, trips, routed_file, self.options, workers)
+
+            found = {}
+            _, vehicles = iter_children(routed_file)
+            for vehicle in vehicles:
+                route = vehicle.find("route")
+                if vehicle.tag == "vehicle" and route is not None:
+                    found[int(vehicle.get("id")[len("leg#"):])] = route.get("edges")
+        finally:
+            shutil.rmtree(tmp_dir)
+        for i, leg in enumerate(missing):
+            _, frm, to = leg
+            entry = report[f"leg#{i}"]
+            # Messages name the leg's internal trip id; say which leg it is instead
+            messages = [f"leg '{frm}' -> '{to}': {message}" for message in entry["messages"]]
+            status = entry["status"]
+            edges = found.get(i, "").split()
+            if status != "dropped" and not (edges and edges[0] == frm and edges[-1] == to):
+                status = "dropped"
+                messages.append(f"leg '{frm}' -> '{to}': route does not run from '{frm}' to '{to}'")
+            self.legs["\t".join(leg)] = {"edges": found[i] if status != "dropped" else None,
+                                          "status": status, "messages": messages}
+        self.messages.extend(report[None]["messages"])
+        self.routed += len(missing)
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.legs, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,134 @@
+import sys
+import datetime
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+DATE_FORMAT = "%Y%m%d"
+
+
+def _parse_dates(values):
+    return pd.to_datetime(pd.Series(values, dtype=object), format=DATE_FORMAT, errors="coerce")
+
+
+class ServiceCalendar:
+    """Active-service bitmap per (service_id, date) over the whole feed validity period.
+
+    Built once from calendar.txt and calendar_dates.txt; afterwards every
+    query is a lookup. Rows that can't be parsed are skipped and reported
+    in self.errors (and printed as warnings).
+    """
+
+    def __init__(self, calendar=None, calendar_dates=None):
+        self.errors = []
+        calendar = self._check(calendar, "calendar", ("service_id", "start_date", "end_date"))
+        calendar_dates = self._check(calendar_dates, "calendar_dates", ("service_id", "date", "exception_type"))
+
+        # calendar.txt
+        starts = _parse_dates(calendar["start_date"])
+        ends = _parse_dates(calendar["end_date"])
+        self._report(calendar, calendar["service_id"].isna(), "calendar", "service_id")
+        self._report(calendar, starts.isna() | ends.isna(), "calendar", "start_date/end_date")
+        missing_days = [day for day in WEEKDAYS if day not in calendar.columns]
+        if missing_days and len(calendar):
+            self._warn(f"calendar has no {', '.join(missing_days)} column(s); treated as inactive")
+        valid = (calendar["service_id"].notna() & starts.notna() & ends.notna()).to_numpy()
+        calendar, starts, ends = calendar[valid], starts[valid], ends[valid]
+
+        # calendar_dates.txt; for repeated (service, date) rows the last one wins
+        dates = _parse_dates(calendar_dates["date"])
+        types = calendar_dates["exception_type"]
+        self._report(calendar_dates, calendar_dates["service_id"].isna(), "calendar_dates", "service_id")
+        self._report(calendar_dates, dates.isna(), "calendar_dates", "date")
+        self._report(calendar_dates, dates.notna() & ~types.isin(["1", "2"]), "calendar_dates", "exception_type")
+        valid = (calendar_dates["service_id"].notna() & dates.notna() & types.isin(["1", "2"])).to_numpy()
+        calendar_dates, dates, types = calendar_dates[valid], dates[valid], types[valid]
+
+        # Validity period and service index
+        bounds = pd.concat([starts, ends, dates])
+        self.start = bounds.min().date() if len(bounds) else datetime.date.today()
+        n_days = (bounds.max().date() - self.start).days + 1 if len(bounds) else 0
+        self.service_ids = np.array(pd.unique(pd.concat([calendar["service_id"], calendar_dates["service_id"]])
+                                              .dropna()), dtype=object)
+        self._service_index = {sid: i for i, sid in enumerate(self.service_ids.tolist())}
+        self.bitmap = np.zeros((len(self.service_ids), n_days), dtype=bool)
+
+        # Weekly pattern: active on [start, end] on flagged weekdays
+        if len(calendar):
+            origin = pd.Timestamp(self.start)
+            first = (starts - origin).dt.days.to_numpy()
+            last = (ends - origin).dt.days.to_numpy()
+            flags = np.column_stack([(calendar[day] == "1").to_numpy() if day in calendar.columns
+                                     else np.zeros(len(calendar), dtype=bool) for day in WEEKDAYS])
+            days = np.arange(n_days)
+            weekday = (days + self.start.weekday()) % 7
+            active = (days >= first[:, None]) & (days <= last[:, None]) & flags[:, weekday]
+            rows = np.array([self._service_index[sid] for sid in calendar["service_id"].tolist()])
+            np.logical_or.at(self.bitmap, rows, active)
+
+        # Exceptions: 1 = added, 2 = removed
+        if len(calendar_dates):
+            exceptions = pd.DataFrame({"service_id": calendar_dates["service_id"].to_numpy(),
+                                       "day": (dates - pd.Timestamp(self.start)).dt.days.to_numpy(),
+                                       "added": (types == "1").to_numpy()})
+            exceptions = exceptions.drop_duplicates(["service_id", "day"], keep="last")
+            rows = np.array([self._service_index[sid] for sid in exceptions["service_id"].tolist()])
+            self.bitmap[rows, exceptions["day"].to_numpy()] = exceptions["added"].to_numpy()
+
+    @classmethod
+    def from_gtfs(cls, gtfs):
+        """Builds the index from the cached feed; either table may be missing."""
+        return cls(gtfs.table("calendar") if "calendar" in gtfs else None,
+                   gtfs.table("calendar_dates") if "calendar_dates" in gtfs else None)
+
+    def _warn(self, message):
+        self.errors.append(message)
+        print(f"Warning: {message}", file=sys.stderr)
+
+    def _check(self, df, name, required):
+        if df is None:
+            return pd.DataFrame({column: pd.Series(dtype=object) for column in required})
+        missing = [column for column in required if column not in df.columns]
+        if missing:
+            raise ValueError(f"{name}.txt is missing column(s): {', '.join(missing)}")
+        return df
+
+    def _report(self, df, bad, name, column):
+        bad = np.asarray(bad)
+        if not bad.any():
+            return
+        # +2: header line and 1-based line numbers
+        lines = (np.flatnonzero(bad) + 2).tolist()
+        shown = ", ".join(map(str, lines[:10])) + (" ..." if len(lines) > 10 else "")
+        self._warn(f"{name}.txt: {len(lines)} row(s) with invalid {column} skipped (lines {shown})")
+
+    def _day(self, date):
+        if isinstance(date, str):
+            date = datetime.datetime.strptime(date, DATE_FORMAT).date()
+        elif isinstance(date, datetime.datetime):
+            date = date.date()
+        return (date - self.start).days
+
+    def is_active(self, service_id, date):
+        """True if service_id runs on date (YYYYMMDD string or date)."""
+        day = self._day(date)
+        row = self._service_index.get(service_id)
+        return row is not None and 0 <= day < self.bitmap.shape[1] and bool(self.bitmap[row, day])
+
+    def active_services(self, date):
+        """Set of service_ids active on date; empty outside the feed's validity period."""
+        day = self._day(date)
+        if not 0 <= day < self.bitmap.shape[1]:
+            return set()
+        return set(self.service_ids[self.bitmap[:, day]].tolist())
+
+    def active_services_range(self, first, last):
+        """{YYYYMMDD: set of service_ids} for every date from first to last, inclusive."""
+        lo, hi = self._day(first), self._day(last)
+        result = {}
+        for day in range(lo, hi + 1):
+            date = (self.start + datetime.timedelta(days=day)).strftime(DATE_FORMAT)
+            inside = 0 <= day < self.bitmap.shape[1]
+            result[date] = set(self.service_ids[self.bitmap[:, day]].tolist()) if inside else set()
+        return result
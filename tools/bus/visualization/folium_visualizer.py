@@ -1,10 +1,9 @@
 import os
 import sys
 import datetime
-import xml.etree.ElementTree as ET
+import numpy as np
 import folium
 from folium.plugins import TimestampedGeoJson
-import sumolib
 
 # --- CONFIGURATION ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,149 +11,214 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR)))
 NET_FILE = os.path.join(PROJECT_ROOT, "network", "sumo", "heilbronn.net.xml")
 TRACE_FILE = os.path.join(PROJECT_ROOT, "results","trace.xml")
 OUTPUT_HTML = os.path.join(PROJECT_ROOT, "results", "interactive_map.html")
+OUTPUT_TILES = os.path.join(PROJECT_ROOT, "results", "map_tiles")
+
+# "html":  one folium TimestampedGeoJson file (everything in memory, short traces only)
+# "tiles": time-bucketed, tiled data files + viewer in OUTPUT_TILES (bounded memory)
+OUTPUT_MODE = "tiles"
 
 # Optimization Settings
 MAX_FRAMES = 86400  
 START_DATE = datetime.datetime(2025, 11, 28, 8, 0, 0)
-SKIP_FRAMES = 5  # Only render every 5th second (Huge performance boost)
+SKIP_FRAMES = 5  # html mode: only render every 5th second (Huge performance boost)
+# tiles mode: keep every second, but only the keyframes of each track;
+# dropped positions are within this many meters of the interpolated track
+TRACK_TOLERANCE = 2.0
+FRAME_STEP = SKIP_FRAMES if OUTPUT_MODE == "html" else 1
 STATIONARY_THRESHOLD = 180  # Despawn if stationary for this many seconds
 
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+from net_cache import load_net
+from projection import get_projection
+from fcd_reader import iter_timesteps
+from fcd_shards import DEFAULT_WORKERS, map_shards, timestep_index
+from fcd_store import existing_store, open_store
+from tile_writer import TileWriter
+
+# > 1: parse trace.xml in time shards on that many processes
+# 1:   read the columnar store in this process
+WORKERS = DEFAULT_WORKERS
+
+
+# Style: [color, radius, opacity] by style code
+PALETTE = [
+    ["#3498db", 2, 0.8],  # vehicle
+    ["#e74c3c", 5, 0.8],  # bus
+    ["#f1c40f", 1, 0.9],  # default pedestrian (yellow), smaller than cars
+]
+PERSON_STYLE = 2
+
+
+def point_feature(lon, lat, time_str, popup, style):
+    color, radius, opacity = PALETTE[style]
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+        'properties': {
+            'time': time_str,
+            'popup': popup,
+            'icon': 'circle',
+            'iconstyle': {
+                'fillColor': color, 
+                'fillOpacity': opacity, 
+                'stroke': 'false', 
+                'radius': radius
+            }
+        }
+    }
+
+
+def compact_frame(t, ids, types, kinds, xs, ys, speeds, projection):
+    """Projects one kept timestep.
+
+    Returns (t, ids, xs, ys, lons, lats, styles, speeds) for all vehicles and persons;
+    persons have PERSON_STYLE. Which vehicles are shown is decided later by
+    StationaryTracker, in time order.
+    """
+    lons, lats = projection.xy_to_lonlat(xs, ys)
+    styles = np.where(kinds == 1, PERSON_STYLE, 0).astype(np.uint8)
+    styles[[k == 0 and 'bus' in v_type for v_type, k in zip(types, kinds.tolist())]] = 1
+    return t, ids, xs, ys, lons, lats, styles, speeds
+
+
+def shard_frames(trace_file, start, stop, net_file, step):
+    """Worker: parse and project the kept frames of one byte range of the trace."""
+    projection = get_projection(net_file)
+    frames = []
+    for t, frame in iter_timesteps(trace_file, start=start, stop=stop):
+        # Skip frames logic
+        if int(t) % step != 0:
+            continue
+        frames.append(compact_frame(t, frame['id'], frame['type'], frame['kind'], frame['x'], frame['y'],
+                                    frame['speed'], projection))
+    return frames
+
+
+def store_frames(store, projection, step):
+    """Same frames as shard_frames, read from the columnar store in this process."""
+    for t, frame in store.iter_timesteps(columns=("id", "type", "kind", "x", "y", "speed")):
+        if int(t) % step != 0:
+            continue
+        ids = [store.ids[code] for code in frame['id'].tolist()]
+        types = [store.types[code] for code in frame['type'].tolist()]
+        yield compact_frame(t, ids, types, frame['kind'], frame['x'].astype(float), frame['y'].astype(float),
+                            frame['speed'], projection)
+
+
+class StationaryTracker:
+    """Despawns vehicles that have not moved for STATIONARY_THRESHOLD seconds.
+
+    The state lives outside the shard workers and is fed the frames in time
+    order, so it carries over from one shard to the next.
+    """
+
+    def __init__(self):
+        self.vehicle_tracking = {}  # {vehicle_id: {'last_pos': (x,y), 'last_move_time': t, 'last_seen': t}}
+        self.despawn_times = {}  # {vehicle_id: despawn_time}
+
+    def update(self, t, ids, xs, ys):
+        """Returns one visible flag per vehicle of this frame."""
+        vehicle_tracking, despawn_times = self.vehicle_tracking, self.despawn_times
+        visible = []
+        for bus_id, x, y in zip(ids, xs, ys):
+            # Initialize tracking for new vehicles
+            if bus_id not in vehicle_tracking:
+                vehicle_tracking[bus_id] = {
+                    'last_pos': (x, y),
+                    'last_move_time': t,
+                    'last_seen': t
+                }
+            else:
+                # Check if vehicle has moved (tolerance of 0.5 meters)
+                last_x, last_y = vehicle_tracking[bus_id]['last_pos']
+                distance = ((x - last_x)**2 + (y - last_y)**2)**0.5
+                
+                if distance > 0.5:  # Vehicle moved
+                    vehicle_tracking[bus_id]['last_pos'] = (x, y)
+                    vehicle_tracking[bus_id]['last_move_time'] = t
+                
+                vehicle_tracking[bus_id]['last_seen'] = t
+                
+                # Check if stationary too long
+                stationary_duration = t - vehicle_tracking[bus_id]['last_move_time']
+                if stationary_duration > STATIONARY_THRESHOLD and bus_id not in despawn_times:
+                    despawn_times[bus_id] = t
+                    print(f"    Bus {bus_id} stationary for {stationary_duration:.0f}s - marking for despawn")
+                    visible.append(False)  # Don't add more features for this bus
+                    continue
+            
+            # Skip if already marked for despawn
+            visible.append(bus_id not in despawn_times)
+        return visible
+
 
 def main():
     print("--- 1. LOADING NETWORK ---")
-    net = sumolib.net.readNet(NET_FILE)
-    bbox = net.getBoundary()
-    center_lon, center_lat = net.convertXY2LonLat((bbox[0]+bbox[2])/2, (bbox[1]+bbox[3])/2)
+    net = load_net(NET_FILE)
+    projection = net.projection
+    center_lon, center_lat = projection.center_lonlat()
     
     print("--- 2. PARSING TRACE (FAST MODE) ---")
     features = []
-    
-    context = ET.iterparse(TRACE_FILE, events=("start", "end"))
-    context = iter(context)
-    event, root = next(context)
-
-    vehicle_tracking = {}  # {vehicle_id: {'last_pos': (x,y), 'last_move_time': t, 'last_seen': t}}
-    despawn_times = {}  # {vehicle_id: despawn_time}
-
 
+    # A built store beats re-parsing the XML on any number of workers; without
+    # one, a single worker builds it and several workers shard the XML instead
+    store = existing_store(TRACE_FILE)
+    if store is None and WORKERS <= 1:
+        store = open_store(TRACE_FILE)
+    if store is not None:
+        print(f"   Reading columnar store {store.store_dir}")
+        frames = store_frames(store, projection, FRAME_STEP)
+    else:
+        print(f"   No columnar store; processing XML time shards on {WORKERS} workers")
+        times, _ = timestep_index(TRACE_FILE)
+        end_time = float(times[0]) + MAX_FRAMES + FRAME_STEP if len(times) else None
+        shards = map_shards(shard_frames, TRACE_FILE, (NET_FILE, FRAME_STEP), end=end_time, workers=WORKERS)
+        frames = (frame for shard in shards for frame in shard)
+
+    tracker = StationaryTracker()
+    writer = None
+    if OUTPUT_MODE == "tiles":
+        writer = TileWriter(OUTPUT_TILES, PALETTE, (center_lat, center_lon), title="Heilbronn buses",
+                            start_date=START_DATE, period=FRAME_STEP, tolerance=TRACK_TOLERANCE)
     count = 0
     frames_processed = 0
     first_sim_time = None
 
-    for event, elem in context:
-        if event == "end" and elem.tag == "timestep":
-            t = float(elem.attrib['time'])
-            
-            # Skip frames logic
-            if int(t) % SKIP_FRAMES != 0:
-                root.clear()
-                continue
-
-            if first_sim_time is None:
-                first_sim_time = t
-                print(f"   Start detected at: {t}s")
-            
-            if t > (first_sim_time + MAX_FRAMES):
-                break
-
-            time_str = (START_DATE + datetime.timedelta(seconds=t)).isoformat()
-
-            for veh in elem.findall('vehicle'):
-                x, y = float(veh.attrib['x']), float(veh.attrib['y'])
-                v_type = veh.attrib['type']
-                bus_id = veh.attrib['id']
-
-                # Initialize tracking for new vehicles
-                if bus_id not in vehicle_tracking:
-                    vehicle_tracking[bus_id] = {
-                        'last_pos': (x, y),
-                        'last_move_time': t,
-                        'last_seen': t
-                    }
-                else:
-                    # Check if vehicle has moved (tolerance of 0.5 meters)
-                    last_x, last_y = vehicle_tracking[bus_id]['last_pos']
-                    distance = ((x - last_x)**2 + (y - last_y)**2)**0.5
-                    
-                    if distance > 0.5:  # Vehicle moved
-                        vehicle_tracking[bus_id]['last_pos'] = (x, y)
-                        vehicle_tracking[bus_id]['last_move_time'] = t
-                    
-                    vehicle_tracking[bus_id]['last_seen'] = t
-                    
-                    # Check if stationary too long
-                    stationary_duration = t - vehicle_tracking[bus_id]['last_move_time']
-                    if stationary_duration > STATIONARY_THRESHOLD and bus_id not in despawn_times:
-                        despawn_times[bus_id] = t
-                        print(f"    Bus {bus_id} stationary for {stationary_duration:.0f}s - marking for despawn")
-                        continue  # Don't add more features for this bus
-                
-                # Skip if already marked for despawn
-                if bus_id in despawn_times:
-                    continue
-
-                
-                lon, lat = net.convertXY2LonLat(x, y)
-                
-                # Style
-                color = "#3498db"
-                radius = 2
-                if 'bus' in v_type:
-                    color = '#e74c3c'
-                    radius = 5
-            
-                features.append({
-                    'type': 'Feature',
-                    'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
-                    'properties': {
-                        'time': time_str,
-                        'popup': bus_id,
-                        'icon': 'circle',
-                        'iconstyle': {
-                            'fillColor': color, 
-                            'fillOpacity': 0.8, 
-                            'stroke': 'false', 
-                            'radius': radius
-                        }
-                    }
-                })
-                count += 1
-            
-            frames_processed += 1
-            root.clear() # Clear memory
-
-    for p in elem.findall('person'):
-        x, y = float(p.attrib['x']), float(p.attrib['y'])
-        p_id = p.attrib['id']
+    for t, ids, xs, ys, lons, lats, styles, speeds in frames:
+        if first_sim_time is None:
+            first_sim_time = t
+            print(f"   Start detected at: {t}s")
         
-        lon, lat = net.convertXY2LonLat(x, y)
-
-        # Person Style
-        color = "#f1c40f" # Default Pedestrian (Yellow)
-        radius = 1      # Smaller than cars
-
-        features.append({
-            'type': 'Feature',
-            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
-            'properties': {
-                'time': time_str,
-                'popup': p_id,
-                'icon': 'circle',
-                'iconstyle': {
-                    'fillColor': color, 
-                    'fillOpacity': 0.9, 
-                    'stroke': 'false', 
-                    'radius': radius
-                }
-            }
-        })
-        count += 1
-    
-    frames_processed += 1
-    root.clear() # Clear memory
+        if t > (first_sim_time + MAX_FRAMES):
+            break
+
+        is_vehicle = styles != PERSON_STYLE
+        vehicles = np.flatnonzero(is_vehicle)
+        visible = tracker.update(t, [ids[i] for i in vehicles.tolist()], xs[vehicles].tolist(), ys[vehicles].tolist())
+        # visible vehicles first, then persons
+        shown = np.concatenate((vehicles[np.array(visible, dtype=bool)], np.flatnonzero(~is_vehicle)))
+
+        if writer:
+            writer.add(t, [ids[i] for i in shown.tolist()], lons[shown], lats[shown], styles[shown], speeds[shown])
+        else:
+            time_str = (START_DATE + datetime.timedelta(seconds=t)).isoformat()
+            for i, lon, lat, style in zip(shown.tolist(), lons[shown].tolist(), lats[shown].tolist(),
+                                          styles[shown].tolist()):
+                features.append(point_feature(lon, lat, time_str, ids[i], style))
+        count += len(shown)
+        frames_processed += 1
             
     print(f"   Processed {count} positions across {frames_processed} frames.")
 
+    if writer:
+        print("--- 3. WRITING TILED MAP DATA ---")
+        viewer = writer.close()
+        print(f"   {writer.points} positions -> {writer.segments} track segments "
+              f"({writer.points / max(writer.segments, 1):.1f}x fewer)")
+        print(f"✅ MAP GENERATED: {viewer}")
+        return
+
     print("--- 3. BUILDING MAP ---")
     m = folium.Map(location=[center_lat, center_lon], zoom_start=14, tiles='CartoDB dark_matter')
 
@@ -1,107 +1,181 @@
 import os
 import sys
 import datetime
-import xml.etree.ElementTree as ET
 import folium
 from folium.plugins import TimestampedGeoJson
-import sumolib
 
 # --- CONFIGURATION ---
 # Robust paths
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
 
+sys.path.append(os.path.join(PROJECT_ROOT, "tools", "common"))
+from net_cache import load_net
+from projection import get_projection
+from fcd_reader import iter_timesteps
+from fcd_shards import DEFAULT_WORKERS, map_shards, timestep_index
+from fcd_store import existing_store, open_store
+from tile_writer import TileWriter
+
 NET_FILE = os.path.join(PROJECT_ROOT, "network", "sumo", "heilbronn.net.xml")
 
 # Change this line to point to your car FCD output
 TRACE_FILE = os.path.join(PROJECT_ROOT, "results", "trace.xml")
 
 OUTPUT_HTML = os.path.join(PROJECT_ROOT, "results", "interactive_cars.html")
+OUTPUT_TILES = os.path.join(PROJECT_ROOT, "results", "cars_tiles")
+
+# "html":  one folium TimestampedGeoJson file (everything in memory, short traces only)
+# "tiles": time-bucketed, tiled data files + viewer in OUTPUT_TILES (bounded memory)
+OUTPUT_MODE = "tiles"
 
 # Visualization Settings
 MAX_FRAMES = 86400  # render up to 1 day max
 START_DATE = datetime.datetime(2025, 11, 28, 8, 0, 0) # Fake start timestamp
+# tiles mode: dropped positions are within this many meters of the interpolated track
+TRACK_TOLERANCE = 2.0
+
+# > 1: parse trace.xml in time shards on that many processes
+# 1:   read the columnar store in this process
+WORKERS = DEFAULT_WORKERS
+
+
+# styling for cars: [color, radius, opacity] by style code
+PALETTE = [
+    ["#3498db", 1, 0.8],  # car
+    ["#e67e22", 6, 0.8],  # truck
+]
+
+
+def compact_frame(t, ids, types, xs, ys, speeds, projection):
+    """(t, ids, lons, lats, style codes, speeds) for the vehicles of one timestep."""
+    lons, lats = projection.xy_to_lonlat(xs, ys)
+    styles = [1 if "truck" in (v_type or "car") else 0 for v_type in types]
+    return t, ids, lons, lats, styles, speeds
+
+
+def frame_features(t, ids, lons, lats, styles, speeds=None):
+    """Map features for the vehicles of one timestep."""
+    time_str = (START_DATE + datetime.timedelta(seconds=t)).isoformat()
+    features = []
+
+    # iterate over vehicles
+    for car_id, lon, lat, style in zip(ids, lons.tolist(), lats.tolist(), styles):
+        color, radius, opacity = PALETTE[style]
+
+        feature = {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat],
+            },
+            "properties": {
+                "time": time_str,
+                "popup": f"Car {car_id}",
+                "icon": "circle",
+                "iconstyle": {
+                    "fillColor": color,
+                    "fillOpacity": opacity,
+                    "stroke": "false",
+                    "radius": radius
+                }
+            }
+        }
+
+        features.append(feature)
+    return features
+
+
+def shard_frames(trace_file, start, stop, net_file, begin, end, output_mode):
+    """Worker: parse and project one byte range of the trace.
+
+    Returns compact frames, or their features in "html" mode.
+    """
+    projection = get_projection(net_file)
+    frames = []
+    for t, frame in iter_timesteps(trace_file, begin, end, start=start, stop=stop):
+        is_vehicle = frame["kind"] == 0
+        keep = is_vehicle.tolist()
+        ids = [v for v, k in zip(frame["id"], keep) if k]
+        types = [v for v, k in zip(frame["type"], keep) if k]
+        compact = compact_frame(t, ids, types, frame["x"][is_vehicle], frame["y"][is_vehicle],
+                                frame["speed"][is_vehicle], projection)
+        frames.append(frame_features(*compact) if output_mode == "html" else compact)
+    return frames
+
+
+def store_frames(store, projection, begin, end):
+    """Same compact frames as shard_frames, read from the columnar store in this process."""
+    # only the columns and time window we draw are read from the store
+    for t, frame in store.iter_timesteps(begin, end, columns=("id", "type", "kind", "x", "y", "speed")):
+        is_vehicle = frame["kind"] == 0
+        ids = [store.ids[code] for code in frame["id"][is_vehicle].tolist()]
+        types = [store.types[code] for code in frame["type"][is_vehicle].tolist()]
+        yield compact_frame(t, ids, types, frame["x"][is_vehicle], frame["y"][is_vehicle],
+                            frame["speed"][is_vehicle], projection)
 
 
 def main():
     print("--- 1. LOADING NETWORK & PROJECTION ---")
-    net = sumolib.net.readNet(NET_FILE)
+    net = load_net(NET_FILE)
+    projection = net.projection
 
-    bbox = net.getBoundary()
-    center_x = (bbox[0] + bbox[2]) / 2
-    center_y = (bbox[1] + bbox[3]) / 2
-    center_lon, center_lat = net.convertXY2LonLat(center_x, center_y)
+    center_lon, center_lat = projection.center_lonlat()
 
     print(f"   Map Center: {center_lat:.5f}, {center_lon:.5f}")
 
     print("--- 2. PARSING CAR TRACE DATA ---")
     features = []
-    
-    context = ET.iterparse(TRACE_FILE, events=("start", "end"))
-    context = iter(context)
-    event, root = next(context)
+    writer = None
+    if OUTPUT_MODE == "tiles":
+        writer = TileWriter(OUTPUT_TILES, PALETTE, (center_lat, center_lon), title="Heilbronn cars",
+                            start_date=START_DATE, period=1, tolerance=TRACK_TOLERANCE)
+
+    # A built store beats re-parsing the XML on any number of workers; without
+    # one, a single worker builds it and several workers shard the XML instead
+    store = existing_store(TRACE_FILE)
+    if store is None and WORKERS <= 1:
+        store = open_store(TRACE_FILE)
+    if store is not None:
+        print(f"   Reading columnar store {store.store_dir}")
+        first_sim_time = store.time_range[0] if store.time_range else None
+    else:
+        times, _ = timestep_index(TRACE_FILE)
+        first_sim_time = float(times[0]) if len(times) else None
 
     count = 0
-    first_sim_time = None
-
-    for event, elem in context:
-        if event == "end" and elem.tag == "timestep":
-            t = float(elem.attrib['time'])
-            if t > MAX_FRAMES:
-                break
-
-            if first_sim_time is None:
-                first_sim_time = t
-                print(f"   Visualizer detected start at t={t}s")
-
-            if t > (first_sim_time + MAX_FRAMES):
-                break
-
-            time_str = (START_DATE + datetime.timedelta(seconds=t)).isoformat()
-
-            # iterate over vehicles
-            for veh in elem.findall("vehicle"):
-                x = float(veh.attrib["x"])
-                y = float(veh.attrib["y"])
-                v_type = veh.attrib.get("type", "car")  # fallback
-                car_id = veh.attrib["id"]
-
-                lon, lat = net.convertXY2LonLat(x, y)
-
-                # styling for cars
-                if "truck" in v_type:
-                    color = "#e67e22"
-                    radius = 6
-                else:
-                    color = "#3498db"
-                    radius = 1
-
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat],
-                    },
-                    "properties": {
-                        "time": time_str,
-                        "popup": f"Car {car_id}",
-                        "icon": "circle",
-                        "iconstyle": {
-                            "fillColor": color,
-                            "fillOpacity": 0.8,
-                            "stroke": "false",
-                            "radius": radius
-                        }
-                    }
-                }
-
-                features.append(feature)
-                count += 1
-
-            root.clear()
+    if first_sim_time is not None:
+        print(f"   Visualizer detected start at t={first_sim_time}s")
+        end_time = min(MAX_FRAMES, first_sim_time + MAX_FRAMES)
+
+        if store is not None:
+            frames = store_frames(store, projection, first_sim_time, end_time)
+            if OUTPUT_MODE == "html":
+                frames = (frame_features(*frame) for frame in frames)
+        else:
+            print(f"   No columnar store; processing XML time shards on {WORKERS} workers")
+            shards = map_shards(shard_frames, TRACE_FILE, (NET_FILE, first_sim_time, end_time, OUTPUT_MODE),
+                                first_sim_time, end_time, workers=WORKERS)
+            frames = (frame for shard in shards for frame in shard)
+
+        for frame in frames:
+            if writer:
+                writer.add(*frame)
+                count += len(frame[1])
+            else:
+                features.extend(frame)
+                count += len(frame)
 
     print(f"   Processed {count} car positions.")
 
+    if writer:
+        print("--- 3. WRITING TILED MAP DATA ---")
+        viewer = writer.close()
+        print(f"✅ CAR MAP GENERATED: {viewer}")
+        print(f"   → {writer.segments} track segments in {len(writer.buckets)} time buckets; "
+              f"open index.html in a browser")
+        return
+
     print("--- 3. BUILDING INTERACTIVE MAP ---")
     m = folium.Map(
         location=[center_lat, center_lon],
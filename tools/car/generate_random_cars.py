@@ -2,20 +2,30 @@ import os
 import subprocess
 import sys
 
-def run_random_trips(begin, end, period, output, prefix):
+# Parallel windows, derived seeds and streaming merge (tools/common/demand.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from demand import WORKERS, TripGenerator, merge_routes, run_parallel, validate_trips, window_seed
+from net_cache import load_net
+
+# --- CONFIGURATION ---
+SEED = 42   # base seed; every window runs with its own seed derived from it
+NETWORK = "network/sumo/heilbronn.net.xml"
+NATIVE = True     # sample trips in-process (demand.TripGenerator) instead of calling randomTrips.py per window
+VALIDATE = True   # native only: drop unroutable trips with one duarouter run per window (the slow part)
+
+def run_random_trips(begin, end, period, output, prefix, seed):
     # Ensure SUMO_HOME is set
     SUMO_HOME = os.environ.get("SUMO_HOME")
     if not SUMO_HOME:
         sys.exit("Error: Please declare environment variable 'SUMO_HOME'")
         
     randomTrips = os.path.join(SUMO_HOME, "tools", "randomTrips.py")
-    NETWORK = "network/sumo/heilbronn.net.xml"
 
     cmd = [
         sys.executable, randomTrips,
         "-n", NETWORK,
         "-o", output,
-        "--seed", "42",
+        "--seed", str(seed),
         "--begin", str(begin),
         "--end", str(end),
         "--period", str(period),
@@ -32,6 +42,16 @@ def run_random_trips(begin, end, period, output, prefix):
     print(f"  > Generated: {output} (IDs start with '{prefix}')")
 
 
+def generate_native(jobs):
+    # Same windows and options as run_random_trips; the net is loaded once for all of them
+    generator = TripGenerator(load_net(NETWORK), "passenger", allow_fringe=True)
+    for begin, end, period, output, prefix, seed in jobs:
+        count = generator.write(output, begin, end, period, prefix, seed)
+        print(f"  > Generated: {output} ({count} trips, IDs start with '{prefix}')")
+    if VALIDATE:
+        run_parallel(validate_trips, [(NETWORK, output, begin, end) for begin, end, _, output, _, _ in jobs], WORKERS)
+
+
 def generate_random_cars():
     # Output paths
     base_dir = "intermediate/car"
@@ -52,42 +72,23 @@ def generate_random_cars():
     print("--- Generating Traffic Segments ---")
     generated_files = []
 
-    # 1. Generate individual segments
+    # 1. Generate individual segments: natively, or all randomTrips windows at once (one process each, up to WORKERS)
+    jobs = []
     for begin, end, period, filename, prefix in windows:
         filepath = os.path.join(base_dir, filename)
-        run_random_trips(begin, end, period, filepath, prefix)
+        jobs.append((begin, end, period, filepath, prefix, window_seed(SEED, prefix)))
         generated_files.append(filepath)
+    if NATIVE:
+        generate_native(jobs)
+    else:
+        run_parallel(run_random_trips, jobs, WORKERS)
 
     print("\n--- Merging Files ---")
     
-    # # 2. Merge into one single XML file
-    # with open(final_output, "w") as outfile:
-    #     outfile.write("<routes>\n")
-        
-    #     for i, fname in enumerate(generated_files):
-    #         with open(fname, "r") as infile:
-    #             for line in infile:
-    #                 # XML Cleanup Logic
-    #                 if "<?xml" in line or "<routes" in line or "</routes>" in line:
-    #                     continue
-                    
-    #                 # Handle duplicate vType definitions
-    #                 # Only write the vType from the very first file (night.xml)
-    #                 if "<vType" in line and i > 0:
-    #                     continue
-                        
-    #                 outfile.write(line)
-
-    #     outfile.write("</routes>\n")
-
-    # print(f"✅ Success! Combined routes saved to: {final_output}")
-
-    # # 3. Cleanup
-    # print("--- Cleaning up temporary files ---")
-    # for fname in generated_files:
-    #     if os.path.exists(fname):
-    #         os.remove(fname)
-    # print("Cleaned up.")
+    # 2. Merge into one single XML file (windows are in time order, so the result is sorted).
+    # The segments are kept: simulation.sumocfg loads them one by one.
+    merge_routes(generated_files, final_output)
+    print(f"✅ Success! Combined routes saved to: {final_output}")
 
 if __name__ == "__main__":
-    generate_random_cars()
\ No newline at end of file
+    generate_random_cars()
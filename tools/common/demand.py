@@ -0,0 +1,156 @@
+import os
+import hashlib
+import subprocess
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from net_cache import allows
+from xml_writer import XmlWriter, iter_children
+
+# --- CONFIGURATION ---
+WORKERS = os.cpu_count() or 1
+BINOMIAL = 3           # randomTrips --binomial: departures per second ~ Binomial(BINOMIAL, 1 / (period * BINOMIAL))
+MIN_DISTANCE = 200.0   # randomTrips --min-distance (m, straight line)
+MAX_TRIES = 100        # draws per trip before it is given up, as in randomTrips
+
+
+def window_seed(seed, name):
+    """Seed for one time window, derived from the base seed and the window's name.
+
+    Every window gets its own random stream, and it doesn't depend on which
+    worker runs it or in which order, so the output is the same for any
+    number of workers.
+    """
+    return int.from_bytes(hashlib.sha1(f"{seed}:{name}".encode()).digest()[:4], "big") % (2 ** 31)
+
+
+def run_parallel(func, jobs, workers=WORKERS):
+    """Calls func(*args) for every args tuple in jobs in a process pool; results in job order."""
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        futures = {pool.submit(func, *args): i for i, args in enumerate(jobs)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def merge_routes(files, output):
+    """Concatenates route files into one, element by element, in the given order.
+
+    Each vType is written once, where it is first defined. A later vType with
+    the same id but a different definition is an error rather than silently
+    dropped.
+    """
+    vtypes = {}
+    with XmlWriter(output, "routes") as xml:
+        for path in files:
+            _, children = iter_children(path)
+            for elem in children:
+                if elem.tag == "vType":
+                    definition = ET.canonicalize(ET.tostring(elem, encoding="unicode"), strip_text=True)
+                    vtype_id = elem.get("id")
+                    if vtype_id not in vtypes:
+                        vtypes[vtype_id] = definition
+                        xml.write(elem)
+                    elif vtypes[vtype_id] != definition:
+                        raise ValueError(f"{path}: vType {vtype_id!r} differs from its earlier definition")
+                    continue
+                xml.write(elem)
+
+
+class TripGenerator:
+    """In-process randomTrips: candidate edges are selected once, trips are drawn in batches.
+
+    Same semantics as randomTrips.py with --binomial and --min-distance:
+    every edge that allows vclass on some lane is equally likely as origin
+    and as destination, and a pair closer than min_distance is redrawn (up
+    to MAX_TRIES times, then the trip is dropped). Without allow_fringe,
+    origins need an outgoing and destinations an incoming connection.
+    Persons walk edges both ways, so the fringe rule doesn't apply to them.
+    Their distance is also measured differently: from the origin's from-node
+    to the destination's from-node, not to its to-node as for vehicles. This
+    is randomTrips' --persontrips rule (get_trip takes the sink's from-node
+    for pedestrians), kept so the native and randomTrips paths agree; it
+    deviates from the vehicle rule by up to one edge length per trip.
+
+    There is no --validate: trips are not routed here (see validate_trips).
+    """
+
+    def __init__(self, net, vclass="passenger", persons=False, allow_fringe=False):
+        self.vclass = "pedestrian" if persons else vclass
+        self.persons = persons
+        self.edge_ids = net.edge_ids
+        perm_ok = np.array([allows(perm, self.vclass) for perm in net.permissions], dtype=bool)
+        lane_ok = perm_ok[np.asarray(net.lane_perm)].astype(np.int32)
+        edge_ok = np.add.reduceat(lane_ok, np.asarray(net.edge_lanes[:-1])) > 0
+
+        degree = np.asarray(net.edge_degree)
+        fringe_ok = allow_fringe or persons
+        self.sources = np.flatnonzero(edge_ok & (fringe_ok | (degree[:, 1] > 0)))
+        self.sinks = np.flatnonzero(edge_ok & (fringe_ok | (degree[:, 0] > 0)))
+        if not len(self.sources) or not len(self.sinks):
+            raise ValueError(f"No edges allow {self.vclass!r} as trip origin/destination")
+
+        node_xy = np.asarray(net.node_xy)
+        edge_nodes = np.asarray(net.edge_nodes)
+        self.origin_xy = node_xy[edge_nodes[:, 0]]
+        self.dest_xy = node_xy[edge_nodes[:, 0 if persons else 1]]
+
+    def departures(self, rng, begin, end, period, binomial=BINOMIAL):
+        """Sorted departure times in [begin, end); whole seconds if binomial, else every period."""
+        if binomial is None:
+            return np.arange(begin, end, period, dtype=np.float64)
+        seconds = np.arange(begin, end, 1.0)
+        return np.repeat(seconds, rng.binomial(binomial, min(1.0, 1.0 / period / binomial), len(seconds)))
+
+    def sample(self, rng, n, min_distance=MIN_DISTANCE):
+        """(origins, destinations, found) edge indices for n trips; found is False where no pair was far enough."""
+        origins = np.empty(n, dtype=np.int64)
+        destinations = np.empty(n, dtype=np.int64)
+        todo = np.arange(n)
+        for _ in range(MAX_TRIES):
+            origins[todo] = self.sources[rng.integers(len(self.sources), size=len(todo))]
+            destinations[todo] = self.sinks[rng.integers(len(self.sinks), size=len(todo))]
+            delta = self.dest_xy[destinations[todo]] - self.origin_xy[origins[todo]]
+            todo = todo[np.hypot(delta[:, 0], delta[:, 1]) < min_distance]
+            if not len(todo):
+                break
+        found = np.ones(n, dtype=bool)
+        found[todo] = False
+        return origins, destinations, found
+
+    def write(self, path, begin, end, period, prefix, seed, binomial=BINOMIAL, min_distance=MIN_DISTANCE):
+        """Writes one window of trips (or persons) in departure order; returns how many.
+
+        Ids are prefix0, prefix1, ... without gaps, like randomTrips numbers them.
+        """
+        rng = np.random.default_rng(seed)
+        departs = self.departures(rng, begin, end, period, binomial)
+        origins, destinations, found = self.sample(rng, len(departs), min_distance)
+        departs, origins, destinations = departs[found], origins[found], destinations[found]
+
+        edge_ids = self.edge_ids
+        with XmlWriter(path, "routes") as xml:
+            if self.persons:
+                for i, (depart, frm, to) in enumerate(zip(departs.tolist(), origins.tolist(), destinations.tolist())):
+                    xml.start("person", {"id": f"{prefix}{i}", "depart": f"{depart:.2f}"})
+                    xml.element("personTrip", {"from": edge_ids[frm], "to": edge_ids[to]})
+                    xml.end("person")
+            else:
+                vtype = prefix + self.vclass
+                xml.element("vType", {"id": vtype, "vClass": self.vclass})
+                for i, (depart, frm, to) in enumerate(zip(departs.tolist(), origins.tolist(), destinations.tolist())):
+                    xml.element("trip", {"id": f"{prefix}{i}", "depart": f"{depart:.2f}",
+                                         "from": edge_ids[frm], "to": edge_ids[to], "type": vtype})
+        return len(departs)
+
+
+def validate_trips(net_file, path, begin, end):
+    """Drops trips that have no route, in place, like randomTrips --validate (one duarouter run)."""
+    tmp_path = path + ".tmp"
+    subprocess.run(["duarouter", "-n", net_file, "-r", path, "-o", tmp_path, "--ignore-errors",
+                    "--begin", str(begin), "--end", str(end), "--no-step-log", "--no-warnings", "--write-trips"],
+                   check=True, stdout=subprocess.DEVNULL)
+    os.replace(tmp_path, path)
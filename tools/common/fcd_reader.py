@@ -0,0 +1,174 @@
+import re
+import sys
+import time
+
+import numpy as np
+
+# --- CONFIGURATION ---
+BLOCK_SIZE = 8 * 1024 * 1024   # bytes read per I/O call
+SEEK_WINDOW = 64 * 1024        # bytes inspected per bisection step when skipping ahead
+
+# --- PATTERNS ---
+# SUMO writes one <vehicle .../> or <person .../> per line inside each
+# <timestep>, with a fixed attribute order. A whole timestep is matched with
+# one findall instead of building an Element + attrib dict per object; other
+# layouts (e.g. --fcd-output.attributes) take the per-element fallback.
+TIMESTEP_RE = re.compile(rb'<timestep time="([^"]*)"\s*(/?)>')
+TIMESTEP_END = b"</timestep>"
+SUMO_ELEMENT_RE = re.compile(
+    rb'<(vehicle|person) id="([^"]*)" x="([^"]*)" y="([^"]*)" angle="([^"]*)" type="([^"]*)" speed="([^"]*)"'
+)
+FULL_ELEMENT_RE = re.compile(rb'<(vehicle|person)\s([^>]*?)/?>')
+ANY_ATTR_RE = re.compile(rb'([\w:.]+)="([^"]*)"')
+NUMERIC = ("x", "y", "speed", "angle")
+KIND_CODES = {b"vehicle": 0, b"person": 1}   # same order as fcd_store.KINDS
+
+
+def _decode_all(values):
+    if not values:
+        return []
+    return b"\n".join(values).decode("utf-8").split("\n")
+
+
+def _empty_frame():
+    frame = {"id": [], "type": [], "kind": np.empty(0, dtype=np.uint8)}
+    for name in NUMERIC:
+        frame[name] = np.empty(0)
+    return frame
+
+
+def _parse_slow(block):
+    """Per-element fallback for timesteps with missing or extra attributes."""
+    columns = {name: [] for name in ("id", "type", "x", "y", "speed", "angle")}
+    kinds = []
+    for m in FULL_ELEMENT_RE.finditer(block):
+        attrs = dict(ANY_ATTR_RE.findall(m.group(2)))
+        kinds.append(KIND_CODES[m.group(1)])
+        columns["id"].append(attrs[b"id"])
+        columns["type"].append(attrs.get(b"type", b""))
+        for name in NUMERIC:
+            columns[name].append(attrs.get(name.encode(), b"0"))
+    frame = {"id": _decode_all(columns["id"]), "type": _decode_all(columns["type"]),
+             "kind": np.array(kinds, dtype=np.uint8)}
+    for name in NUMERIC:
+        frame[name] = np.array(columns[name], dtype=np.float64)
+    return frame
+
+
+def parse_timestep(block):
+    """Parses the body of one <timestep> into {column: values}.
+
+    id/type are lists of str, kind is uint8 (0 vehicle, 1 person),
+    x/y/speed/angle are float64 arrays; all in document order.
+    """
+    n = block.count(b"/>")
+    if not n:
+        return _empty_frame()
+    matches = SUMO_ELEMENT_RE.findall(block)
+    if len(matches) != n:
+        return _parse_slow(block)
+
+    tags, ids, xs, ys, angles, types, speeds = zip(*matches)
+    frame = {
+        "id": _decode_all(ids),
+        "type": _decode_all(types),
+        "kind": (np.array(tags, dtype="S1") == b"p").astype(np.uint8),
+    }
+    for name, values in zip(NUMERIC, (xs, ys, speeds, angles)):
+        frame[name] = np.array(values, dtype=np.float64)
+    return frame
+
+
+def _next_timestep(f, pos, limit):
+    """(offset, time) of the first <timestep> starting in [pos, limit), or None.
+
+    Reads SEEK_WINDOW at a time; consecutive windows overlap so a tag cut at
+    a window edge is still found.
+    """
+    overlap = 256
+    while pos < limit:
+        f.seek(pos)
+        chunk = f.read(SEEK_WINDOW)
+        m = TIMESTEP_RE.search(chunk)
+        if m is not None:
+            return (pos + m.start(), float(m.group(1))) if pos + m.start() < limit else None
+        if len(chunk) < SEEK_WINDOW:
+            return None
+        pos += SEEK_WINDOW - overlap
+    return None
+
+
+def find_offset(f, begin):
+    """Byte offset at or before the first <timestep> with time >= begin.
+
+    Timesteps are written in time order, so this bisects over the file
+    instead of scanning everything in front of the window. lo is always 0 or
+    a timestep before begin; every timestep at or after hi is >= begin.
+    """
+    f.seek(0, 2)
+    lo, hi = 0, f.tell()
+    while hi - lo > SEEK_WINDOW:
+        mid = (lo + hi) // 2
+        # Look past tag-less stretches (one huge timestep) before deciding
+        found = _next_timestep(f, mid, hi)
+        if found is not None and found[1] < begin:
+            lo = found[0]
+        else:
+            hi = mid
+    return lo
+
+
+def iter_timesteps(path, begin=None, end=None, block_size=BLOCK_SIZE, start=None, stop=None):
+    """Streams an FCD file, yielding (time, frame) per timestep with begin <= time <= end.
+
+    start/stop: optional byte range; start must be a <timestep> boundary
+    (see fcd_shards.timestep_index), timesteps starting at or after stop are left out.
+    """
+    with open(path, "rb") as f:
+        if start is None:
+            start = find_offset(f, begin) if begin is not None else 0
+        f.seek(start)
+        remaining = None if stop is None else stop - start
+        buf = b""
+        while True:
+            size = block_size if remaining is None else min(block_size, remaining)
+            chunk = f.read(size) if size > 0 else b""
+            if remaining is not None:
+                remaining -= len(chunk)
+            buf += chunk
+            pos = 0
+            while True:
+                m = TIMESTEP_RE.search(buf, pos)
+                if m is None:
+                    break
+                if m.group(2):
+                    # <timestep time=".."/> carries no objects
+                    body_start = body_end = pos = m.end()
+                else:
+                    body_start = m.end()
+                    body_end = buf.find(TIMESTEP_END, body_start)
+                    if body_end < 0:
+                        break
+                    pos = body_end + len(TIMESTEP_END)
+
+                t = float(m.group(1))
+                if begin is not None and t < begin:
+                    continue
+                if end is not None and t > end:
+                    return
+                yield t, parse_timestep(buf[body_start:body_end])
+            buf = buf[pos:]
+            if not chunk:
+                return
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python fcd_reader.py <trace.xml> [begin] [end]")
+    bounds = [float(v) for v in sys.argv[2:4]]
+    t0 = time.perf_counter()
+    steps = rows = 0
+    for _, frame in iter_timesteps(sys.argv[1], *bounds):
+        steps += 1
+        rows += len(frame["id"])
+    print(f"{steps} timesteps, {rows} rows in {time.perf_counter() - t0:.2f}s")
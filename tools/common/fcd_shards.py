@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fcd_reader import TIMESTEP_RE, BLOCK_SIZE, iter_timesteps
+
+# --- CONFIGURATION ---
+INDEX_VERSION = 1
+DEFAULT_WORKERS = os.cpu_count() or 1
+SHARDS_PER_WORKER = 4   # smaller shards keep all workers busy until the end
+MAX_SHARD_BYTES = 64 * 1024 * 1024   # bounds the memory one shard result can take
+
+
+def _scan_index(path, block_size=BLOCK_SIZE):
+    times, offsets = [], []
+    with open(path, "rb") as f:
+        base = 0
+        buf = b""
+        while True:
+            chunk = f.read(block_size)
+            buf += chunk
+            pos = 0
+            for m in TIMESTEP_RE.finditer(buf):
+                times.append(float(m.group(1)))
+                offsets.append(base + m.start())
+                pos = m.end()
+            # keep an unfinished tag at the end of the block for the next round
+            tail = max(pos, len(buf) - 64)
+            base += tail
+            buf = buf[tail:]
+            if not chunk:
+                break
+        file_end = base + len(buf)
+    return np.array(times), np.array(offsets + [file_end], dtype=np.int64)
+
+
+def timestep_index(path):
+    """(times, offsets) of every <timestep> in an FCD file.
+
+    offsets has one extra entry (end of file), so timestep i spans
+    offsets[i]:offsets[i + 1]. Cached next to the trace, keyed by size/mtime.
+    """
+    index_file = os.path.splitext(path)[0] + ".tsidx.npz"
+    st = os.stat(path)
+    stamp = np.array([INDEX_VERSION, st.st_size, st.st_mtime_ns], dtype=np.int64)
+    if os.path.exists(index_file):
+        with np.load(index_file) as cached:
+            if np.array_equal(cached["stamp"], stamp):
+                return cached["times"], cached["offsets"]
+    times, offsets = _scan_index(path)
+    np.savez(index_file, stamp=stamp, times=times, offsets=offsets)
+    return times, offsets
+
+
+def make_shards(path, n_shards, begin=None, end=None, max_bytes=MAX_SHARD_BYTES):
+    """Splits [begin, end] into byte ranges of similar size (at least n_shards, ~max_bytes each at most).
+
+    Returns a list of (start, stop) byte offsets, in time order, each
+    covering whole timesteps.
+    """
+    times, offsets = timestep_index(path)
+    lo = 0 if begin is None else int(np.searchsorted(times, begin, side="left"))
+    hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+    if lo >= hi:
+        return []
+
+    n_shards = max(n_shards, -(-int(offsets[hi] - offsets[lo]) // max_bytes))
+    # Cut at the timestep boundaries closest to equal byte splits
+    targets = np.linspace(offsets[lo], offsets[hi], n_shards + 1)
+    cuts = np.searchsorted(offsets[lo:hi + 1], targets) + lo
+    cuts = np.unique(np.clip(cuts, lo, hi))
+    cuts[0], cuts[-1] = lo, hi
+    return [(int(offsets[a]), int(offsets[b])) for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+
+def map_shards(worker, path, args=(), begin=None, end=None, workers=DEFAULT_WORKERS):
+    """Runs worker(path, start, stop, *args) on every shard, yielding results in time order.
+
+    At most 2 * workers shards are in flight, so finished results never pile
+    up faster than the caller consumes them. With workers == 1 the shards run
+    in this process, one after another.
+    """
+    shards = make_shards(path, max(1, workers) * SHARDS_PER_WORKER, begin, end)
+    if workers <= 1:
+        for start, stop in shards:
+            yield worker(path, start, stop, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = deque()
+        for start, stop in shards:
+            queue.append(pool.submit(worker, path, start, stop, *args))
+            if len(queue) >= 2 * workers:
+                yield queue.popleft().result()
+        while queue:
+            yield queue.popleft().result()
+
+
+def _count_rows(path, start, stop):
+    return sum(len(frame["id"]) for _, frame in iter_timesteps(path, start=start, stop=stop))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python fcd_shards.py <trace.xml> [workers]")
+    n_workers = int(sys.argv[2]) if len(sys.argv) == 3 else DEFAULT_WORKERS
+    t0 = time.perf_counter()
+    times, _ = timestep_index(sys.argv[1])
+    print(f"Index: {len(times)} timesteps ({time.perf_counter() - t0:.2f}s)")
+    t0 = time.perf_counter()
+    rows = sum(map_shards(_count_rows, sys.argv[1], workers=n_workers))
+    print(f"{rows} rows with {n_workers} workers ({time.perf_counter() - t0:.2f}s)")
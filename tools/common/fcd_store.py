@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import shutil
+
+import numpy as np
+
+from fcd_reader import iter_timesteps
+
+# --- CONFIGURATION ---
+STORE_VERSION = 1
+CHUNK_SECONDS = 300.0   # one chunk per 5 simulated minutes
+KINDS = ("vehicle", "person")
+
+# name -> dtype of every column in a chunk
+COLUMNS = {
+    "time": np.float64,
+    "id": np.int32,       # index into manifest["ids"]
+    "type": np.int16,     # index into manifest["types"]
+    "kind": np.uint8,     # index into KINDS
+    "x": np.float32,
+    "y": np.float32,
+    "speed": np.float32,
+    "angle": np.float32,
+}
+STAT_COLUMNS = ("time", "x", "y", "speed")
+
+
+class _ChunkWriter:
+    """Accumulates timesteps for one time range and writes them as .npy columns."""
+
+    def __init__(self):
+        self.columns = {name: [] for name in COLUMNS}
+        self.rows = 0
+
+    def add(self, t, frame, id_codes, type_codes):
+        n = len(frame["id"])
+        if not n:
+            return
+        c = self.columns
+        ids = np.empty(n, dtype=COLUMNS["id"])
+        for i, vid in enumerate(frame["id"]):
+            code = id_codes.get(vid)
+            if code is None:
+                code = id_codes[vid] = len(id_codes)
+            ids[i] = code
+        types = np.empty(n, dtype=COLUMNS["type"])
+        for i, vtype in enumerate(frame["type"]):
+            code = type_codes.get(vtype)
+            if code is None:
+                code = type_codes[vtype] = len(type_codes)
+            types[i] = code
+        c["time"].append(np.full(n, t))
+        c["id"].append(ids)
+        c["type"].append(types)
+        for name in ("kind", "x", "y", "speed", "angle"):
+            c[name].append(np.asarray(frame[name], dtype=COLUMNS[name]))
+        self.rows += n
+
+    def __len__(self):
+        return self.rows
+
+    def write(self, path):
+        os.makedirs(path, exist_ok=True)
+        stats = {"rows": len(self)}
+        for name, dtype in COLUMNS.items():
+            arr = np.concatenate(self.columns[name]).astype(dtype, copy=False)
+            np.save(os.path.join(path, name + ".npy"), arr)
+            if name in STAT_COLUMNS and len(arr):
+                stats[name] = [float(arr.min()), float(arr.max())]
+        return stats
+
+
+def ingest(trace_file, store_dir, chunk_seconds=CHUNK_SECONDS, timesteps=None):
+    """Converts an FCD XML file into a chunked columnar store in one streaming pass.
+
+    timesteps: optional iterable of (time, frame) to ingest instead of parsing trace_file.
+    """
+    tmp_dir = store_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    id_codes, type_codes = {}, {}
+    chunks = []
+    writer, chunk_start = _ChunkWriter(), None
+
+    def flush():
+        name = f"chunk_{len(chunks):05d}"
+        stats = writer.write(os.path.join(tmp_dir, name))
+        chunks.append(dict(stats, name=name))
+
+    for t, frame in (timesteps if timesteps is not None else iter_timesteps(trace_file)):
+        if chunk_start is None:
+            chunk_start = t
+        elif t >= chunk_start + chunk_seconds:
+            if len(writer):
+                flush()
+            writer, chunk_start = _ChunkWriter(), t
+        writer.add(t, frame, id_codes, type_codes)
+    if len(writer):
+        flush()
+
+    st = os.stat(trace_file)
+    manifest = {
+        "version": STORE_VERSION,
+        "source": {"file": os.path.abspath(trace_file), "size": st.st_size, "mtime_ns": st.st_mtime_ns},
+        "chunk_seconds": chunk_seconds,
+        "columns": {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+        "chunks": chunks,
+        "ids": list(id_codes),
+        "types": list(type_codes),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.replace(tmp_dir, store_dir)
+    return FcdStore(store_dir)
+
+
+class FcdStore:
+    """Read side of the columnar FCD store. Columns are memory-mapped per chunk."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.chunks = self.manifest["chunks"]
+        self.ids = self.manifest["ids"]
+        self.types = self.manifest["types"]
+
+    def is_current(self, trace_file):
+        """True if the store was built from the current version of trace_file."""
+        src = self.manifest["source"]
+        st = os.stat(trace_file)
+        return (self.manifest["version"] == STORE_VERSION and src["size"] == st.st_size
+                and src["mtime_ns"] == st.st_mtime_ns)
+
+    @property
+    def time_range(self):
+        if not self.chunks:
+            return None
+        return self.chunks[0]["time"][0], self.chunks[-1]["time"][1]
+
+    def _chunks_in(self, begin, end):
+        for chunk in self.chunks:
+            t_min, t_max = chunk["time"]
+            if (begin is None or t_max >= begin) and (end is None or t_min <= end):
+                yield chunk
+
+    def _load(self, chunk, name):
+        return np.load(os.path.join(self.store_dir, chunk["name"], name + ".npy"), mmap_mode="r")
+
+    def read(self, begin=None, end=None, columns=("time", "id", "x", "y")):
+        """All rows with begin <= time <= end, as {column: array}.
+
+        Only the chunks overlapping the window and the requested columns are touched.
+        """
+        parts = {name: [] for name in columns}
+        for chunk in self._chunks_in(begin, end):
+            t = self._load(chunk, "time")
+            lo = 0 if begin is None else np.searchsorted(t, begin, side="left")
+            hi = len(t) if end is None else np.searchsorted(t, end, side="right")
+            for name in columns:
+                parts[name].append(self._load(chunk, name)[lo:hi])
+        return {
+            name: (np.concatenate(arrs) if arrs else np.empty(0, dtype=COLUMNS[name]))
+            for name, arrs in parts.items()
+        }
+
+    def iter_timesteps(self, begin=None, end=None, columns=("id", "type", "kind", "x", "y")):
+        """Yields (time, {column: array}) per timestep, in time order."""
+        for chunk in self._chunks_in(begin, end):
+            t = np.asarray(self._load(chunk, "time"))
+            cols = {name: self._load(chunk, name) for name in columns}
+            # Rows are grouped by timestep, so each timestep is one contiguous slice
+            bounds = np.flatnonzero(np.diff(t)) + 1
+            starts = np.concatenate(([0], bounds))
+            stops = np.concatenate((bounds, [len(t)]))
+            for lo, hi in zip(starts.tolist(), stops.tolist()):
+                step_time = float(t[lo])
+                if begin is not None and step_time < begin:
+                    continue
+                if end is not None and step_time > end:
+                    return
+                yield step_time, {name: np.asarray(arr[lo:hi]) for name, arr in cols.items()}
+
+
+def store_dir_for(trace_file):
+    return os.path.splitext(trace_file)[0] + "_store"
+
+
+def existing_store(trace_file, store_dir=None):
+    """The store next to trace_file if it is already built and current, else None."""
+    if store_dir is None:
+        store_dir = store_dir_for(trace_file)
+    if os.path.exists(os.path.join(store_dir, "manifest.json")):
+        store = FcdStore(store_dir)
+        if store.is_current(trace_file):
+            return store
+    return None
+
+
+def open_store(trace_file, store_dir=None):
+    """Opens the store next to trace_file, (re)building it if it is missing or stale."""
+    if store_dir is None:
+        store_dir = store_dir_for(trace_file)
+    store = existing_store(trace_file, store_dir)
+    if store is not None:
+        return store
+    print(f"   Ingesting {trace_file} into columnar store {store_dir} (one-time)...")
+    return ingest(trace_file, store_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python fcd_store.py <trace.xml> [store_dir]")
+    t0 = time.perf_counter()
+    store = open_store(*sys.argv[1:])
+    rows = sum(c["rows"] for c in store.chunks)
+    print(f"{rows} rows in {len(store.chunks)} chunks, {len(store.ids)} ids "
+          f"({time.perf_counter() - t0:.2f}s)")
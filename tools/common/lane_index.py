@@ -0,0 +1,148 @@
+import numpy as np
+
+# --- CONFIGURATION ---
+CELL_M = 50.0   # grid cell size; about the usual search radius
+
+
+def _ranges(counts):
+    """(owner, k) for a concatenation of arange(count) blocks: owner is the block, k the index inside it."""
+    counts = np.asarray(counts, dtype=np.int64)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return owner, np.arange(counts.sum()) - first[owner]
+
+
+class LaneSegmentIndex:
+    """Uniform grid over the shape segments of some lanes of a CachedNet, for batch queries.
+
+    Every segment is registered in each cell its bounding box touches. A query
+    collects the segments of all cells within r of each point and computes
+    the point-to-segment distances in one vectorized pass.
+    """
+
+    def __init__(self, net, lanes=None, cell=CELL_M):
+        self.net = net
+        self.cell = cell
+        lanes = np.arange(len(net.lane_ids)) if lanes is None else np.asarray(lanes, dtype=np.int64)
+        offsets = np.asarray(net.lane_shape)
+        shape = np.asarray(net.shape_xy)
+
+        # Segments of the indexed lanes, lane by lane in shape order
+        n_seg = np.maximum(offsets[lanes + 1] - offsets[lanes] - 1, 0)
+        owner, k = _ranges(n_seg)
+        first = offsets[lanes][owner] + k
+        self.seg_lane = lanes[owner]
+        self.seg_a = shape[first]
+        self.seg_b = shape[first + 1]
+
+        # Grid over the segments' extent
+        lo = np.minimum(self.seg_a, self.seg_b)
+        hi = np.maximum(self.seg_a, self.seg_b)
+        self.origin = lo.min(axis=0) if len(lo) else np.zeros(2)
+        extent = (hi.max(axis=0) if len(hi) else np.zeros(2)) - self.origin
+        self.shape = (extent // cell).astype(np.int64) + 1
+        c0 = ((lo - self.origin) // cell).astype(np.int64)
+        c1 = ((hi - self.origin) // cell).astype(np.int64)
+        span = c1 - c0 + 1
+        seg, k = _ranges(span[:, 0] * span[:, 1])
+        cells = (c0[seg, 0] + k // span[seg, 1]) * self.shape[1] + c0[seg, 1] + k % span[seg, 1]
+
+        # CSR: segments of cell c are cell_segs[cell_start[c]:cell_start[c + 1]]
+        order = np.argsort(cells, kind="stable")
+        self.cell_segs = seg[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def _candidates(self, xs, ys, r):
+        """(point, segment) pairs for every segment in a cell within r of the point."""
+        p = np.column_stack((xs, ys))
+        c0 = np.floor((p - r - self.origin) / self.cell).astype(np.int64)
+        c1 = np.floor((p + r - self.origin) / self.cell).astype(np.int64)
+        inside = ((c1 >= 0) & (c0 < self.shape)).all(axis=1)
+        c0 = np.clip(c0, 0, self.shape - 1)
+        c1 = np.clip(c1, 0, self.shape - 1)
+        span = np.where(inside[:, None], c1 - c0 + 1, 0)
+
+        pt, k = _ranges(span[:, 0] * span[:, 1])
+        cells = (c0[pt, 0] + k // span[pt, 1]) * self.shape[1] + c0[pt, 1] + k % span[pt, 1]
+        start = self.cell_start[cells]
+        owner, k = _ranges(self.cell_start[cells + 1] - start)
+        return pt[owner], self.cell_segs[start[owner] + k]
+
+    def nearest(self, xs, ys, r):
+        """Closest indexed lane within r of each point, as (lanes, distances).
+
+        Same result as picking the minimum from net.getNeighboringLanes(x, y, r,
+        includeJunctions=False): distances match point_to_polyline bit for bit
+        and ties go to the lower lane index. Points without a lane get -1 / inf.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        lanes = np.full(len(xs), -1, dtype=np.int64)
+        dists = np.full(len(xs), np.inf)
+        pt, seg = self._candidates(xs, ys, r)
+        if not len(pt):
+            return lanes, dists
+
+        # Same arithmetic as net_cache.point_to_polyline, one row per pair
+        a, b = self.seg_a[seg], self.seg_b[seg]
+        ab = b - a
+        x, y = xs[pt], ys[pt]
+        length_sq = (ab ** 2).sum(axis=1)
+        t = np.where(length_sq > 0, ((x - a[:, 0]) * ab[:, 0] + (y - a[:, 1]) * ab[:, 1])
+                     / np.where(length_sq > 0, length_sq, 1), 0)
+        t = np.clip(t, 0, 1)
+        dx = a[:, 0] + t * ab[:, 0] - x
+        dy = a[:, 1] + t * ab[:, 1] - y
+        d = np.sqrt(dx * dx + dy * dy)
+
+        keep = d < r
+        pt, lane, d = pt[keep], self.seg_lane[seg[keep]], d[keep]
+        order = np.lexsort((lane, d, pt))
+        best = order[np.r_[True, pt[order][1:] != pt[order][:-1]]] if len(order) else order
+        lanes[pt[best]] = lane[best]
+        dists[pt[best]] = d[best]
+        return lanes, dists
+
+    def offsets(self, xs, ys, lanes):
+        """Position along each lane of its point's closest shape point.
+
+        Same result as sumolib.geomhelper.polygonOffsetAndDistanceToPoint((x, y),
+        lane.getShape())[0]. Points with lane -1 get nan.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        lanes = np.asarray(lanes, dtype=np.int64)
+        result = np.full(len(xs), np.nan)
+        rows = np.flatnonzero(lanes >= 0)
+        if not len(rows):
+            return result
+        offsets = np.asarray(self.net.lane_shape)
+        shape = np.asarray(self.net.shape_xy)
+        first = offsets[lanes[rows]]
+        owner, k = _ranges(np.maximum(offsets[lanes[rows] + 1] - first - 1, 0))
+        s0, s1 = shape[first[owner] + k], shape[first[owner] + k + 1]
+        px, py = xs[rows][owner], ys[rows][owner]
+
+        # geomhelper.lineOffsetWithMinimumDistanceToPoint / positionAtOffset / distance
+        ex, ey = s0[:, 0] - s1[:, 0], s0[:, 1] - s1[:, 1]
+        seg_len = np.sqrt(ex * ex + ey * ey)
+        u = (px - s0[:, 0]) * (s1[:, 0] - s0[:, 0]) + (py - s0[:, 1]) * (s1[:, 1] - s0[:, 1])
+        clamped = (seg_len == 0.) | (u < 0.) | (u > seg_len * seg_len)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pos = np.where(clamped, np.where(u < 0., 0., seg_len), u / seg_len)
+            frac = pos / seg_len
+        at_start = pos == 0.
+        at_end = ~at_start & (np.abs(seg_len - pos) <= 1e-09 * np.maximum(seg_len, pos))
+        qx = np.where(at_start, s0[:, 0], np.where(at_end, s1[:, 0], s0[:, 0] + (s1[:, 0] - s0[:, 0]) * frac))
+        qy = np.where(at_start, s0[:, 1], np.where(at_end, s1[:, 1], s0[:, 1] + (s1[:, 1] - s0[:, 1]) * frac))
+        dx, dy = px - qx, py - qy
+        d = np.sqrt(dx * dx + dy * dy)
+
+        # First segment with the smallest distance; lane length before it summed in shape order
+        order = np.lexsort((k, d, owner))
+        best = order[np.r_[True, owner[order][1:] != owner[order][:-1]]]
+        bounds = np.r_[0, np.cumsum(np.bincount(owner, minlength=len(rows)))]
+        for i, j in zip(owner[best].tolist(), best.tolist()):
+            seen = np.cumsum(seg_len[bounds[i]:j])[-1] if j > bounds[i] else 0.
+            result[rows[i]] = pos[j] + seen
+        return result
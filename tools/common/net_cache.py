@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from projection import NetProjection
+
+# --- CONFIGURATION ---
+CACHE_VERSION = 1
+CACHE_DIR_NAME = ".net_cache"   # created next to the net file
+HASH_CHUNK = 1 << 20
+
+ARRAYS = (
+    "node_xy",            # float64 [nodes, 2]
+    "edge_nodes",         # int32   [edges, 2]  from/to node index
+    "edge_degree",        # int32   [edges, 2]  number of distinct incoming/outgoing edges
+    "edge_lanes",         # int32   [edges + 1] lane offsets (lanes of edge e: edge_lanes[e]:edge_lanes[e+1])
+    "lane_edge",          # int32   [lanes]
+    "lane_length",        # float64 [lanes]
+    "lane_perm",          # int32   [lanes]     index into meta["permissions"]
+    "lane_bus",           # bool    [lanes]
+    "lane_bbox",          # float64 [lanes, 4]  xmin, ymin, xmax, ymax of the lane shape
+    "lane_shape",         # int64   [lanes + 1] offsets into shape_xy
+    "shape_xy",           # float64 [points, 2]
+)
+
+
+def file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def allows(permission, vclass):
+    """SUMO lane permission check for an (allow, disallow) pair of strings/None."""
+    allow, disallow = permission
+    if allow is not None:
+        classes = allow.split()
+        return "all" in classes or vclass in classes
+    if disallow is not None:
+        classes = disallow.split()
+        return "all" not in classes and vclass not in classes
+    return True
+
+
+# ---------------------------------------------------------
+# BUILD
+# ---------------------------------------------------------
+def build_cache(net_file, cache_path):
+    """Streams the net XML once and writes the array-backed cache to cache_path."""
+    location = None
+    node_ids, node_xy = [], []
+    edge_ids, edge_from, edge_to, edge_lanes = [], [], [], [0]
+    lane_ids, lane_edge, lane_length, lane_perm = [], [], [], []
+    shape_xy, lane_shape = [], [0]
+    permissions, perm_index = [], {}
+    connections = set()
+
+    current_edge = None  # index of the (non-internal) edge whose lanes we're reading
+    depth = 1            # so top-level elements can be dropped once read
+    context = ET.iterparse(net_file, events=("start", "end"))
+    _, root = next(context)
+
+    for event, elem in context:
+        tag = elem.tag
+        if event == "start":
+            depth += 1
+            if tag == "edge":
+                if elem.get("function") == "internal":
+                    current_edge = None
+                else:
+                    current_edge = len(edge_ids)
+                    edge_ids.append(elem.get("id"))
+                    edge_from.append(elem.get("from"))
+                    edge_to.append(elem.get("to"))
+            continue
+
+        depth -= 1
+        if tag == "lane" and current_edge is not None:
+            perm = (elem.get("allow"), elem.get("disallow"))
+            if perm not in perm_index:
+                perm_index[perm] = len(permissions)
+                permissions.append(perm)
+            lane_ids.append(elem.get("id"))
+            lane_edge.append(current_edge)
+            lane_length.append(float(elem.get("length")))
+            lane_perm.append(perm_index[perm])
+            for point in elem.get("shape").split():
+                x, y = point.split(",")[:2]
+                shape_xy.append((float(x), float(y)))
+            lane_shape.append(len(shape_xy))
+        elif tag == "edge":
+            if current_edge is not None:
+                edge_lanes.append(len(lane_ids))
+            current_edge = None
+        elif tag == "junction":
+            node_ids.append(elem.get("id"))
+            node_xy.append((float(elem.get("x")), float(elem.get("y"))))
+        elif tag == "connection":
+            src, dst = elem.get("from"), elem.get("to")
+            if not src.startswith(":") and not dst.startswith(":"):
+                connections.add((src, dst))
+        elif tag == "location":
+            location = dict(elem.attrib)
+
+        if depth == 1:
+            root.clear()
+
+    if location is None:
+        raise ValueError(f"No <location> element found in {net_file}")
+
+    # Edge topology
+    node_index = {nid: i for i, nid in enumerate(node_ids)}
+    edge_index = {eid: i for i, eid in enumerate(edge_ids)}
+    edge_nodes = np.array([(node_index[f], node_index[t]) for f, t in zip(edge_from, edge_to)],
+                          dtype=np.int32).reshape(-1, 2)
+    edge_degree = np.zeros((len(edge_ids), 2), dtype=np.int32)
+    for src, dst in connections:
+        if src in edge_index and dst in edge_index:
+            edge_degree[edge_index[dst], 0] += 1
+            edge_degree[edge_index[src], 1] += 1
+
+    # Lane geometry
+    shape = np.array(shape_xy, dtype=np.float64).reshape(-1, 2)
+    offsets = np.array(lane_shape, dtype=np.int64)
+    starts = offsets[:-1]
+    bbox = np.empty((len(lane_ids), 4))
+    if len(lane_ids):
+        bbox[:, 0] = np.minimum.reduceat(shape[:, 0], starts)
+        bbox[:, 1] = np.minimum.reduceat(shape[:, 1], starts)
+        bbox[:, 2] = np.maximum.reduceat(shape[:, 0], starts)
+        bbox[:, 3] = np.maximum.reduceat(shape[:, 1], starts)
+
+    arrays = {
+        "node_xy": np.array(node_xy, dtype=np.float64).reshape(-1, 2),
+        "edge_nodes": edge_nodes,
+        "edge_degree": edge_degree,
+        "edge_lanes": np.array(edge_lanes, dtype=np.int32),
+        "lane_edge": np.array(lane_edge, dtype=np.int32),
+        "lane_length": np.array(lane_length, dtype=np.float64),
+        "lane_perm": np.array(lane_perm, dtype=np.int32),
+        "lane_bus": np.array([allows(permissions[p], "bus") for p in lane_perm], dtype=bool),
+        "lane_bbox": bbox,
+        "lane_shape": offsets,
+        "shape_xy": shape,
+    }
+    meta = {
+        "version": CACHE_VERSION,
+        "location": location,
+        "node_ids": node_ids,
+        "edge_ids": edge_ids,
+        "lane_ids": lane_ids,
+        "permissions": permissions,
+    }
+
+    # Write into a temp dir and rename, so a crashed build never looks valid
+    tmp_path = cache_path + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp_path, name + ".npy"), arrays[name])
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, cache_path)
+
+
+# ---------------------------------------------------------
+# LOAD
+# ---------------------------------------------------------
+class CachedLane:
+    """Lightweight lane handle with the sumolib Lane methods the tools use."""
+
+    __slots__ = ("net", "index")
+
+    def __init__(self, net, index):
+        self.net = net
+        self.index = index
+
+    def getID(self):
+        return self.net.lane_ids[self.index]
+
+    def getLength(self):
+        return float(self.net.lane_length[self.index])
+
+    def getEdgeID(self):
+        return self.net.edge_ids[self.net.lane_edge[self.index]]
+
+    def getShape(self, includeJunctions=False):
+        return [tuple(p) for p in self.net.lane_shape_xy(self.index, includeJunctions).tolist()]
+
+    def allows(self, vclass):
+        return allows(self.net.permissions[self.net.lane_perm[self.index]], vclass)
+
+    def __repr__(self):
+        return f"<CachedLane {self.getID()}>"
+
+
+class CachedNet:
+    """Memory-mapped network model loaded from the cache (see load_net)."""
+
+    def __init__(self, cache_path):
+        with open(os.path.join(cache_path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(cache_path, name + ".npy"), mmap_mode="r"))
+
+        self.location = meta["location"]
+        self.node_ids = meta["node_ids"]
+        self.edge_ids = meta["edge_ids"]
+        self.lane_ids = meta["lane_ids"]
+        self.permissions = [tuple(p) for p in meta["permissions"]]
+        self._lane_index = None
+        self._bbox_with_junctions = None
+        self.projection = NetProjection.from_location(self.location)
+
+    # --- Geo ---
+    def getBoundary(self):
+        return list(self.projection.conv_boundary)
+
+    def convertXY2LonLat(self, x, y):
+        lon, lat = self.projection.xy_to_lonlat(x, y)
+        return float(lon), float(lat)
+
+    def convertLonLat2XY(self, lon, lat):
+        x, y = self.projection.lonlat_to_xy(lon, lat)
+        return float(x), float(y)
+
+    # --- Lanes ---
+    def getLane(self, lane_id):
+        if self._lane_index is None:
+            self._lane_index = {lid: i for i, lid in enumerate(self.lane_ids)}
+        return CachedLane(self, self._lane_index[lane_id])
+
+    def lane_shape_xy(self, lane, includeJunctions=False):
+        shape = np.asarray(self.shape_xy[self.lane_shape[lane]:self.lane_shape[lane + 1]])
+        if includeJunctions:
+            frm, to = self.edge_nodes[self.lane_edge[lane]]
+            start, end = self.node_xy[frm], self.node_xy[to]
+            if not np.array_equal(shape[0], start):
+                shape = np.vstack((start, shape))
+            if not np.array_equal(shape[-1], end):
+                shape = np.vstack((shape, end))
+        return shape
+
+    def _lane_bbox_with_junctions(self):
+        # Junction points can extend a lane's shape beyond its own bbox
+        if self._bbox_with_junctions is None:
+            nodes = self.edge_nodes[self.lane_edge]
+            start, end = self.node_xy[nodes[:, 0]], self.node_xy[nodes[:, 1]]
+            bbox = np.array(self.lane_bbox)
+            bbox[:, 0:2] = np.minimum(bbox[:, 0:2], np.minimum(start, end))
+            bbox[:, 2:4] = np.maximum(bbox[:, 2:4], np.maximum(start, end))
+            self._bbox_with_junctions = bbox
+        return self._bbox_with_junctions
+
+    def getNeighboringLanes(self, x, y, r=0.1, includeJunctions=True):
+        """Lanes within r of (x, y), as [(lane, distance)] like sumolib."""
+        bbox = self._lane_bbox_with_junctions() if includeJunctions else self.lane_bbox
+        candidates = np.nonzero((bbox[:, 0] <= x + r) & (bbox[:, 2] >= x - r) &
+                                (bbox[:, 1] <= y + r) & (bbox[:, 3] >= y - r))[0]
+        result = []
+        for lane in candidates.tolist():
+            d = point_to_polyline(x, y, self.lane_shape_xy(lane, includeJunctions))
+            if d < r:
+                result.append((CachedLane(self, lane), d))
+        return result
+
+
+def point_to_polyline(x, y, shape):
+    """Minimum distance from a point to a polyline (segment ends clamped)."""
+    a = shape[:-1]
+    b = shape[1:]
+    ab = b - a
+    length_sq = (ab ** 2).sum(axis=1)
+    t = np.where(length_sq > 0, ((x - a[:, 0]) * ab[:, 0] + (y - a[:, 1]) * ab[:, 1]) / np.where(length_sq > 0, length_sq, 1), 0)
+    t = np.clip(t, 0, 1)
+    dx = a[:, 0] + t * ab[:, 0] - x
+    dy = a[:, 1] + t * ab[:, 1] - y
+    return float(np.sqrt(dx * dx + dy * dy).min())
+
+
+def cached_file_hash(path, stamp_dir):
+    """SHA-1 of a file, only recomputed when its size or mtime changed.
+
+    The last hash is kept in stamp_dir/<basename>.stamp.json.
+    """
+    stamp_file = os.path.join(stamp_dir, os.path.basename(path) + ".stamp.json")
+    st = os.stat(path)
+    if os.path.exists(stamp_file):
+        with open(stamp_file, encoding="utf-8") as f:
+            stamp = json.load(f)
+        if stamp.get("size") == st.st_size and stamp.get("mtime_ns") == st.st_mtime_ns:
+            return stamp["sha1"]
+    digest = file_hash(path)
+    os.makedirs(stamp_dir, exist_ok=True)
+    with open(stamp_file, "w", encoding="utf-8") as f:
+        json.dump({"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": digest}, f)
+    return digest
+
+
+def cache_path_for(net_file):
+    """Returns the cache directory for the current content of net_file."""
+    net_file = os.path.abspath(net_file)
+    root = os.path.join(os.path.dirname(net_file), CACHE_DIR_NAME)
+    digest = cached_file_hash(net_file, root)
+    return os.path.join(root, f"{os.path.basename(net_file)}.v{CACHE_VERSION}.{digest[:16]}")
+
+
+def load_net(net_file):
+    """Loads the cached network model, building the cache first if needed."""
+    path = cache_path_for(net_file)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        print(f"Building network cache for {net_file} (one-time)...")
+        build_cache(net_file, path)
+    return CachedNet(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python net_cache.py <net.xml>")
+    t0 = time.perf_counter()
+    net = load_net(sys.argv[1])
+    print(f"Loaded {len(net.edge_ids)} edges / {len(net.lane_ids)} lanes in {time.perf_counter() - t0:.3f}s")
@@ -0,0 +1,93 @@
+import functools
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def _get_proj(proj_parameter):
+    """One pyproj.Proj per projection string, shared by every NetProjection."""
+    import pyproj
+    return pyproj.Proj(projparams=proj_parameter)
+
+
+def read_location(net_file):
+    """Reads the <location> element of a SUMO net without parsing the rest of the file.
+
+    Returns a dict with netOffset, convBoundary, origBoundary and projParameter (as strings).
+    """
+    for _, elem in ET.iterparse(net_file, events=("end",)):
+        if elem.tag == "location":
+            return dict(elem.attrib)
+    raise ValueError(f"No <location> element found in {net_file}")
+
+
+class NetProjection:
+    """SUMO network XY <-> WGS84 lon/lat conversion for whole arrays at once.
+
+    Does the same math as sumolib's net.convertXY2LonLat / convertLonLat2XY
+    (remove the net offset, then the inverse projection), but takes NumPy arrays
+    so a whole frame is converted with a single pyproj call.
+    """
+
+    def __init__(self, net_offset, proj_parameter, conv_boundary=None, proj=None):
+        self.offset_x, self.offset_y = (float(v) for v in net_offset)
+        self.proj_parameter = proj_parameter
+        self.conv_boundary = conv_boundary
+        self._proj = proj
+
+    @classmethod
+    def from_location(cls, location):
+        """Builds the projection from a <location> attribute dict (see read_location)."""
+        offset = [float(v) for v in location["netOffset"].split(",")]
+        boundary = None
+        if location.get("convBoundary"):
+            boundary = [float(v) for v in location["convBoundary"].split(",")]
+        return cls(offset, location["projParameter"], boundary)
+
+    @classmethod
+    def from_net_file(cls, net_file):
+        return cls.from_location(read_location(net_file))
+
+    @classmethod
+    def from_sumolib(cls, net):
+        """Reuses the offset and Proj object of an already loaded sumolib net."""
+        boundary = list(net.getBoundary())
+        return cls(net.getLocationOffset(), None, boundary, proj=net.getGeoProj())
+
+    @property
+    def proj(self):
+        if self._proj is None:
+            self._proj = _get_proj(self.proj_parameter)
+        return self._proj
+
+    def xy_to_lonlat(self, x, y):
+        """Converts SUMO x/y (scalars or arrays) to (lon, lat)."""
+        x = np.asarray(x, dtype=np.float64) - self.offset_x
+        y = np.asarray(y, dtype=np.float64) - self.offset_y
+        if self.proj_parameter == "!" or x.size == 0:
+            # Net without geo-reference (coordinates are already "raw") or empty frame
+            return x, y
+        return self.proj(x, y, inverse=True)
+
+    def lonlat_to_xy(self, lon, lat):
+        """Converts lon/lat (scalars or arrays) to SUMO x/y."""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        if self.proj_parameter == "!":
+            x, y = lon, lat
+        else:
+            x, y = self.proj(lon, lat)
+        return np.asarray(x) + self.offset_x, np.asarray(y) + self.offset_y
+
+    def center_lonlat(self):
+        """(lon, lat) of the middle of the network's boundary."""
+        x0, y0, x1, y1 = self.conv_boundary
+        lon, lat = self.xy_to_lonlat((x0 + x1) / 2, (y0 + y1) / 2)
+        return float(lon), float(lat)
+
+
+@functools.lru_cache(maxsize=None)
+def get_projection(net_file):
+    """Cached NetProjection for a net file (only the <location> header is read)."""
+    return NetProjection.from_net_file(net_file)
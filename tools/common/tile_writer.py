@@ -0,0 +1,494 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+from trajectory import TrajectorySimplifier
+
+# --- CONFIGURATION ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+VEHICLE_LAYER_JS = os.path.join(PROJECT_ROOT, "app", "static", "vehicle_layer.js")
+
+BUCKET_SECONDS = 300   # one set of tile files per 5 simulated minutes
+TILE_ZOOM = 14         # slippy-map zoom of the data tiles (~2.4 km at Heilbronn)
+COORD_DECIMALS = 6
+EARTH_RADIUS = 6371008.8   # m, for the local metric the track tolerance is checked in
+
+# Level of detail: below POINT_ZOOM the viewer draws per-cell density instead of points
+POINT_ZOOM = 15
+DENSITY_ZOOMS = (15, 17)   # cell sizes of the pyramid (~800 m and ~200 m at Heilbronn)
+DENSITY_SECONDS = 60       # time resolution of the density cells
+
+# --- FORMAT ---
+# out_dir/
+#   index.html        viewer
+#   index.js          TileIndex = {palette, buckets: {bucket: [[x, y], ...]}, ...}
+#   vehicle_layer.js  copy of the dashboard renderer
+#   data/<bucket>/<x>_<y>.js
+#       TileData.load("<bucket>/<x>_<y>", {t, n, ids, i, lon, lat, s})
+#       t/n: frame times and point count per frame; i: index into ids;
+#       s: index into the palette. Rows are grouped by frame, in time order.
+#   or, with a track tolerance:
+#       TileData.load("<bucket>/<x>_<y>", {ids, i, s, t, d, lon, lat, dlon, dlat})
+#       one row per track segment starting in the tile, sorted by t: the object
+#       moves linearly from (lon, lat) at t to (lon + dlon, lat + dlat) at t + d.
+#       Dwells have dlon = dlat = 0. Segments ending in the next bucket are
+#       stored there.
+#   data/<bucket>/density.js
+#       TileData.load("<bucket>/density", {slice, levels: {z: {k, x, y, c, v}}})
+#       one row per occupied cell of slippy zoom z and DENSITY_SECONDS slice k
+#       of the bucket: c = mean objects per frame, v = mean speed (m/s).
+#       Rows are sorted by k.
+# Data files are plain scripts so the viewer also works from file://.
+
+
+def lonlat_to_tile(lons, lats, zoom=TILE_ZOOM):
+    """Vectorized slippy-map tile numbers."""
+    n = 2 ** zoom
+    lat_rad = np.radians(lats)
+    tx = np.floor((np.asarray(lons) + 180.0) / 360.0 * n).astype(np.int64)
+    ty = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(tx, 0, n - 1), np.clip(ty, 0, n - 1)
+
+
+class TileWriter:
+    """Writes time-bucketed, spatially tiled point data plus a viewer.
+
+    Each bucket also gets a density pyramid (per-cell counts and mean speed at
+    DENSITY_ZOOMS), which the viewer draws instead of points when zoomed out.
+    With a tolerance (m), point tiles hold simplified track segments instead
+    of every sample; the viewer interpolates between their keyframes.
+    Frames must be added in time order. Only the current bucket is held in
+    memory, so memory stays bounded however long the trace is.
+    """
+
+    def __init__(self, out_dir, palette, center, title="Trace", start_date=None, period=1,
+                 bucket_seconds=BUCKET_SECONDS, zoom=TILE_ZOOM, density_zooms=DENSITY_ZOOMS,
+                 density_seconds=DENSITY_SECONDS, point_zoom=POINT_ZOOM, tolerance=None):
+        self.out_dir = out_dir
+        self.palette = palette       # [[color, radius, opacity], ...] indexed by style code
+        self.center = center         # (lat, lon)
+        self.title = title
+        self.start_date = start_date
+        self.period = period         # seconds between frames, for the viewer's slider
+        self.bucket_seconds = bucket_seconds
+        self.zoom = zoom
+        self.density_zooms = density_zooms
+        self.density_seconds = density_seconds
+        self.point_zoom = point_zoom
+        self.buckets = {}            # {bucket: [[x, y], ...]} written so far
+        self.t_min = None
+        self.t_max = None
+        self.points = 0
+        self.segments = 0
+        self.tracks = TrajectorySimplifier(tolerance) if tolerance else None
+        self._segment_parts = []     # closed track segments of the current bucket
+        self._bucket = None
+        self._parts = []             # per-frame column tuples of the current bucket
+        # frames per density slice of the current bucket, to turn counts into means
+        self._slice_frames = np.zeros(-(-bucket_seconds // density_seconds), dtype=np.int64)
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.makedirs(os.path.join(out_dir, "data"))
+
+    def add(self, t, ids, lons, lats, styles, speeds):
+        """Adds one frame: per-point ids (str), lon/lat (degrees), palette indices and speeds (m/s)."""
+        bucket = int(t // self.bucket_seconds)
+        if bucket != self._bucket:
+            if self.tracks:
+                self._add_segments(self.tracks.cut())
+            self._flush()
+            self._bucket = bucket
+            self._slice_frames[:] = 0
+        self._slice_frames[int((t - bucket * self.bucket_seconds) // self.density_seconds)] += 1
+        if self.t_min is None:
+            self.t_min = t
+        self.t_max = t
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        if self.tracks:
+            # Also ends the tracks of objects missing from this frame
+            self._add_segments(self.tracks.add(t, ids, *self._to_meters(lons, lats), styles))
+        if not len(ids):
+            return
+        tx, ty = lonlat_to_tile(lons, lats, self.zoom)
+        self._parts.append((np.full(len(lons), t), tx, ty, np.asarray(ids, dtype=object), lons, lats,
+                            np.asarray(styles, dtype=np.uint8), np.asarray(speeds, dtype=np.float32)))
+        self.points += len(lons)
+
+    def _to_meters(self, lons, lats):
+        lat0, lon0 = self.center
+        k = np.radians(1.0) * EARTH_RADIUS
+        return (lons - lon0) * k * np.cos(np.radians(lat0)), (lats - lat0) * k
+
+    def _to_lonlat(self, xs, ys):
+        lat0, lon0 = self.center
+        k = np.radians(1.0) * EARTH_RADIUS
+        return xs / (k * np.cos(np.radians(lat0))) + lon0, ys / k + lat0
+
+    def _add_segments(self, segments):
+        if segments is not None:
+            self._segment_parts.append(segments)
+            self.segments += len(segments["t0"])
+
+    def _flush(self):
+        segments, self._segment_parts = self._segment_parts, []
+        if not self._parts and not segments:
+            return
+        bucket_dir = os.path.join(self.out_dir, "data", str(self._bucket))
+        os.makedirs(bucket_dir, exist_ok=True)
+        tiles = []
+        if self._parts:
+            t, tx, ty, ids, lons, lats, styles, speeds = (np.concatenate(cols) for cols in zip(*self._parts))
+            self._parts = []
+            self._write(bucket_dir, "density", self._density(t, lons, lats, speeds))
+            if not self.tracks:
+                tiles = self._write_points(bucket_dir, t, tx, ty, ids, lons, lats, styles)
+        if segments:
+            tiles = self._write_segments(bucket_dir, {name: np.concatenate([s[name] for s in segments])
+                                                      for name in segments[0]})
+        self.buckets[self._bucket] = tiles
+
+    def _write_points(self, bucket_dir, t, tx, ty, ids, lons, lats, styles):
+        tiles = []
+
+        # Group rows by tile; the stable sort keeps each tile's rows in time order
+        order = np.lexsort((ty, tx))
+        keys = tx[order] * (1 << 32) + ty[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        stops = np.r_[starts[1:], len(order)]
+        for lo, hi in zip(starts.tolist(), stops.tolist()):
+            rows = order[lo:hi]
+            x, y = int(tx[rows[0]]), int(ty[rows[0]])
+            times, counts = np.unique(t[rows], return_counts=True)
+            tile_ids, id_index = np.unique(ids[rows].astype(str), return_inverse=True)
+            data = {
+                "t": times.tolist(),
+                "n": counts.tolist(),
+                "ids": tile_ids.tolist(),
+                "i": id_index.tolist(),
+                "lon": np.round(lons[rows], COORD_DECIMALS).tolist(),
+                "lat": np.round(lats[rows], COORD_DECIMALS).tolist(),
+                "s": styles[rows].tolist(),
+            }
+            self._write(bucket_dir, f"{x}_{y}", data)
+            tiles.append([x, y])
+        return tiles
+
+    def _write_segments(self, bucket_dir, seg):
+        lon0, lat0 = self._to_lonlat(seg["x0"], seg["y0"])
+        lon1, lat1 = self._to_lonlat(seg["x1"], seg["y1"])
+        lon0, lat0, lon1, lat1 = (np.round(v, COORD_DECIMALS) for v in (lon0, lat0, lon1, lat1))
+        tx, ty = lonlat_to_tile(lon0, lat0, self.zoom)
+        tiles = []
+
+        # Group rows by tile, each tile's rows sorted by start time
+        order = np.lexsort((seg["t0"], ty, tx))
+        keys = tx[order] * (1 << 32) + ty[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        stops = np.r_[starts[1:], len(order)]
+        for lo, hi in zip(starts.tolist(), stops.tolist()):
+            rows = order[lo:hi]
+            x, y = int(tx[rows[0]]), int(ty[rows[0]])
+            tile_ids, id_index = np.unique(seg["id"][rows].astype(str), return_inverse=True)
+            data = {
+                "ids": tile_ids.tolist(),
+                "i": id_index.tolist(),
+                "s": seg["style"][rows].tolist(),
+                "t": seg["t0"][rows].tolist(),
+                "d": (seg["t1"][rows] - seg["t0"][rows]).tolist(),
+                "lon": lon0[rows].tolist(),
+                "lat": lat0[rows].tolist(),
+                "dlon": np.round(lon1[rows] - lon0[rows], COORD_DECIMALS).tolist(),
+                "dlat": np.round(lat1[rows] - lat0[rows], COORD_DECIMALS).tolist(),
+            }
+            self._write(bucket_dir, f"{x}_{y}", data)
+            tiles.append([x, y])
+        return tiles
+
+    def _density(self, t, lons, lats, speeds):
+        """Density pyramid of the current bucket: per-cell mean count and speed per time slice."""
+        slices = ((t - self._bucket * self.bucket_seconds) // self.density_seconds).astype(np.int64)
+        frames = np.maximum(self._slice_frames, 1)
+        levels = {}
+        for z in self.density_zooms:
+            cx, cy = lonlat_to_tile(lons, lats, z)
+            keys = (slices << (2 * z)) | (cx << z) | cy
+            cells, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse)
+            k = cells >> (2 * z)
+            levels[str(z)] = {
+                "k": k.tolist(),
+                "x": ((cells >> z) & ((1 << z) - 1)).tolist(),
+                "y": (cells & ((1 << z) - 1)).tolist(),
+                "c": np.round(counts / frames[k], 2).tolist(),
+                "v": np.round(np.bincount(inverse, weights=speeds) / counts, 1).tolist(),
+            }
+        return {"slice": self.density_seconds, "levels": levels}
+
+    def _write(self, bucket_dir, name, data):
+        key = f"{self._bucket}/{name}"
+        with open(os.path.join(bucket_dir, f"{name}.js"), "w", encoding="utf-8") as f:
+            f.write(f"TileData.load({json.dumps(key)}, {json.dumps(data, separators=(',', ':'))});\n")
+
+    def close(self):
+        """Flushes the last bucket and writes index.js, the viewer and its renderer."""
+        if self.tracks:
+            self._add_segments(self.tracks.finish())
+        self._flush()
+        index = {
+            "title": self.title,
+            "center": list(self.center),
+            "zoom": self.zoom,
+            "point_zoom": self.point_zoom,
+            "density_zooms": list(self.density_zooms),
+            "tracks": self.tracks is not None,
+            "bucket_seconds": self.bucket_seconds,
+            "period": self.period,
+            "t_min": self.t_min if self.t_min is not None else 0,
+            "t_max": self.t_max if self.t_max is not None else 0,
+            "start_date": self.start_date.isoformat() if self.start_date else None,
+            "palette": self.palette,
+            "buckets": self.buckets,
+        }
+        with open(os.path.join(self.out_dir, "index.js"), "w", encoding="utf-8") as f:
+            f.write(f"const TileIndex = {json.dumps(index)};\n")
+        shutil.copy(VEHICLE_LAYER_JS, os.path.join(self.out_dir, "vehicle_layer.js"))
+        with open(os.path.join(self.out_dir, "index.html"), "w", encoding="utf-8") as f:
+            f.write(VIEWER_HTML.replace("{{ title }}", self.title))
+        return os.path.join(self.out_dir, "index.html")
+
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>{{ title }}</title>
+    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
+    <style>
+        html, body, #map { height: 100%; margin: 0; background: #111; }
+        #controls {
+            position: absolute; bottom: 20px; left: 50%; transform: translateX(-50%); z-index: 1000;
+            background: rgba(20, 20, 20, 0.85); color: #eee; padding: 8px 14px; border-radius: 6px;
+            font: 13px monospace; display: flex; gap: 10px; align-items: center;
+        }
+        #slider { width: 420px; }
+        #legend {
+            position: absolute; top: 10px; right: 10px; z-index: 1000; background: rgba(20, 20, 20, 0.85);
+            color: #eee; padding: 6px 10px; border-radius: 6px; font: 12px monospace; display: none;
+        }
+        #legend span { display: inline-block; width: 90px; height: 8px; vertical-align: middle;
+            background: linear-gradient(to right, hsl(0, 90%, 50%), hsl(120, 90%, 50%)); }
+    </style>
+</head>
+<body>
+<div id="map"></div>
+<div id="legend">mean speed 0 <span></span> 14+ m/s</div>
+<div id="controls">
+    <button id="play">&#9654;</button>
+    <input id="slider" type="range">
+    <span id="clock"></span>
+    <select id="speed">
+        <option value="1">1x</option><option value="5">5x</option>
+        <option value="20" selected>20x</option><option value="60">60x</option>
+    </select>
+    <span id="count"></span>
+</div>
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<script src="vehicle_layer.js"></script>
+<script src="index.js"></script>
+<script>
+    const idx = TileIndex;
+    const MAX_TILES = 256;   // don't request more tiles than this for one view
+    const map = L.map('map').setView(idx.center, 14);
+    L.tileLayer('https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png', {
+        attribution: '&copy; OpenStreetMap &copy; CARTO', maxZoom: 20,
+    }).addTo(map);
+
+    const store = new VehicleStore();
+    store.setPalette(idx.palette);
+    const layer = L.vehicleLayer(store).addTo(map);
+
+    // --- density cells (zoomed out) ---
+    const FAST_SPEED = 14;   // m/s, green end of the color scale
+    const DensityLayer = L.Layer.extend({
+        onAdd(map) {
+            this._canvas = L.DomUtil.create('canvas', '', map.getContainer());
+            this._canvas.style.cssText = 'position:absolute;top:0;left:0;pointer-events:none;z-index:399;';
+            this.cells = null;   // {z, x, y, c, v, lo, hi} rows to draw
+            map.on('move zoom zoomend resize viewreset', this.redraw, this);
+            this.redraw();
+        },
+        redraw() {
+            const map = this._map, size = map.getSize(), dpr = window.devicePixelRatio || 1;
+            const canvas = this._canvas;
+            canvas.width = size.x * dpr; canvas.height = size.y * dpr;
+            canvas.style.width = size.x + 'px'; canvas.style.height = size.y + 'px';
+            const ctx = canvas.getContext('2d');
+            ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+            const d = this.cells;
+            if (!d) return;
+            // cell (x, y) at zoom z spans [x, x + 1] * 256 * 2^(zoom - z) world pixels
+            const scale = 256 * Math.pow(2, map.getZoom() - d.z);
+            const origin = map.getPixelBounds().min;
+            let max = 0;
+            for (let r = d.lo; r < d.hi; r++) max = Math.max(max, d.c[r]);
+            for (let r = d.lo; r < d.hi; r++) {
+                const hue = Math.min(1, d.v[r] / FAST_SPEED) * 120;
+                const alpha = 0.25 + 0.65 * Math.log1p(d.c[r]) / Math.log1p(max);
+                ctx.fillStyle = `hsla(${hue}, 90%, 50%, ${alpha})`;
+                ctx.fillRect(d.x[r] * scale - origin.x, d.y[r] * scale - origin.y, scale, scale);
+            }
+        },
+    });
+    const density = new DensityLayer().addTo(map);
+
+    function densityZoom() {
+        // finest level whose cells are still >= 8 px at the current zoom
+        const z = map.getZoom();
+        let best = idx.density_zooms[0];
+        for (const dz of idx.density_zooms) if (dz <= z + 5) best = dz;
+        return best;
+    }
+
+    // --- tile loading ---
+    const loaded = new Map();   // key -> data with per-frame row offsets
+    const pending = new Set();
+    window.TileData = {
+        load(key, data) {
+            if (data.n) {
+                data.offset = [0];
+                for (const n of data.n) data.offset.push(data.offset[data.offset.length - 1] + n);
+            }
+            loaded.set(key, data);
+            pending.delete(key);
+            render();
+        },
+    };
+
+    function request(key) {
+        if (loaded.has(key) || pending.has(key)) return;
+        pending.add(key);
+        const script = document.createElement('script');
+        script.src = 'data/' + key + '.js';
+        script.onload = script.onerror = () => { pending.delete(key); script.remove(); };
+        document.head.appendChild(script);
+    }
+
+    function tileRange() {
+        const b = map.getBounds(), n = Math.pow(2, idx.zoom);
+        const tx = lon => Math.floor((lon + 180) / 360 * n);
+        const ty = lat => {
+            const r = lat * Math.PI / 180;
+            return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+        };
+        return [tx(b.getWest()), ty(b.getNorth()), tx(b.getEast()), ty(b.getSouth())];
+    }
+
+    function visibleKeys(bucket) {
+        const tiles = idx.buckets[bucket] || [];
+        // track segments are filed by their start tile, so look one tile further out
+        const pad = idx.tracks ? 1 : 0;
+        const [x0, y0, x1, y1] = tileRange();
+        const keys = [];
+        for (const [x, y] of tiles) {
+            if (x >= x0 - pad && x <= x1 + pad && y >= y0 - pad && y <= y1 + pad) keys.push(bucket + '/' + x + '_' + y);
+        }
+        return keys.slice(0, MAX_TILES);
+    }
+
+    // --- playback ---
+    let t = idx.t_min, timer = null;
+    const slider = document.getElementById('slider');
+    slider.min = idx.t_min; slider.max = idx.t_max; slider.step = idx.period; slider.value = t;
+    const start = idx.start_date ? new Date(idx.start_date) : null;
+
+    function bisect(arr, x) {
+        let lo = 0, hi = arr.length;
+        while (lo < hi) { const mid = (lo + hi) >> 1; if (arr[mid] < x) lo = mid + 1; else hi = mid; }
+        return lo;
+    }
+
+    function render() {
+        const bucket = Math.floor(t / idx.bucket_seconds);
+        const points = map.getZoom() >= idx.point_zoom;
+        const keysFor = b => (points ? visibleKeys(b) : (idx.buckets[b] ? [b + '/density'] : []));
+        const keys = keysFor(bucket);
+        keys.forEach(request);
+        // Prefetch the next bucket and drop everything else
+        if (t + idx.bucket_seconds / 4 >= (bucket + 1) * idx.bucket_seconds) keysFor(bucket + 1).forEach(request);
+        for (const key of loaded.keys()) {
+            const b = parseInt(key);
+            if (b !== bucket && b !== bucket + 1) loaded.delete(key);
+        }
+
+        store.clear();
+        density.cells = null;
+        document.getElementById('legend').style.display = points ? 'none' : 'block';
+        if (!points) {
+            const d = loaded.get(bucket + '/density');
+            if (d) {
+                const z = densityZoom(), level = d.levels[z];
+                const k = Math.floor((t - bucket * idx.bucket_seconds) / d.slice);
+                density.cells = Object.assign({z: z, lo: bisect(level.k, k), hi: bisect(level.k, k + 1)}, level);
+            }
+        }
+        density.redraw();
+        // segments crossing into the next bucket are stored there
+        const trackKeys = points && idx.tracks ? keys.concat(visibleKeys(bucket + 1).filter(k => loaded.has(k))) : [];
+        for (const key of trackKeys) {
+            const d = loaded.get(key);
+            if (!d) continue;
+            for (let r = 0, hi = bisect(d.t, t + 1e-6); r < hi; r++) {
+                if (d.t[r] + d.d[r] < t) continue;
+                const f = d.d[r] > 0 ? (t - d.t[r]) / d.d[r] : 0;
+                store.upsert(d.ids[d.i[r]], d.lat[r] + f * d.dlat[r], d.lon[r] + f * d.dlon[r], d.s[r]);
+            }
+        }
+        for (const key of points && !idx.tracks ? keys : []) {
+            const d = loaded.get(key);
+            if (!d) continue;
+            const f = bisect(d.t, t);
+            if (d.t[f] !== t) continue;
+            for (let r = d.offset[f]; r < d.offset[f + 1]; r++) {
+                store.upsert(d.ids[d.i[r]], d.lat[r], d.lon[r], d.s[r]);
+            }
+        }
+        store.version++;
+        layer.redraw();
+
+        const clock = start ? new Date(start.getTime() + t * 1000).toISOString().substr(11, 8) : t + 's';
+        document.getElementById('clock').textContent = clock;
+        const cells = density.cells;
+        document.getElementById('count').textContent = points ? store.n + ' objects'
+            : (cells ? Math.round(cells.c.slice(cells.lo, cells.hi).reduce((a, b) => a + b, 0)) + ' objects (avg)' : '');
+    }
+
+    function seek(value) {
+        t = Math.min(idx.t_max, Math.max(idx.t_min, value));
+        slider.value = t;
+        render();
+    }
+
+    slider.addEventListener('input', () => seek(parseFloat(slider.value)));
+    document.getElementById('play').addEventListener('click', (e) => {
+        if (timer) { clearInterval(timer); timer = null; e.target.innerHTML = '&#9654;'; return; }
+        e.target.innerHTML = '&#10073;&#10073;';
+        let elapsed = 0;   // simulated seconds not yet shown
+        timer = setInterval(() => {
+            elapsed += parseFloat(document.getElementById('speed').value) * 0.1;
+            const steps = Math.floor(elapsed / idx.period);
+            if (!steps) return;
+            elapsed -= steps * idx.period;
+            seek(t >= idx.t_max ? idx.t_min : t + steps * idx.period);
+        }, 100);
+    });
+    map.on('moveend', render);
+    render();
+</script>
+</body>
+</html>
+"""
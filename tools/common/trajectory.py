@@ -0,0 +1,227 @@
+import numpy as np
+
+# --- CONFIGURATION ---
+TOLERANCE_M = 2.0        # max distance of a dropped sample from the interpolated track
+STILL_M = 0.5            # a segment shorter than this is a dwell (same as the bus despawn check)
+MAX_SEGMENT_SECONDS = 60.0   # moving segments are cut after this, so they stay short in space
+WINDOW = 64              # samples buffered per object since its last keyframe
+
+
+class TrajectorySimplifier:
+    """Streaming per-object keyframe selection with a time-synchronized error bound.
+
+    Feed one frame at a time, in time order, with add(). Each object's track is
+    cut into linear segments: a sample is dropped when its position lies within
+    tolerance meters of the position linearly interpolated in time between the
+    keyframes around it. Consecutive stationary segments are merged into one
+    dwell record.
+
+    Closed segments are returned as a dict of arrays
+    {slot, id, t0, t1, x0, y0, x1, y1, style}, where style is the object's
+    style code at t0. A segment with t0 == t1 is an object seen only once.
+    """
+
+    def __init__(self, tolerance=TOLERANCE_M, still=STILL_M, max_seconds=MAX_SEGMENT_SECONDS, window=WINDOW):
+        if still >= tolerance:
+            raise ValueError("still must be smaller than tolerance")
+        self.tolerance = tolerance
+        # a dwell is drawn at its first position, up to `still` off the fitted line
+        self._fit_tolerance = tolerance - still
+        self.still = still
+        self.max_seconds = max_seconds
+        self.window = window
+
+        self.slots = {}        # id -> slot
+        self.ids = []          # slot -> id
+        self._free = []
+        self._alloc(1024)
+
+    def _alloc(self, capacity):
+        """Grows the per-slot state to capacity slots."""
+        n = len(self.ids)
+        w = self.window
+        fields = {
+            "active": ((), bool),
+            "emitted": ((), bool),             # anchor already ends an emitted segment
+            "style": ((), np.uint8),           # style at the anchor
+            "anchor": ((3,), np.float64),      # t, x, y of the last keyframe
+            "win": ((w, 3), np.float64),       # samples since the anchor
+            "win_n": ((), np.int64),
+            "win_style": ((w,), np.uint8),
+            # held-back dwell, merged with the next one if the object is still there
+            "dwell": ((), bool),
+            "dwell_seg": ((4,), np.float64),   # t0, t1, x, y
+            "dwell_style": ((), np.uint8),
+        }
+        for name, (shape, dtype) in fields.items():
+            arr = np.zeros((capacity,) + shape, dtype=dtype)
+            if n:
+                arr[:n] = getattr(self, name)
+            setattr(self, name, arr)
+        self.ids.extend([None] * (capacity - n))
+        self._free.extend(range(capacity - 1, n - 1, -1))
+
+    def _slot(self, obj_id):
+        slot = self.slots.get(obj_id)
+        if slot is not None:
+            return slot
+        if not self._free:
+            self._alloc(2 * len(self.ids))
+        slot = self._free.pop()
+        self.slots[obj_id] = slot
+        self.ids[slot] = obj_id
+        return slot
+
+    def add(self, t, ids, xs, ys, styles):
+        """Adds one frame; returns the segments it closed."""
+        out = []
+        slots = np.fromiter((self._slot(obj_id) for obj_id in ids), dtype=np.int64, count=len(ids))
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        styles = np.asarray(styles, dtype=np.uint8)
+
+        # Objects that left since the last frame end their tracks
+        seen = np.zeros(len(self.active), dtype=bool)
+        seen[slots] = True
+        gone = np.flatnonzero(self.active & ~seen)
+        if len(gone):
+            self._finish(gone, out)
+
+        new = ~self.active[slots]
+        if new.any():
+            s = slots[new]
+            self.active[s] = True
+            self.emitted[s] = False
+            self.dwell[s] = False
+            self.style[s] = styles[new]
+            self.anchor[s] = np.column_stack((np.full(len(s), t), xs[new], ys[new]))
+            self.win_n[s] = 0
+
+        old = ~new
+        s, px, py, ps = slots[old], xs[old], ys[old], styles[old]
+        if len(s):
+            a = self.anchor[s]
+            n = self.win_n[s]
+            w = self.win[s]
+            # Synchronized distance of every buffered sample from the line anchor -> new sample
+            frac = (w[:, :, 0] - a[:, 0:1]) / (t - a[:, 0:1])
+            ix = a[:, 1:2] + frac * (px - a[:, 1])[:, None]
+            iy = a[:, 2:3] + frac * (py - a[:, 2])[:, None]
+            err = np.hypot(w[:, :, 1] - ix, w[:, :, 2] - iy)
+            err[np.arange(self.window)[None, :] >= n[:, None]] = 0.0
+            moved = np.hypot(px - a[:, 1], py - a[:, 2]) > self.still
+            cut = (n > 0) & ((err.max(axis=1) > self._fit_tolerance) | (n == self.window)
+                             | (moved & (t - a[:, 0] > self.max_seconds)))
+
+            if cut.any():
+                c = s[cut]
+                last = self.win[c, self.win_n[c] - 1]
+                self._close(c, last, self.win_style[c, self.win_n[c] - 1], out)
+                self.win_n[c] = 0
+            s_n = self.win_n[s]
+            self.win[s, s_n] = np.column_stack((np.full(len(s), t), px, py))
+            self.win_style[s, s_n] = ps
+            self.win_n[s] = s_n + 1
+        return _concat(out)
+
+    def cut(self):
+        """Closes every open segment at its latest sample, e.g. at a time-bucket boundary.
+
+        The next segment of each object starts there.
+        """
+        out = []
+        s = np.flatnonzero(self.active & (self.win_n > 0))
+        if len(s):
+            self._close(s, self.win[s, self.win_n[s] - 1], self.win_style[s, self.win_n[s] - 1], out)
+            self.win_n[s] = 0
+        d = np.flatnonzero(self.active & self.dwell)
+        if len(d):
+            self._flush_dwell(d, out)
+        return _concat(out)
+
+    def finish(self):
+        """Ends every track; returns the remaining segments."""
+        out = []
+        s = np.flatnonzero(self.active)
+        if len(s):
+            self._finish(s, out)
+        return _concat(out)
+
+    def _finish(self, s, out):
+        n = self.win_n[s]
+        open_ = n > 0
+        if open_.any():
+            c = s[open_]
+            self._close(c, self.win[c, self.win_n[c] - 1], self.win_style[c, self.win_n[c] - 1], out)
+        # seen only once: a zero-length segment
+        single = s[~open_ & ~self.emitted[s]]
+        if len(single):
+            a = self.anchor[single]
+            out.append(self._segments(single, a[:, 0], a[:, 0], a[:, 1], a[:, 2], a[:, 1], a[:, 2],
+                                      self.style[single]))
+        d = s[self.dwell[s]]
+        if len(d):
+            self._flush_dwell(d, out)
+        self.active[s] = False
+        for slot in s.tolist():
+            del self.slots[self.ids[slot]]
+            self.ids[slot] = None
+            self._free.append(slot)
+
+    def _close(self, s, end, end_style, out):
+        """Emits anchor -> end for slots s; end becomes the new anchor."""
+        a = self.anchor[s]
+        still = np.hypot(end[:, 1] - a[:, 1], end[:, 2] - a[:, 2]) <= self.still
+        held = self.dwell[s]
+        # a dwell right after a dwell at the same spot extends it
+        same = held & still & (np.hypot(end[:, 1] - self.dwell_seg[s, 2], end[:, 2] - self.dwell_seg[s, 3])
+                               <= self.still)
+        self.dwell_seg[s[same], 1] = end[same, 0]
+
+        flush = held & ~same
+        if flush.any():
+            self._flush_dwell(s[flush], out)
+        hold = still & ~same
+        h = s[hold]
+        self.dwell[h] = True
+        self.dwell_seg[h] = np.column_stack((a[hold, 0], end[hold, 0], a[hold, 1], a[hold, 2]))
+        self.dwell_style[h] = self.style[h]
+
+        move = ~still
+        if move.any():
+            out.append(self._segments(s[move], a[move, 0], end[move, 0], a[move, 1], a[move, 2],
+                                      end[move, 1], end[move, 2], self.style[s[move]]))
+        self.anchor[s] = end
+        self.style[s] = end_style
+        self.emitted[s] = True
+
+    def _flush_dwell(self, s, out):
+        d = self.dwell_seg[s]
+        out.append(self._segments(s, d[:, 0], d[:, 1], d[:, 2], d[:, 3], d[:, 2], d[:, 3], self.dwell_style[s]))
+        self.dwell[s] = False
+
+    def _segments(self, s, t0, t1, x0, y0, x1, y1, style):
+        ids = np.empty(len(s), dtype=object)
+        ids[:] = [self.ids[slot] for slot in s.tolist()]
+        return {"slot": s, "id": ids, "t0": t0, "t1": t1, "x0": x0, "y0": y0, "x1": x1, "y1": y1,
+                "style": style}
+
+
+def _concat(parts):
+    if not parts:
+        return None
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def interpolate(segments, t):
+    """Positions of every segment at time t, as the viewer draws them.
+
+    Returns (mask, xs, ys): mask selects the segments covering t.
+    """
+    t0, t1 = segments["t0"], segments["t1"]
+    mask = (t0 <= t) & (t <= t1)
+    span = np.where(t1 > t0, t1 - t0, 1.0)
+    frac = np.clip((t - t0) / span, 0.0, 1.0)
+    xs = segments["x0"] + frac * (segments["x1"] - segments["x0"])
+    ys = segments["y0"] + frac * (segments["y1"] - segments["y0"])
+    return mask, xs, ys
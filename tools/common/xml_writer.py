@@ -0,0 +1,130 @@
+from xml.etree.ElementTree import iterparse
+
+# --- CONFIGURATION ---
+INDENT = "    "   # one level; None writes the whole document on one line
+
+
+def _escape(value):
+    """Attribute/text escaping, as ElementTree does it."""
+    value = str(value)
+    if any(c in value for c in '&<>"\n\r\t'):
+        value = (value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+                 .replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#09;"))
+    return value
+
+
+class XmlWriter:
+    """Writes an XML document element by element, straight to disk.
+
+        with XmlWriter(path, "routes") as xml:
+            xml.element("vType", {"id": "bus"})
+            xml.start("vehicle", {"id": "v0"})
+            xml.element("stop", {"busStop": "s0"})
+            xml.end("vehicle")
+
+    Nothing is kept beyond the open element names, so memory does not grow
+    with the document. An element without children is written self-closing.
+    """
+
+    def __init__(self, path, root, attrib=None, indent=INDENT):
+        self.indent = indent
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._stack = []
+        self._pending = None   # start tag not yet known to have children
+        self.start(root, attrib)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+
+    def _line(self, text):
+        if self.indent is None:
+            self._f.write(text)
+        else:
+            self._f.write(self.indent * (len(self._stack) - 1) + text + "\n")
+
+    def _flush(self):
+        if self._pending is not None:
+            self._line(self._pending + ">")
+            self._pending = None
+
+    def _open_tag(self, tag, attrib):
+        if not attrib:
+            return "<" + tag
+        return "<" + tag + " " + " ".join(f'{key}="{_escape(value)}"' for key, value in attrib.items())
+
+    def start(self, tag, attrib=None):
+        """Opens an element; its children follow until end()."""
+        self._flush()
+        self._stack.append(tag)
+        self._pending = self._open_tag(tag, attrib)
+
+    def end(self, tag=None):
+        """Closes the innermost open element (tag, if given, must match it)."""
+        if tag is not None and tag != self._stack[-1]:
+            raise ValueError(f"end({tag!r}) while <{self._stack[-1]}> is open")
+        if self._pending is not None:
+            self._line(self._pending + "/>")
+            self._pending = None
+        else:
+            self._line(f"</{self._stack[-1]}>")
+        self._stack.pop()
+
+    def element(self, tag, attrib=None, text=None):
+        """Writes a complete element without children."""
+        self._flush()
+        self._stack.append(tag)
+        if text is None:
+            self._line(self._open_tag(tag, attrib) + "/>")
+        else:
+            self._line(f"{self._open_tag(tag, attrib)}>{_escape(text)}</{tag}>")
+        self._stack.pop()
+
+    def write(self, elem):
+        """Writes an ElementTree element with all its children.
+
+        Whitespace-only text and all tails are dropped (SUMO files have no mixed content).
+        """
+        text = elem.text if elem.text and elem.text.strip() else None
+        if not len(elem):
+            self.element(elem.tag, elem.attrib, text)
+            return
+        self.start(elem.tag, elem.attrib)
+        for child in elem:
+            self.write(child)
+        self.end(elem.tag)
+
+    def close(self):
+        while self._stack:
+            self.end()
+        self._f.close()
+
+
+def iter_children(path):
+    """Incremental parse of an XML file: returns (root, children).
+
+    root is the document element (tag and attributes only); children yields
+    each complete top-level element in file order and drops it afterwards, so
+    memory stays bounded by the largest single child.
+    """
+    events = iterparse(path, events=("start", "end"))
+    _, root = next(events)
+
+    def children():
+        depth = 1
+        for event, elem in events:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield elem
+                root.remove(elem)
+
+    return root, children()